@@ -1,13 +1,14 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from knox.models import AuthToken
 from .serializers import UserSerializer, RegisterSerializer, LoginSerializer
-from knox.auth import TokenAuthentication
+from knox import views as knox_views
+from .auth import CachingTokenAuthentication, create_token
 
 
 # Register API, post request
 class RegisterAPI(generics.GenericAPIView):
     serializer_class = RegisterSerializer
+    query_budget = 8  # Most queries per request (scrummaster/query_budget.py)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -17,7 +18,7 @@ class RegisterAPI(generics.GenericAPIView):
         return Response({
             # using user serializer to get the ID, username and email for our response
             "user": UserSerializer(user, context=self.get_serializer_context()).data,
-            "token": AuthToken.objects.create(user)[1],  # Create token for user to use
+            "token": create_token(user),  # Create token for user to use (accounts/auth.py keeps a limit per user)
         }, status=status.HTTP_201_CREATED)
 
 
@@ -25,7 +26,8 @@ class RegisterAPI(generics.GenericAPIView):
 class LoginAPI(generics.GenericAPIView):
     serializer_class = LoginSerializer
 
-    authentication_classes = (TokenAuthentication,)  #
+    authentication_classes = (CachingTokenAuthentication,)  #
+    query_budget = 6  # With old tokens to delete and a purge of the expired ones
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)  # calling login serializer
@@ -35,7 +37,7 @@ class LoginAPI(generics.GenericAPIView):
         return Response({
             # using user serializer to get the ID, username and email for our response
             "user": UserSerializer(user, context=self.get_serializer_context()).data,
-            "token": AuthToken.objects.create(user)[1],  # Create token for user to use
+            "token": create_token(user),  # Create token for user to use
         })
 
 
@@ -45,8 +47,21 @@ class UserAPI(generics.RetrieveAPIView):
         permissions.IsAuthenticated,
     ]
 
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachingTokenAuthentication,)
     serializer_class = UserSerializer
+    query_budget = 3
 
     def get_object(self):
         return self.request.user
+
+
+# knox's logout views, authenticated with the token cache. Deleting the token revokes it in the cache (accounts/auth.py)
+class LogoutAPI(knox_views.LogoutView):
+    authentication_classes = (CachingTokenAuthentication,)
+    query_budget = 4
+
+
+# Logout all the sessions of the user (deletes all of the user's tokens)
+class LogoutAllAPI(knox_views.LogoutAllView):
+    authentication_classes = (CachingTokenAuthentication,)
+    query_budget = 5
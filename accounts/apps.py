@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        from . import auth  # noqa: F401 (connects the signals that revoke cached tokens)
+        from . import checks  # noqa: F401 (registers the system checks)
@@ -0,0 +1,193 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from scrummaster.routers import user_authenticated
+
+"""
+Token authentication with a cache.
+knox's TokenAuthentication looks the token up in the database on every request (the token, its user and the user's
+other tokens, to delete the expired ones). CachingTokenAuthentication remembers the tokens it has verified, so a
+token that was used in the last AUTH_TOKEN_CACHE_TIMEOUT seconds is accepted without any query.
+
+The verified tokens are kept in memory (per process), at most AUTH_TOKEN_CACHE_MAX_SIZE of them, the least recently
+used ones are dropped first. Only a hash of the token is kept, not the token itself.
+
+Revoking: when a token is deleted (logout, logoutall, expired, admin) or a user is saved (ex: deactivated), the user's
+tokens are revoked by putting the time in the django cache (AUTH_TOKEN_CACHE_ALIAS). Every process checks that time
+before using a cached token, so a logout is seen everywhere at once. That only works if the cache is shared by the
+processes (ex: file based): with a local memory (or dummy) cache the other processes would keep accepting a logged out
+token, so the token cache is not used at all (see token_cache_enabled(), "manage.py check" warns about it). settings.py
+uses a file based cache for it.
+
+Note: a cached token is not refreshed by knox's AUTO_REFRESH (it's refreshed the next time it's verified again).
+
+Keeping the token table small: create_token() (login and register) keeps at most AUTH_TOKEN_LIMIT_PER_USER tokens per
+user, the oldest ones are deleted (and revoked like a logout). Expired tokens are deleted in batches by
+purge_expired_tokens(), by "python manage.py purge_expired_tokens" (ex: from cron) and by a login at most every
+AUTH_TOKEN_PURGE_INTERVAL seconds.
+"""
+
+
+def get_revocation_cache():
+    return caches[getattr(settings, "AUTH_TOKEN_CACHE_ALIAS", "default")]
+
+
+def revoked_key(user_id):
+    return f"auth-token-revoked:{user_id}"
+
+
+# Tokens of the user that were verified before now can't be used from the cache anymore
+def revoke_user_tokens(user_id):
+    timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+    # Kept a bit longer than the cached tokens, so it can't expire before them
+    get_revocation_cache().set(revoked_key(user_id), time.time(), timeout + 1)
+    token_cache.forget_user(user_id)
+
+
+# The cache is only used if revocations are seen by every process
+def token_cache_enabled():
+    if getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60) <= 0:
+        return False
+    return not isinstance(get_revocation_cache(), (LocMemCache, DummyCache))
+
+
+# The verified tokens of this process. Used by every request thread, so everything is done under the lock.
+class TokenCache:
+    def __init__(self):
+        self.entries = OrderedDict()  # token hash --> (user, auth token, verified at), oldest used first
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token).hexdigest()
+
+    def get(self, token):
+        key = self.key(token)
+        timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, auth_token, verified_at = entry
+            if time.time() - verified_at > timeout or \
+                    (auth_token.expiry is not None and auth_token.expiry < timezone.now()):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+
+        revoked_at = get_revocation_cache().get(revoked_key(user.id))
+        if revoked_at is not None and verified_at <= revoked_at:
+            self.forget(token)
+            return None
+        return entry
+
+    # verified_at has to be the time from before the token was loaded from the database, so a logout that happens
+    # while it's being verified still revokes it
+    def set(self, token, user, auth_token, verified_at):
+        max_size = getattr(settings, "AUTH_TOKEN_CACHE_MAX_SIZE", 10000)
+        with self.lock:
+            self.entries[self.key(token)] = (user, auth_token, verified_at)
+            self.entries.move_to_end(self.key(token))
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def forget(self, token):
+        with self.lock:
+            self.entries.pop(self.key(token), None)
+
+    def forget_user(self, user_id):
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0].id == user_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    # The database router can send the rest of the request's reads to a replica (scrummaster/routers.py)
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            user_authenticated(request, result[0])
+        return result
+
+    def authenticate_credentials(self, token):
+        if not token_cache_enabled():
+            return super().authenticate_credentials(token)
+
+        entry = token_cache.get(token)
+        if entry is not None:
+            user, auth_token, _ = entry
+            # Copies, so a request can't change the cached user or token for the requests after it
+            return copy.copy(user), copy.copy(auth_token)
+
+        verified_at = time.time()
+        user, auth_token = super().authenticate_credentials(token)
+        token_cache.set(token, user, auth_token, verified_at)
+        return user, auth_token
+
+
+# Deletes up to batch_size expired tokens, oldest first (by the knox_authtoken expiry index, accounts/migrations), and
+# returns how many. The rows are deleted with one query, without loading them: expired tokens don't need revoking, the
+# token cache checks the expiry itself.
+def purge_expired_tokens(batch_size=1000):
+    table = connection.ops.quote_name(AuthToken._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE digest IN "
+            f"(SELECT digest FROM {table} WHERE expiry < %s ORDER BY expiry LIMIT %s)",
+            [connection.ops.adapt_datetimefield_value(timezone.now()), batch_size]
+        )
+        return cursor.rowcount
+
+
+# One batch of purge_expired_tokens(), if no process did one in the last AUTH_TOKEN_PURGE_INTERVAL seconds (cache.add
+# only succeeds for one of them)
+def maybe_purge_expired_tokens():
+    interval = getattr(settings, "AUTH_TOKEN_PURGE_INTERVAL", 0)
+    if interval > 0 and get_revocation_cache().add("auth-token-purge", True, interval):
+        purge_expired_tokens(getattr(settings, "AUTH_TOKEN_PURGE_BATCH_SIZE", 1000))
+
+
+# A new token for the user (login, register), the user's oldest tokens are deleted so there are at most
+# AUTH_TOKEN_LIMIT_PER_USER of them (None for no limit). Knox only keeps a hash of the tokens, so an existing one can't
+# be given out again.
+def create_token(user):
+    limit = getattr(settings, "AUTH_TOKEN_LIMIT_PER_USER", None)
+    if limit:
+        oldest = list(AuthToken.objects.filter(user=user).order_by("-created")
+                      .values_list("digest", flat=True)[limit - 1:])
+        if oldest:
+            AuthToken.objects.filter(digest__in=oldest).delete()  # Revoked by token_deleted()
+    maybe_purge_expired_tokens()
+    return AuthToken.objects.create(user)[1]
+
+
+@receiver(post_delete, sender=AuthToken)
+def token_deleted(sender, instance, **kwargs):
+    revoke_user_tokens(instance.user_id)
+
+
+# Ex: the user was deactivated
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        revoke_user_tokens(instance.id)
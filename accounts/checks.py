@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+from .auth import get_revocation_cache, token_cache_enabled
+
+"""
+Checks run by "python manage.py check" (and at the start of runserver and migrate).
+"""
+
+
+# The token cache was asked for (AUTH_TOKEN_CACHE_TIMEOUT) but is off, because the revocations aren't shared by the
+# processes (accounts/auth.py)
+@register(Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    if getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60) <= 0 or token_cache_enabled():
+        return []
+    alias = getattr(settings, "AUTH_TOKEN_CACHE_ALIAS", "default")
+    return [Warning(
+        f"The token cache is off: the AUTH_TOKEN_CACHE_ALIAS cache ({alias!r}, "
+        f"{type(get_revocation_cache()).__name__}) is not shared by the worker processes, so every request verifies "
+        f"its token in the database.",
+        hint="Point AUTH_TOKEN_CACHE_ALIAS at a file based or Redis cache, or set AUTH_TOKEN_CACHE_TIMEOUT = 0.",
+        id="accounts.W001",
+    )]
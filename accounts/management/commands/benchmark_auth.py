@@ -0,0 +1,57 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from accounts.auth import CachingTokenAuthentication, token_cache, token_cache_enabled
+
+
+class Rollback(Exception):
+    pass
+
+
+# Compare knox's token authentication with the cached one (accounts/auth.py).
+# Uses a temporary user and token, everything is rolled back at the end.
+# python manage.py benchmark_auth --requests 2000
+class Command(BaseCommand):
+    help = "Benchmark the token authentication with and without the token cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000, help="Authenticated requests per run")
+
+    def handle(self, *args, **options):
+        if not token_cache_enabled():
+            self.stdout.write("The token cache is off (AUTH_TOKEN_CACHE_TIMEOUT is 0 or AUTH_TOKEN_CACHE_ALIAS is not a "
+                              "cache shared by the processes), both runs verify the token in the database.")
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user("benchmark-auth-user", "benchmark-auth@example.com", "benchmark")
+                token = AuthToken.objects.create(user)[1]
+                request = APIRequestFactory().get("/api/auth/user/", HTTP_AUTHORIZATION=f"Token {token}")
+                token_cache.clear()
+                for name, authentication in [
+                    ("knox", TokenAuthentication()),
+                    ("cached", CachingTokenAuthentication()),
+                ]:
+                    self.run(name, authentication, request, options["requests"])
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            token_cache.clear()
+
+    def run(self, name, authentication, request, requests):
+        authentication.authenticate(Request(request))  # Warm up (and fill the token cache)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(requests):
+                authentication.authenticate(Request(request))
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name:>8}: {elapsed / requests * 1e6:8.1f} us/request, "
+            f"{len(queries) / requests:.2f} queries/request ({requests} requests)"
+        )
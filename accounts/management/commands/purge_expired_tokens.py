@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from accounts.auth import purge_expired_tokens
+
+
+# Delete the expired knox tokens, a batch at a time so the table is never locked for long. Logins also do a batch every
+# AUTH_TOKEN_PURGE_INTERVAL seconds, run this (ex: from cron) to clean up a large backlog or without logins.
+# python manage.py purge_expired_tokens --batch-size 1000 --pause 0.1
+class Command(BaseCommand):
+    help = "Delete the expired authentication tokens in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Tokens deleted per query")
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to wait between batches")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        while True:
+            batch = purge_expired_tokens(options["batch_size"])
+            deleted += batch
+            if batch < options["batch_size"]:
+                break
+            time.sleep(options["pause"])
+        self.stdout.write(f"Deleted {deleted} expired tokens")
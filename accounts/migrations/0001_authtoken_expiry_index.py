@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# Index on the expiry of knox's tokens, for purge_expired_tokens (accounts/auth.py). The table belongs to knox, so the
+# index is made with SQL.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knox', '0007_auto_20190111_0542'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS "knox_authtoken_expiry_idx" ON "knox_authtoken" ("expiry")',
+            'DROP INDEX IF EXISTS "knox_authtoken_expiry_idx"',
+        ),
+    ]
@@ -1,6 +1,20 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import User
 from rest_framework import status
+from knox.models import AuthToken
+from scrummaster.query_budget import QueryCounter, get_query_budget
+from .api import LoginAPI, RegisterAPI
+from .auth import TokenCache, get_revocation_cache, token_cache
+from .checks import check_token_cache
 
 """
 tests.py doesn't just test regular conditions, it also tests validation to make sure that errors are being given
@@ -25,7 +39,15 @@ Logging out
     -with correct token
     -with wrong token
     -with no token
-    
+Token cache
+    -Cached token doesn't query the database
+    -Logout, logout all and deactivating the user revoke cached tokens, in every process
+    -Not used without a cache shared by the processes, which the system checks warn about
+    -Least recently used tokens are dropped first
+Token limit and purge
+    -Logins delete the oldest tokens over the limit, and they can't be used anymore
+    -Expired tokens are deleted in batches, by the command and by logins at most once per interval
+
 TODO: Test wrong requests (ex: POST, PUT, DELETE, etc) 
 """
 
@@ -451,3 +473,205 @@ class AccountUserFail2(TestCase):
 
     def tearDown(self):
         User.objects.all().delete()
+
+
+# Verified tokens are cached (accounts/auth.py), the revocations are in a cache shared by the processes
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), "scrummaster-test-token-cache"),
+    },
+}, AUTH_TOKEN_CACHE_ALIAS='tokens')
+class AccountTokenCache(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        get_revocation_cache().clear()
+        self.user = User.objects.create_user("Bob475", "bob@gmail.com", "Ilovehotdogs17")
+        self.token = AuthToken.objects.create(self.user)[1]
+        self.other_token = AuthToken.objects.create(self.user)[1]
+
+    def get_user(self, token):
+        return self.client.get("/api/auth/user/", HTTP_AUTHORIZATION=f"Token {token}")
+
+    def test_cached_token(self):
+        self.assertEqual(self.get_user(self.token).status_code, status.HTTP_200_OK)
+
+        # The token, the user and the other tokens aren't loaded again
+        with self.assertNumQueries(0):
+            response = self.get_user(self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['username'], "Bob475")
+
+    def test_logout(self):
+        self.get_user(self.token)
+        self.get_user(self.other_token)
+        response = self.client.post("/api/auth/logout/", HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.get_user(self.token).status_code, status.HTTP_401_UNAUTHORIZED)
+        # The other session is still logged in
+        self.assertEqual(self.get_user(self.other_token).status_code, status.HTTP_200_OK)
+
+    def test_logout_all(self):
+        self.get_user(self.token)
+        self.get_user(self.other_token)
+        response = self.client.post("/api/auth/logoutall/", HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertEqual(self.get_user(self.token).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_user(self.other_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # Another process only sees the logout through the revocation in the django cache
+    def test_revoked_in_other_process(self):
+        self.get_user(self.token)
+        cached = dict(token_cache.entries)
+        AuthToken.objects.filter(user=self.user).delete()
+        token_cache.entries.update(cached)  # As if the tokens were still cached in another process
+
+        self.assertEqual(self.get_user(self.token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # A second worker, with its own token cache, stops using the token as soon as this one logs it out
+    def test_logout_seen_by_other_worker(self):
+        other_worker = TokenCache()
+        with mock.patch("accounts.auth.token_cache", other_worker):
+            self.assertEqual(self.get_user(self.token).status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(other_worker.get(self.token.encode()))
+
+        response = self.client.post("/api/auth/logout/", HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNone(other_worker.get(self.token.encode()))
+        with mock.patch("accounts.auth.token_cache", other_worker):
+            self.assertEqual(self.get_user(self.token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # A local memory cache isn't seen by the other workers, so the tokens aren't cached at all
+    @override_settings(AUTH_TOKEN_CACHE_ALIAS='default')
+    def test_local_cache_not_used(self):
+        self.get_user(self.token)
+        with self.assertNumQueries(3):
+            self.get_user(self.token)
+        self.assertEqual(len(token_cache.entries), 0)
+
+    # "manage.py check" says when the token cache is off because of the cache, not when it was turned off on purpose
+    def test_check(self):
+        self.assertEqual(check_token_cache(None), [])
+        with override_settings(AUTH_TOKEN_CACHE_ALIAS='default'):
+            self.assertEqual([warning.id for warning in check_token_cache(None)], ["accounts.W001"])
+            with override_settings(AUTH_TOKEN_CACHE_TIMEOUT=0):
+                self.assertEqual(check_token_cache(None), [])
+
+    def test_deactivated_user(self):
+        self.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get_user(self.token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_CACHE_MAX_SIZE=1)
+    def test_least_recently_used_dropped(self):
+        self.get_user(self.token)
+        self.get_user(self.other_token)
+        self.assertEqual(len(token_cache.entries), 1)
+
+        with self.assertNumQueries(0):
+            self.get_user(self.other_token)
+        # The first token has to be verified again
+        with self.assertNumQueries(3):
+            self.get_user(self.token)
+
+    @override_settings(AUTH_TOKEN_CACHE_TIMEOUT=0)
+    def test_cache_turned_off(self):
+        self.get_user(self.token)
+        with self.assertNumQueries(3):
+            self.get_user(self.token)
+        self.assertEqual(len(token_cache.entries), 0)
+
+    def tearDown(self):
+        token_cache.clear()
+        User.objects.all().delete()
+
+
+class AccountTokenLimit(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        get_revocation_cache().delete("auth-token-purge")
+        self.user = User.objects.create_user("Bob475", "bob@gmail.com", "Ilovehotdogs17")
+
+    def login(self):
+        response = self.client.post("/api/auth/login/", {"username": "Bob475", "password": "Ilovehotdogs17"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['token']
+
+    def get_user(self, token):
+        return self.client.get("/api/auth/user/", HTTP_AUTHORIZATION=f"Token {token}")
+
+    @override_settings(AUTH_TOKEN_LIMIT_PER_USER=3)
+    def test_token_limit(self):
+        first_token = self.login()
+        self.assertEqual(self.get_user(first_token).status_code, status.HTTP_200_OK)  # Cached
+        tokens = [self.login() for _ in range(5)]
+
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.get_user(first_token).status_code, status.HTTP_401_UNAUTHORIZED)
+        for token in tokens[-3:]:
+            self.assertEqual(self.get_user(token).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_user(tokens[0]).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_TOKEN_LIMIT_PER_USER=None)
+    def test_no_limit(self):
+        for _ in range(4):
+            self.login()
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 4)
+
+    # Login and register stay within their query budgets with a full set of tokens and a purge
+    @override_settings(AUTH_TOKEN_LIMIT_PER_USER=3)
+    def test_query_budgets(self):
+        for _ in range(3):
+            self.login()
+        AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        get_revocation_cache().delete("auth-token-purge")
+        with QueryCounter() as counter:
+            self.login()
+        self.assertLessEqual(counter.count, get_query_budget(LoginAPI, "POST"))
+        get_revocation_cache().delete("auth-token-purge")
+        with QueryCounter() as counter:
+            response = self.client.post("/api/auth/register/", {
+                "username": "Alice1", "email": "alice1@gmail.com", "password": "Ilovehotdogs17",
+                "first_name": "Alice", "last_name": "Smith",
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(counter.count, get_query_budget(RegisterAPI, "POST"))
+
+    def test_purge_command(self):
+        for _ in range(5):
+            AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        AuthToken.objects.create(self.user)
+        AuthToken.objects.create(self.user, expiry=None)  # Never expires
+        output = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_expired_tokens", "--batch-size", "2", stdout=output)
+        self.assertEqual(len(queries), 3)  # 2 + 2 + 1
+        self.assertIn("Deleted 5 expired tokens", output.getvalue())
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    @override_settings(AUTH_TOKEN_PURGE_INTERVAL=60, AUTH_TOKEN_PURGE_BATCH_SIZE=2)
+    def test_purge_at_login(self):
+        for _ in range(5):
+            AuthToken.objects.create(self.user, expiry=timedelta(seconds=-1))
+        self.login()
+        self.login()  # Not again before the interval
+        self.assertEqual(AuthToken.objects.filter(expiry__lt=timezone.now()).count(), 3)
+
+    @skipUnless(connection.vendor == "sqlite", "Query plans are different on the other databases")
+    def test_expiry_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT digest FROM knox_authtoken WHERE expiry < %s ORDER BY expiry LIMIT 10",
+                ["2030-01-01"]
+            )
+            plan = " ".join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn("knox_authtoken_expiry_idx", plan)
+
+    def tearDown(self):
+        token_cache.clear()
+        User.objects.all().delete()
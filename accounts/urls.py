@@ -1,17 +1,19 @@
 from django.urls import path, include
-from .api import RegisterAPI, LoginAPI, UserAPI
-from knox import views as knox_views
+from scrummaster.async_views import read_view
+from .api import RegisterAPI, LoginAPI, UserAPI, LogoutAPI, LogoutAllAPI
 
 # Connecting APIs to respective URLs
 urlpatterns = [
     path('api/auth/register/', RegisterAPI.as_view()),
     path('api/auth/login/', LoginAPI.as_view()),
-    path('api/auth/user/', UserAPI.as_view()),
+    path('api/auth/user/', read_view(UserAPI)),  # Async with ASGI (scrummaster/async_views.py)
+    # Our logout views have to come before the knox includes, they revoke the token in the token cache
+    path('api/auth/logout/', LogoutAPI.as_view(), name="knox_logout"),
+    path('api/auth/logoutall/', LogoutAllAPI.as_view(), name="knox_logoutall"),
     # knox includes: we wil only be using the logout view as we overwrote the other ones
     # api/auth/login --> Login view
     # api/auth/logout --> Logout view
     # api/auth/logoutall --> Logout all view
     path('api/auth/', include('knox.urls')),
-    path('api/auth/logout/', knox_views.LogoutView.as_view(), name="knox_logout"),
 
 ]
@@ -0,0 +1,116 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
+from rest_framework import exceptions
+from .models import Board, SharedUser, Task
+
+"""
+Board access control.
+Answers "what can this user do on this board". The board owner can do everything (update, delete, share the board and
+work on tasks), a shared user can view the board and work on its tasks, and anyone else cannot see the board at all.
+Just like the rest of the API, not being allowed to see a board gives a 404 (exceptions.NotFound), for security.
+
+The board and the shared user check are loaded together in one query, and the answer is remembered for the rest of
+the request, so asking about the same board twice (ex: in the view and then in the serializer) is free.
+
+Usage:
+    access = get_board_access(request).for_board_url(url)  # raises NotFound if the user can't see the board
+    access.require_owner()  # raises NotFound if the user isn't the owner
+"""
+
+OWNER = "owner"
+SHARED_USER = "shared_user"
+
+
+# What a user can do on one board
+class BoardAccess:
+    def __init__(self, board, role):
+        self.board = board
+        self.role = role  # OWNER or SHARED_USER
+
+    @property
+    def is_owner(self):
+        return self.role == OWNER
+
+    # Owner only actions: update/delete the board and add/remove shared users
+    def require_owner(self):
+        if not self.is_owner:
+            raise exceptions.NotFound
+
+
+# Resolves and remembers board access for one user (one resolver is created per request)
+class BoardAccessResolver:
+    def __init__(self, user):
+        self.user = user
+        self._access = {}  # board id --> BoardAccess
+        self._url_to_id = {}  # board url --> board id
+
+    # Subquery for "is the user a shared user on the board", so it can be loaded with the board in one query
+    def _is_shared(self, board_id_field):
+        return Exists(SharedUser.objects.filter(board_id=OuterRef(board_id_field), shared_user_id=self.user.id))
+
+    # Turn the board and whether the user is shared on it into a BoardAccess, remember it or raise NotFound
+    def _remember(self, board, is_shared):
+        if board.owner_id == self.user.id:
+            access = BoardAccess(board, OWNER)
+        elif is_shared:
+            access = BoardAccess(board, SHARED_USER)
+        else:
+            raise exceptions.NotFound
+        self._access[board.id] = access
+        self._url_to_id[str(board.url)] = board.id
+        return access
+
+    def _get_board(self, **lookup):
+        try:
+            return Board.objects.select_related("owner").annotate(is_shared=self._is_shared("pk")).get(**lookup)
+        except (Board.DoesNotExist, ValueError, ValidationError):  # ValidationError/ValueError for a badly formed url/id
+            raise exceptions.NotFound
+
+    def for_board_url(self, url):
+        board_id = self._url_to_id.get(str(url))
+        if board_id in self._access:
+            return self._access[board_id]
+        board = self._get_board(url=url)
+        return self._remember(board, board.is_shared)
+
+    def for_board_id(self, board_id):
+        if board_id in self._access:
+            return self._access[board_id]
+        board = self._get_board(id=board_id)
+        return self._remember(board, board.is_shared)
+
+    # For a board object that is already loaded, ex: from a serializer. No query at all if the user is the owner.
+    def for_board(self, board):
+        if board.id in self._access:
+            return self._access[board.id]
+        if board.owner_id == self.user.id:
+            return self._remember(board, False)
+        is_shared = SharedUser.objects.filter(board_id=board.id, shared_user_id=self.user.id).exists()
+        return self._remember(board, is_shared)
+
+    # Load a task and the access to its board in one query. Returns the task and the BoardAccess.
+    def for_task(self, pk):
+        try:
+            task = Task.objects.select_related("board", "owner") \
+                .annotate(is_shared=self._is_shared("board_id")).get(id=pk)
+        except (Task.DoesNotExist, ValueError):
+            raise exceptions.NotFound
+        if task.board_id in self._access:
+            return task, self._access[task.board_id]
+        return task, self._remember(task.board, task.is_shared)
+
+    # Forget what we know about a board, ex: after shared users were changed or the board was deleted
+    def forget(self, board_id):
+        self._access.pop(board_id, None)
+
+
+# Get the access resolver for this request, a new one is made the first time it is called during a request.
+# Works with both DRF requests and plain django requests (the resolver is stored on the django request).
+def get_board_access(request):
+    user = request.user
+    django_request = getattr(request, "_request", request)
+    resolver = getattr(django_request, "board_access", None)
+    if resolver is None or resolver.user != user:
+        resolver = BoardAccessResolver(user)
+        django_request.board_access = resolver
+    return resolver
@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import Board, SharedUser, Task
+from .models import Board, SharedUser, Task, Tombstone, BoardTaskCounter
 # Register your models here.
 
 admin.site.register(Board)
 admin.site.register(SharedUser)
 admin.site.register(Task)
+admin.site.register(Tombstone)
+admin.site.register(BoardTaskCounter)
@@ -1,9 +1,18 @@
-from .models import Board, SharedUser, Task
+from .models import Task
 from rest_framework.response import Response
 from rest_framework import generics, permissions
 from .serializers import BoardCreateSerializer, BoardInfoSerializer, SharedUserCreateSerializer, \
-    SharedUserDeleteSerializer, TaskSerializer, BoardUpdateSerializer, BoardListSerializer, BoardInfoUrlSerializer
-from django.http import JsonResponse
+    SharedUserDeleteSerializer, TaskSerializer, BoardUpdateSerializer, BoardListSerializer, BoardInfoUrlSerializer, \
+    BoardListPageSerializer, TaskListSerializer, TaskListQuerySerializer, TaskBulkSerializer, \
+    BoardChangeListSerializer, BoardChangeQuerySerializer, BoardSummarySerializer, \
+    TaskSearchSerializer, TaskSearchQuerySerializer, BoardCompactSerializer, task_info
+from .pagination import decode_cursor, get_page_size, is_paginated
+from .access import get_board_access
+from .cache import board_etag, etag_matches, get_board_snapshot
+from .changes import lock_task, record_changes
+from .transfer import EXPORTERS, READERS, buffered, decode_lines, import_tasks
+from .fieldsets import fields_variant, get_task_fields
+from django.http import StreamingHttpResponse
 from rest_framework import exceptions
 from rest_framework import status
 
@@ -30,6 +39,7 @@ class BoardCreate(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated
     ]
+    query_budget = 7
 
     # POST request to create Board
     def post(self, request, *args, **kwargs):
@@ -38,11 +48,19 @@ class BoardCreate(generics.GenericAPIView):
         board = serializer.save()
 
         # Return info about the board using the BoardInfoSerializer
-        return JsonResponse(
+        return Response(
             BoardInfoSerializer(board.id).data, status=status.HTTP_201_CREATED
         )
 
 
+# Representations of the board info, GET api/board/<url>/?payload=compact (not ?format=, DRF uses that one to pick a
+# renderer). "full" is the default. Both can be combined with ?fields= or ?exclude= for the tasks (boards/fieldsets.py).
+BOARD_PAYLOADS = {
+    "full": BoardInfoUrlSerializer,
+    "compact": BoardCompactSerializer,
+}
+
+
 # Gives board info and related tasks when given ID
 class BoardInfo(generics.GenericAPIView):
     serializer_class = BoardInfoSerializer
@@ -50,51 +68,76 @@ class BoardInfo(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated
     ]
+    # Most queries per request, for any board size (scrummaster/query_budget.py)
+    query_budget = {"GET": 7, "PUT": 9, "DELETE": 13}
+    use_replica = True  # GET reads from a read replica (scrummaster/routers.py)
 
     # GET request with PK/ID passed in the URL
     def get(self, request, url, *args, **kwargs):
-        # Try to get the board based on the ID and raise error if does not exist
-        try:
-            board = Board.objects.get(url=url)
-        except Exception:
-            raise exceptions.NotFound
-
         # If either board owner or shared user give board info, otherwise return 404 error that board does not exist
-        if board.owner == self.request.user:
-            pass
-        else:
-            try:
-                SharedUser.objects.get(shared_user=self.request.user, board=board)
-            except Exception:  # No shared user or board owner object exists, 404 response back
-                raise exceptions.NotFound
-
-        board_serializer = BoardInfoUrlSerializer(url, many=False)
-        return JsonResponse(board_serializer.data)
+        board = get_board_access(request).for_board_url(url).board
+        payload = request.query_params.get("payload", "full")
+        if payload not in BOARD_PAYLOADS:
+            raise exceptions.ValidationError({"payload": [f"Must be one of: {', '.join(BOARD_PAYLOADS)}."]})
+        task_fields = get_task_fields(request.query_params)
+        variant = fields_variant(payload, task_fields)
+
+        # The client already has this version of the board, 304 without loading the tasks
+        etag = board_etag(board, variant)
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        # Board info from the snapshot cache, only built from the database if this version isn't cached yet
+        serializer = BOARD_PAYLOADS[payload](url, many=False, context={"task_fields": task_fields})
+        board_info = get_board_snapshot(board, lambda: serializer.data, variant)
+        response = Response(board_info)
+        response['ETag'] = etag
+        return response
 
     def delete(self, request, url, *args, **kwargs):
-        try:
-            board = Board.objects.get(url=url)
-        except Exception:
-            raise exceptions.NotFound
-        if self.request.user == board.owner:
-            board.delete()
-            return Response(status=status.HTTP_200_OK)  # Return blank 200 response, successfully deleted
-        else:  # Not owner of board, send 404
-            raise exceptions.NotFound
+        access = get_board_access(request).for_board_url(url)
+        access.require_owner()  # Not owner of board, send 404
+        with record_changes(access.board.id) as changes:
+            changes.board_deleted()
+            access.board.delete()
+        get_board_access(request).forget(access.board.id)
+        return Response(status=status.HTTP_200_OK)  # Return blank 200 response, successfully deleted
 
     def put(self, request, url, *args, **kwargs):
-        try:
-            board = Board.objects.get(url=url)
-        except Exception:  # 404, doesn't exist
-            raise exceptions.NotFound
+        access = get_board_access(request).for_board_url(url)
+        access.require_owner()  # Not owner, 404 for security
 
-        if board.owner == self.request.user:
-            serializer = BoardUpdateSerializer(board, data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        else:  # Not owner, 404 for security
-            raise exceptions.NotFound
+        serializer = BoardUpdateSerializer(access.board, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with record_changes(access.board.id) as changes:
+            # The version is saved as well, otherwise saving the board would put back the version it was loaded with
+            board = serializer.save(version=changes.version, change_seq=changes.version)
+            changes.board_updated(board)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Task counts of a board by progress status and priority, GET request. Same access and ETag handling as BoardInfo.get
+class BoardSummary(generics.GenericAPIView):
+    serializer_class = BoardSummarySerializer
+    permission_classes = [
+        permissions.IsAuthenticated
+    ]
+    query_budget = 5
+
+    def get(self, request, url, *args, **kwargs):
+        board = get_board_access(request).for_board_url(url).board
+
+        etag = board_etag(board, "summary")
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+
+        response = Response(BoardSummarySerializer(board).data)
+        response['ETag'] = etag
+        return response
 
 
 # List the boards, GET request, shows owned and shared boards
@@ -103,12 +146,88 @@ class BoardList(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
     ]
+    query_budget = 6
+    use_replica = True
 
     def get(self, request, *args, **kwargs):
         # Get the user id, put it into the serializer. Then return the serializer data.
         user_id = self.request.user.id
-        serializer = BoardListSerializer(user_id)
-        return JsonResponse(serializer.data)
+        # ?include=summary adds the task counts of every board
+        include_summary = "summary" in request.query_params.get("include", "").split(",")
+
+        # ?cursor=&limit= gives one page of boards at a time, with a next_cursor to get the next page
+        if is_paginated(request.query_params):
+            after = None
+            if request.query_params.get("cursor"):
+                after = decode_cursor(request.query_params["cursor"], 1)[0]
+            context = {
+                "after": after,
+                "limit": get_page_size(request.query_params),
+                "include_summary": include_summary,
+            }
+            serializer = BoardListPageSerializer(user_id, context=context)
+            return Response(serializer.data)
+
+        serializer = BoardListSerializer(user_id, context={"include_summary": include_summary})
+        return Response(serializer.data)
+
+
+# List the tasks of a board one page at a time, GET request. Can be filtered by progress_status, priority and owner,
+# and ?fields= or ?exclude= only gives some of the task fields (boards/fieldsets.py)
+class TaskList(generics.GenericAPIView):
+    serializer_class = TaskListSerializer
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    query_budget = 5
+
+    def get(self, request, url, *args, **kwargs):
+        # Owner or shared user, otherwise 404
+        access = get_board_access(request).for_board_url(url)
+
+        filters = TaskListQuerySerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        after = None
+        if request.query_params.get("cursor"):
+            after = decode_cursor(request.query_params["cursor"], 2)
+        context = {
+            "filters": filters.validated_data,
+            "after": after,
+            "limit": get_page_size(request.query_params),
+            "fields": get_task_fields(request.query_params),
+        }
+        serializer = TaskListSerializer(access.board.id, context=context)
+        return Response(serializer.data)
+
+
+# Search the tasks of every board the user can see (or of one board with ?board=<url>), GET request with ?q=.
+# Results are ranked and paginated with ?cursor= and ?limit=
+class TaskSearch(generics.GenericAPIView):
+    serializer_class = TaskSearchSerializer
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    query_budget = 5
+
+    def get(self, request, *args, **kwargs):
+        query = TaskSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        board_id = None
+        if "board" in query.validated_data:
+            # Owner or shared user, otherwise 404
+            board_id = get_board_access(request).for_board_url(query.validated_data["board"]).board.id
+
+        after = None
+        if request.query_params.get("cursor"):
+            after = decode_cursor(request.query_params["cursor"], 2)
+        context = {
+            "query": query.validated_data["q"],
+            "board_id": board_id,
+            "after": after,
+            "limit": get_page_size(request.query_params),
+        }
+        serializer = TaskSearchSerializer(request.user.id, context=context)
+        return Response(serializer.data)
 
 
 # Create shared user
@@ -117,11 +236,16 @@ class SharedUserCreate(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
     ]
+    query_budget = 12
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        shared_user = serializer.save()
+        # Only the owner can add shared users, checked before the write so the board isn't locked for nothing
+        board_id = serializer.validated_data['board_id']
+        get_board_access(request).for_board_id(board_id).require_owner()
+        with record_changes(board_id) as changes:
+            shared_user = serializer.save(changes=changes)
         return Response(shared_user, status=status.HTTP_201_CREATED)
 
 
@@ -131,11 +255,16 @@ class SharedUserDelete(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
     ]
+    query_budget = 12
 
     def delete(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid()
-        serializer.save()
+        serializer.is_valid(raise_exception=True)
+        # Only the owner can remove shared users, checked before the write so the board isn't locked for nothing
+        board_id = serializer.validated_data['board_id']
+        get_board_access(request).for_board_id(board_id).require_owner()
+        with record_changes(board_id) as changes:
+            serializer.save(changes=changes)
         return Response(status=status.HTTP_200_OK)
 
 
@@ -145,29 +274,29 @@ class TaskCreate(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
     ]
+    query_budget = 13
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)  # Check serializer is valid, then save it if it is
-        task = serializer.save()
-        return_response = {
-            "task": {
-                "id": task.id,
-                "board": task.board.id,
-                "date_created": task.date_created,
-                "title": task.title,
-                "description": task.description,
-                "progress_status": task.progress_status,
-                "priority": task.priority,
-                "owner": {
-                    "username": task.owner.username,
-                    "first_name": task.owner.first_name,
-                    "last_name": task.owner.last_name,
-                    "email": task.owner.email,
-                }
-            }
-        }
-        return JsonResponse(return_response, safe=False)
+        # Owner or shared user, checked before the write so the board isn't locked for nothing
+        board = serializer.validated_data['board']
+        get_board_access(request).for_board(board)
+        with record_changes(board.id) as changes:
+            task = serializer.save(change_seq=changes.version)
+            changes.task_saved(task, created=True)
+        task_detail = task_info(task)  # The owner can be null
+        task_detail["board"] = task.board_id
+        return Response({"task": task_detail})
+
+
+# The task read again with its row locked, inside record_changes() (see boards/changes.py). 404 if another write
+# deleted it or moved it to another board since it was loaded.
+def locked_task(task):
+    locked = lock_task(task.id, task.board_id)
+    if locked is None:
+        raise exceptions.NotFound
+    return locked
 
 
 # Task info (update, delete) API view
@@ -176,111 +305,145 @@ class TaskInfo(generics.GenericAPIView):
     permission_classes = [
         permissions.IsAuthenticated,
     ]
+    # PUT: the worst case is a new progress status or priority, the board doesn't have that task counter yet
+    query_budget = {"GET": 4, "PUT": 17, "DELETE": 13}
 
-    # TaskInfo GET request API endpoint removed (just use BoardInfo for data on the board and accompanying Tasks)
-    # def get(self, request, pk, *args, **kwargs):
-    #     try:
-    #         task = Task.objects.get(id=pk)
-    #     except Exception:
-    #         raise exceptions.NotFound
-    #
-    #     allowed = False
-    #     board = task.board
-    #     if self.request.user == board.owner:
-    #         allowed = True
-    #     else:
-    #         try:
-    #             shared_user = board.shared_users.get(board=board, shared_user=self.request.user)
-    #             allowed = True
-    #         except Exception:
-    #             raise exceptions.NotFound
-    #
-    #     if not allowed:
-    #         return exceptions.NotFound
-    #
-    #     return_response = {
-    #         "task": {
-    #             "id": task.id,
-    #             "board": task.board.id,
-    #             "date_created": task.date_created,
-    #             "title": task.title,
-    #             "description": task.description,
-    #             "progress_status": task.progress_status,
-    #             "priority": task.priority,
-    #             "owner": {
-    #                 "username": task.owner.username,
-    #                 "first_name": task.owner.first_name,
-    #                 "last_name": task.owner.last_name,
-    #                 "email": task.owner.email,
-    #             }
-    #         }
-    #     }
-    #     return JsonResponse(return_response, safe=False)
+    # Full detail of one task (with the description, which the board info and task list can leave out)
+    def get(self, request, pk, *args, **kwargs):
+        # Owner or shared user of the task's board, otherwise 404
+        task, access = get_board_access(request).for_task(pk)
+        task_detail = task_info(task)
+        task_detail["board"] = task.board_id
+        return Response({"task": task_detail})
 
     def put(self, request, pk, *args, **kwargs):
-        try:
-            task = Task.objects.get(id=pk)
-        except Exception:
-            raise exceptions.NotFound
-
-        allowed = False
-        board = task.board
+        # Owner or shared user of the task's board, otherwise 404
+        task, access = get_board_access(request).for_task(pk)
 
-        if board.owner == self.request.user:
-            allowed = True
+        serializer = TaskSerializer(task, data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        # If the task is being moved to another board, the user must have access to that board as well
+        if serializer.validated_data['board'].id != task.board_id:
+            get_board_access(request).for_board(serializer.validated_data['board'])
+        new_board_id = serializer.validated_data['board'].id
+        if new_board_id == task.board_id:
+            with record_changes(task.board_id) as changes:
+                serializer.instance = locked_task(task)
+                task = serializer.save(change_seq=changes.version)
+                changes.task_saved(task)
         else:
-            try:
-                shared_user = board.shared_users.get(board=board, shared_user=self.request.user)
-                allowed = True
-            except Exception:
-                raise exceptions.NotFound
+            # Moved to another board, it's deleted from the old board and updated on the new board. The boards are
+            # locked in id order (see boards/changes.py).
+            first_id, second_id = sorted([task.board_id, new_board_id])
+            with record_changes(first_id) as first_changes, record_changes(second_id) as second_changes:
+                if first_id == new_board_id:
+                    new_changes, old_changes = first_changes, second_changes
+                else:
+                    new_changes, old_changes = second_changes, first_changes
+                serializer.instance = task = locked_task(task)
+                old_changes.task_deleted(task)
+                task = serializer.save(change_seq=new_changes.version)
+                new_changes.task_saved(task)
+        task_detail = task_info(task)  # The owner can be null
+        task_detail["board"] = task.board_id
+        return Response({"task": task_detail})
+
+    def delete(self, request, pk, *args, **kwargs):
+        # Owner or shared user of the task's board, otherwise 404
+        task, access = get_board_access(request).for_task(pk)
+        with record_changes(access.board.id) as changes:
+            task = locked_task(task)
+            deleted, _ = Task.objects.filter(id=task.id).delete()  # Only counted and tombstoned if deleted here
+            if deleted:
+                changes.task_deleted(task)
+        return Response(status=status.HTTP_200_OK)
 
-        if not allowed:
-            raise exceptions.NotFound
 
-        serializer = TaskSerializer(task, data=request.data)
+# Create, update and delete many tasks of a board in one POST request. Access to the board is checked once and the
+# changes are applied in one transaction.
+class TaskBulk(generics.GenericAPIView):
+    serializer_class = TaskBulkSerializer
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    # The worst case: creates, updates and deletes, with a task counter the board doesn't have yet
+    query_budget = 20
+
+    def post(self, request, url, *args, **kwargs):
+        # Owner or shared user, otherwise 404
+        board = get_board_access(request).for_board_url(url).board
+
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        task = serializer.save()
-        return_response = {
-            "task": {
-                "id": task.id,
-                "board": task.board.id,
-                "date_created": task.date_created,
-                "title": task.title,
-                "description": task.description,
-                "progress_status": task.progress_status,
-                "priority": task.priority,
-                "owner": {
-                    "username": task.owner.username,
-                    "first_name": task.owner.first_name,
-                    "last_name": task.owner.last_name,
-                    "email": task.owner.email,
-                }
-            }
-        }
-        return JsonResponse(return_response, safe=False)
+        with record_changes(board.id) as changes:
+            results = serializer.save(board=board, changes=changes)
+        return Response({"results": results})
 
-    def delete(self, request, pk, *args, **kwargs):
-        try:
-            task = Task.objects.get(id=pk)
-        except Exception:
-            raise exceptions.NotFound
 
-        allowed = False
-        board = task.board
+# Stream the tasks of a board as NDJSON (default) or CSV (?export_format=csv), GET request. See boards/transfer.py.
+# (Not ?format=, DRF uses that one to pick a renderer.)
+class BoardExport(generics.GenericAPIView):
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    query_budget = 5
+
+    def get(self, request, url, *args, **kwargs):
+        # Owner or shared user, otherwise 404
+        board = get_board_access(request).for_board_url(url).board
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in EXPORTERS:
+            raise exceptions.ValidationError({"export_format": [f"Must be one of: {', '.join(EXPORTERS)}."]})
 
-        if board.owner == self.request.user:
-            allowed = True
-        else:
-            try:
-                shared_user = board.shared_users.get(board=board, shared_user=self.request.user)
-                allowed = True
-            except Exception:
-                raise exceptions.NotFound
+        exporter, content_type = EXPORTERS[export_format]
+        response = StreamingHttpResponse(buffered(exporter(board)), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="board-{board.url}.{export_format}"'
+        return response
 
-        if not allowed:
-            raise exceptions.NotFound
 
-        task.delete()
-        return Response(status=status.HTTP_200_OK)
+# Add tasks to a board from an NDJSON or CSV file (the body of the POST request, Content-Type "text/csv" for CSV),
+# in the format of BoardExport. The body is read a line at a time. Gives the amount of tasks and the rows per second.
+class BoardImport(generics.GenericAPIView):
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    # No budget: the queries grow with the size of the file (a few per batch of IMPORT_BATCH_SIZE tasks, see
+    # boards/transfer.py), and the budgets are checked per request. The tests check the queries per batch.
+    query_budget = None
+
+    def post(self, request, url, *args, **kwargs):
+        # Owner or shared user, otherwise 404
+        board = get_board_access(request).for_board_url(url).board
+        import_format = "csv" if request.content_type.startswith("text/csv") else "ndjson"
+
+        # The django request gives the body a line at a time (request.data would parse all of it at once)
+        rows = READERS[import_format](decode_lines(request._request))
+        with record_changes(board.id) as changes:
+            result = import_tasks(board, rows, changes)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+# Only what changed on a board since version N (GET ?since=N), so clients don't have to download the whole board after
+# every change. Gives the changed tasks and shared users, the ids of deleted ones, the board info if it changed, and
+# the new version to use as "since" next time. since=0 (the default) gives everything.
+class BoardChangeList(generics.GenericAPIView):
+    serializer_class = BoardChangeListSerializer
+    permission_classes = [
+        permissions.IsAuthenticated,
+    ]
+    query_budget = 7
+
+    def get(self, request, url, *args, **kwargs):
+        # Owner or shared user, otherwise 404. The board (and its version) is loaded before the changes, so no change
+        # up to that version can be missed.
+        board = get_board_access(request).for_board_url(url).board
+
+        query = BoardChangeQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since = query.validated_data['since']
+        if since > board.version:
+            raise exceptions.ValidationError({"since": ["Ensure this value is not newer than the board version."]})
+
+        serializer = BoardChangeListSerializer(board, context={"since": since})
+        return Response(serializer.data)
 
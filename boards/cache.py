@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+
+"""
+Board snapshot cache.
+The board info (board, owner, tasks and shared users) is cached by board and board version. Every write to a board,
+its tasks or its shared users gives the board a new version (see boards/changes.py), so a cached snapshot is never
+served after the board changed, and old snapshots simply expire from the cache. The version is also used as the ETag
+of the board info, so a client that already has the latest version gets a 304 without the tasks being loaded at all.
+
+Any django cache backend works (local memory, file based, ...), set BOARD_CACHE_ALIAS to use a cache other than
+"default". BOARD_SNAPSHOT_TIMEOUT is how long (in seconds) a snapshot is kept.
+
+Note: user info (names and emails) is part of the snapshot, so it can be out of date until the board's next write.
+"""
+
+
+def get_snapshot_cache():
+    return caches[getattr(settings, "BOARD_CACHE_ALIAS", "default")]
+
+
+# The variant separates different representations of the same board version. The url is used instead of the id since
+# it is never reused, even if the database is reset.
+def snapshot_key(board, variant):
+    return f"board-snapshot:{board.url}:{board.version}:{variant}"
+
+
+def board_etag(board, variant="full"):
+    return f'"board-{board.id}-{board.version}-{variant}"'
+
+
+# True if the client sent If-None-Match with this ETag (aka the client already has this version of the board)
+def etag_matches(request, etag):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in etags
+
+
+# Get the snapshot of the board from the cache, if it's not there call build() to make it and cache it
+def get_board_snapshot(board, build, variant="full"):
+    cache = get_snapshot_cache()
+    key = snapshot_key(board, variant)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, "BOARD_SNAPSHOT_TIMEOUT", 60 * 60))
+    return data
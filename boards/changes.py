@@ -0,0 +1,138 @@
+from collections import Counter
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import F
+from .models import Board, Task, Tombstone
+from .events import publish_events
+from .counters import apply_counts, count_tasks, replace_counts
+from .serializers import task_info, shared_user_info, board_list_info
+
+"""
+Board change tracking.
+Every write to a board, its tasks or its shared users goes through record_changes(). It gives the write a new board
+version (Board.version goes up by one), which is stamped on everything the write changes (change_seq). Deleted tasks
+and shared users leave a Tombstone with the version they were deleted at. A client that has the board at version N
+can then ask for only the things with change_seq > N (GET api/board/<url>/changes/?since=N).
+
+The new version and the changes are saved in one transaction. The board row stays locked until the transaction is
+committed, so writes to the same board get their versions in the order they are committed, and a reader that sees
+version N also sees every change up to N.
+
+The board's task counters (boards/counters.py) are updated in the same transaction.
+
+The changes are also published as board events (boards/events.py) once the transaction is committed, so they are
+never sent for a write that was rolled back.
+
+Usage:
+    with record_changes(board.id) as changes:
+        task.change_seq = changes.version
+        task.save()
+        changes.task_saved(task, created=True)
+        other_task = lock_task(other_task.id, board.id)  # Loaded before the board was locked
+        changes.task_deleted(other_task)
+"""
+
+
+# Give the board a new version and return it. Has to be called inside a transaction (the board row stays locked)
+def next_board_version(board_id):
+    Board.objects.filter(id=board_id).update(version=F("version") + 1)
+    return Board.objects.values_list("version", flat=True).get(id=board_id)
+
+
+# The task read again inside record_changes(), with its row locked (and its owner loaded), or None if it isn't in the
+# board anymore. A task loaded before the board was locked may have been changed, moved or deleted by another write
+# since, so what it is counted as and its tombstone have to come from this read.
+def lock_task(task_id, board_id):
+    return Task.objects.select_for_update(of=("self",)).select_related("owner") \
+        .filter(id=task_id, board_id=board_id).first()
+
+
+# The changes made to one board during one write
+class ChangeRecorder:
+    def __init__(self, board_id, version):
+        self.board_id = board_id
+        self.version = version  # stamp this on everything that is created or updated
+        self.tombstones = []
+        self.events = []
+        self.counts = Counter()  # (progress_status, priority) --> change of the board's task counters
+        self.recount = False  # the counters have to be counted again from the tasks
+        self.imported = 0  # amount of tasks imported (boards/transfer.py)
+
+    def _event(self, event_type, **data):
+        event = {"type": event_type, "board_id": self.board_id, "version": self.version}
+        event.update(data)
+        self.events.append(event)
+
+    # Take the task out of the counter it was counted in. Task.counted_as is set when the task is loaded, and is None
+    # once the task was taken out of its board (deleted, or moved to another board).
+    def _uncount(self, task):
+        if not hasattr(task, "counted_as"):
+            self.recount = True  # We don't know what it was counted as
+        elif task.counted_as is not None and task.counted_as[0] == self.board_id:
+            self.counts[task.counted_as[1:]] -= 1
+
+    # The task (with its owner loaded) was created or updated
+    def task_saved(self, task, created=False):
+        if not created:
+            self._uncount(task)
+        self.counts[(task.progress_status, task.priority)] += 1
+        task.counted_as = (self.board_id, task.progress_status, task.priority)
+        self._event("task.created" if created else "task.updated", task=task_info(task))
+
+    # The task was deleted from the board (or moved to another board)
+    def task_deleted(self, task):
+        self._uncount(task)
+        task.counted_as = None
+        self.tombstones.append(Tombstone(
+            board_id=self.board_id, kind=Tombstone.TASK, object_id=task.id, change_seq=self.version
+        ))
+        self._event("task.deleted", id=task.id)
+
+    # Many tasks were created at once by an import. They are counted, but there is only one event for all of them
+    # (sent when the write is done) instead of one per task, clients get the tasks from the board changes.
+    def tasks_imported(self, tasks):
+        for task in tasks:
+            self.counts[(task.progress_status, task.priority)] += 1
+        self.imported += len(tasks)
+
+    # The shared user (with its user loaded) was added to the board
+    def shared_user_saved(self, shared_user):
+        self._event("shared_user.created", shared_user=shared_user_info(shared_user))
+
+    def shared_user_deleted(self, shared_user_id, user_id):
+        self.tombstones.append(Tombstone(
+            board_id=self.board_id, kind=Tombstone.SHARED_USER, object_id=shared_user_id, change_seq=self.version
+        ))
+        self._event("shared_user.deleted", id=shared_user_id, user_id=user_id)
+
+    # The board (with its owner loaded) was renamed
+    def board_updated(self, board):
+        self._event("board.updated", board=board_list_info(board))
+
+    def board_deleted(self):
+        self._event("board.deleted")
+
+    # Called when the write is done (still inside the transaction)
+    def finish(self):
+        if self.imported:
+            self._event("tasks.imported", count=self.imported)
+        if self.recount:
+            replace_counts(self.board_id, count_tasks(self.board_id))
+        else:
+            apply_counts(self.board_id, self.counts)
+        if self.tombstones:
+            Tombstone.objects.bulk_create(self.tombstones)
+        if self.events:
+            events = self.events
+            transaction.on_commit(lambda: publish_events(self.board_id, events))
+
+
+# Start a write to a board. Everything in the with block is one transaction.
+# To write to two boards at once (ex: moving a task), nest record_changes() with the lowest board id first, so two
+# writes can't lock the same two boards in opposite orders.
+@contextmanager
+def record_changes(board_id):
+    with transaction.atomic():
+        changes = ChangeRecorder(board_id, next_board_version(board_id))
+        yield changes
+        changes.finish()
@@ -0,0 +1,85 @@
+from collections import Counter
+from django.db.models import Count
+from .models import BoardTaskCounter, Task
+
+"""
+Board task counters.
+How many tasks a board has for each progress status and priority, kept in BoardTaskCounter so the board summary
+(GET api/board/<url>/summary/ and the board list with ?include=summary) doesn't have to count the tasks.
+
+The counters are changed by every task write in the same transaction as the write, through the ChangeRecorder of the
+write (boards/changes.py). If they are ever wrong (ex: tasks changed by hand in the database), they can be rebuilt from
+the tasks with "python manage.py rebuild_task_counters".
+
+Summary of a board:
+    {"total": 5, "progress_status": {"DONE": 2, "WORKING": 3}, "priority": {"1": 4, "5": 1}}
+"""
+
+
+# Apply the changes to the counters of a board. counts is a Counter of (progress_status, priority) --> change.
+# The same few queries no matter how many tasks changed. The board row has to be locked by the transaction
+# (record_changes() does that), so two writes can't change the same counters at once.
+def apply_counts(board_id, counts):
+    counts = {key: change for key, change in counts.items() if change}
+    if not counts:
+        return
+    counters = {
+        (counter.progress_status, counter.priority): counter
+        for counter in BoardTaskCounter.objects.filter(board_id=board_id)
+    }
+    changed_counters = []
+    new_counters = []
+    for (progress_status, priority), change in counts.items():
+        counter = counters.get((progress_status, priority))
+        if counter is None:
+            new_counters.append(BoardTaskCounter(
+                board_id=board_id, progress_status=progress_status, priority=priority, count=change
+            ))
+        else:
+            counter.count += change
+            changed_counters.append(counter)
+    if changed_counters:
+        BoardTaskCounter.objects.bulk_update(changed_counters, ["count"])
+    if new_counters:
+        BoardTaskCounter.objects.bulk_create(new_counters)
+
+
+# Count the tasks of the board (one query), as a Counter of (progress_status, priority) --> count
+def count_tasks(board_id):
+    rows = Task.objects.filter(board_id=board_id).values("progress_status", "priority") \
+        .annotate(count=Count("id")).order_by()
+    return Counter({(row["progress_status"], row["priority"]): row["count"] for row in rows})
+
+
+# The counters of the board as saved, same format as count_tasks()
+def saved_counts(board_id):
+    rows = BoardTaskCounter.objects.filter(board_id=board_id, count__gt=0) \
+        .values_list("progress_status", "priority", "count")
+    return Counter({(progress_status, priority): count for progress_status, priority, count in rows})
+
+
+# Replace the counters of the board with counts (from count_tasks())
+def replace_counts(board_id, counts):
+    BoardTaskCounter.objects.filter(board_id=board_id).delete()
+    BoardTaskCounter.objects.bulk_create([
+        BoardTaskCounter(board_id=board_id, progress_status=progress_status, priority=priority, count=count)
+        for (progress_status, priority), count in counts.items()
+    ])
+
+
+def empty_summary():
+    return {"total": 0, "progress_status": {}, "priority": {}}
+
+
+# The summaries of the boards, one query for all of them. Returns board id --> summary.
+def get_task_summaries(board_ids):
+    summaries = {board_id: empty_summary() for board_id in board_ids}
+    counters = BoardTaskCounter.objects.filter(board_id__in=board_ids, count__gt=0) \
+        .values_list("board_id", "progress_status", "priority", "count")
+    for board_id, progress_status, priority, count in counters:
+        summary = summaries[board_id]
+        summary["total"] += count
+        summary["progress_status"][progress_status] = summary["progress_status"].get(progress_status, 0) + count
+        priority = str(priority)  # Same keys as in the JSON
+        summary["priority"][priority] = summary["priority"].get(priority, 0) + count
+    return summaries
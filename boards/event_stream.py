@@ -0,0 +1,144 @@
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection
+from accounts.auth import CachingTokenAuthentication
+from rest_framework import exceptions
+from .access import BoardAccessResolver
+from .events import get_event_broker
+
+"""
+Board event stream, served by the ASGI app (scrummaster/asgi.py) with Server-Sent Events.
+GET /api/board/<url>/events/ keeps the response open and sends every event of the board (boards/events.py) as it
+happens, instead of the client polling the board:
+    id: 12
+    event: task.updated
+    data: {"type": "task.updated", "board_id": 1, "version": 12, "task": {...}}
+
+The first event is "stream.opened" with the current board version. A client that reconnects can get what it missed
+from GET api/board/<url>/changes/?since=<last version it saw>.
+
+The access rules are the same as BoardInfo.get (owner or shared user, otherwise 404). The token can be given in the
+Authorization header ("Token <token>") or as ?token=, since the browser EventSource can't set headers. The stream ends
+when the board is deleted or when the user is removed from the board.
+"""
+
+EVENT_STREAM_PATH = re.compile(r"^/api/board/(?P<url>[^/]+)/events/$")
+
+
+# Same as what django does at the start and end of every request, so the database connection doesn't go stale.
+# (Except inside a transaction, which only happens in tests.)
+def _close_old_connections():
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+# Authenticate the token and check access to the board, returns the user and the board
+def _get_user_and_board(token, url):
+    _close_old_connections()
+    try:
+        user, _ = CachingTokenAuthentication().authenticate_credentials(token.encode())
+        board = BoardAccessResolver(user).for_board_url(url).board
+        return user, board
+    finally:
+        _close_old_connections()
+
+
+def _get_token(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.decode("latin1").split()
+            if len(parts) == 2 and parts[0].lower() == "token":
+                return parts[1]
+    query = parse_qs(scope.get("query_string", b"").decode("latin1"))
+    if query.get("token"):
+        return query["token"][0]
+    return None
+
+
+class BoardEventStream:
+    # application is the django ASGI app, which handles everything that isn't an event stream
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            match = EVENT_STREAM_PATH.match(scope["path"])
+            if match:
+                return await self.stream(scope, receive, send, match.group("url"))
+        return await self.application(scope, receive, send)
+
+    async def send_error(self, send, error):
+        body = json.dumps({"detail": str(error.detail)}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": error.status_code,
+            "headers": [(b"content-type", b"application/json")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def send_event(self, send, event):
+        data = json.dumps(event, cls=DjangoJSONEncoder)
+        message = f"id: {event['version']}\nevent: {event['type']}\ndata: {data}\n\n"
+        await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+
+    async def stream(self, scope, receive, send, url):
+        token = _get_token(scope)
+        if token is None:
+            return await self.send_error(send, exceptions.NotAuthenticated())
+        try:
+            user, board = await sync_to_async(_get_user_and_board)(token, url)
+        except exceptions.APIException as error:
+            return await self.send_error(send, error)
+
+        # Subscribe before anything is sent, so no event after "stream.opened" can be missed
+        subscription = get_event_broker().subscribe(board.id)
+        keepalive = getattr(settings, "BOARD_EVENT_KEEPALIVE", 15)
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),  # Don't let nginx buffer the stream
+                ],
+            })
+            await self.send_event(send, {"type": "stream.opened", "board_id": board.id, "version": board.version})
+
+            while True:
+                next_event = asyncio.ensure_future(subscription.get())
+                done, _ = await asyncio.wait(
+                    {next_event, disconnected}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected in done:
+                    next_event.cancel()
+                    return
+                if next_event not in done:
+                    # Nothing happened for a while, send a comment so proxies don't close the connection
+                    next_event.cancel()
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+                    continue
+
+                event = next_event.result()
+                if event is None:  # Closed by the broker
+                    break
+                await self.send_event(send, event)
+                if event["type"] == "board.deleted" or \
+                        (event["type"] == "shared_user.deleted" and event["user_id"] == user.id):
+                    break  # No access to the board anymore
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            disconnected.cancel()
+            subscription.close()
+
+    async def wait_for_disconnect(self, receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
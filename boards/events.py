@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+"""
+Board events.
+Every write to a board (boards/changes.py) publishes events once its transaction is committed, ex:
+    {"type": "task.updated", "board_id": 1, "version": 12, "task": {...}}
+Clients listen to them through the board event stream (boards/event_stream.py) instead of polling the board.
+
+The broker that passes events from the writes to the listeners is pluggable, BOARD_EVENT_BROKER is the import path of
+the broker class. InProcessEventBroker only reaches listeners in the same process, so it is for tests and single
+process deploys (ex: one ASGI server process serving both the API and the event streams). Running several processes
+needs a broker that goes through a shared service.
+
+A broker has two methods:
+    publish(board_id, event) --> called from normal (sync) code, must not block
+    subscribe(board_id) --> called from async code, returns a subscription with "async get()" (returns the next
+                            event, or None if the subscription was closed by the broker) and "close()"
+"""
+
+
+# One listener of one board for the InProcessEventBroker. Events are put on an asyncio queue on the listener's loop.
+class InProcessSubscription:
+    def __init__(self, broker, board_id, max_queued_events):
+        self.broker = broker
+        self.board_id = board_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queued_events)
+        self.closed = False
+
+    # Called from the loop of the listener
+    def _put(self, event):
+        if self.closed:
+            return
+        if self.queue.full():
+            # The listener is too slow, close it instead of keeping events in memory forever. The client reconnects
+            # and gets what it missed from the board changes endpoint.
+            self.close()
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.closed = True
+        self.broker.unsubscribe(self)
+
+
+class InProcessEventBroker:
+    def __init__(self, max_queued_events=100):
+        self.max_queued_events = max_queued_events
+        self.subscriptions = {}  # board id --> set of subscriptions
+        self.lock = threading.Lock()  # publish() is called from other threads than subscribe()
+
+    def publish(self, board_id, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(board_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:  # The loop of the listener is closed
+                subscription.close()
+
+    def subscribe(self, board_id):
+        subscription = InProcessSubscription(self, board_id, self.max_queued_events)
+        with self.lock:
+            self.subscriptions.setdefault(board_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            board_subscriptions = self.subscriptions.get(subscription.board_id, set())
+            board_subscriptions.discard(subscription)
+            if not board_subscriptions:
+                self.subscriptions.pop(subscription.board_id, None)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+# The broker of this process, made from BOARD_EVENT_BROKER the first time it is needed
+def get_event_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = import_string(
+                    getattr(settings, "BOARD_EVENT_BROKER", "boards.events.InProcessEventBroker")
+                )
+                _broker = broker_class()
+    return _broker
+
+
+def publish_events(board_id, events):
+    broker = get_event_broker()
+    for event in events:
+        broker.publish(board_id, event)
@@ -0,0 +1,56 @@
+from rest_framework import exceptions
+
+"""
+Sparse fieldsets of the tasks (?fields= and ?exclude= on the board info and the task list).
+?fields=title,progress_status --> only these fields (and the id, which is always there)
+?exclude=description --> every field except these
+Only the columns of the selected fields are read from the database (QuerySet.only()), so a big description isn't loaded
+at all when it isn't asked for, and the owner is only joined when "owner" is selected.
+"""
+
+TASK_FIELDS = ["id", "date_created", "title", "description", "progress_status", "priority", "owner"]
+
+
+def parse_field_names(value, parameter):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TASK_FIELDS]
+    if unknown:
+        raise exceptions.ValidationError(
+            {parameter: [f"Unknown fields: {', '.join(unknown)}. Must be one of: {', '.join(TASK_FIELDS)}."]}
+        )
+    return names
+
+
+# The task fields selected by the "fields" or "exclude" query parameter, in TASK_FIELDS order. None means every field.
+def get_task_fields(query_params):
+    fields = query_params.get("fields")
+    exclude = query_params.get("exclude")
+    if fields is not None and exclude is not None:
+        raise exceptions.ValidationError({"fields": ["Use either fields or exclude, not both."]})
+    if fields is not None:
+        selected = set(parse_field_names(fields, "fields"))
+    elif exclude is not None:
+        selected = set(TASK_FIELDS) - set(parse_field_names(exclude, "exclude"))
+    else:
+        return None
+    selected.add("id")
+    if len(selected) == len(TASK_FIELDS):
+        return None
+    return [field for field in TASK_FIELDS if field in selected]
+
+
+# Name of the fieldset for the board snapshot cache and the ETag, ex: "full" or "full+id.title.priority"
+def fields_variant(variant, fields):
+    if fields is None:
+        return variant
+    return f"{variant}+{'.'.join(fields)}"
+
+
+# Only load the columns of the fields (plus the required ones, ex: what the list is sorted by). The owner is joined
+# with select_related if it is one of the fields.
+def select_task_fields(tasks, fields, required=()):
+    if fields is None:
+        return tasks.select_related("owner")
+    if "owner" in fields:
+        tasks = tasks.select_related("owner")
+    return tasks.only(*fields, *required)
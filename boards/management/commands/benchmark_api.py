@@ -0,0 +1,250 @@
+import json
+import platform
+import time
+from datetime import datetime, timezone
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from knox.models import AuthToken
+from accounts import urls as accounts_urls
+from boards import urls as boards_urls
+from boards.models import Board, SharedUser, Task
+from .seed_benchmark_data import BENCHMARK_PASSWORD, BENCHMARK_PREFIX
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# One benchmarked request. path and data are functions of (context, iteration, setup result), setup runs before every
+# request without being timed (ex: to create the task that is deleted). token gives the token to use, the benchmark
+# user's token by default.
+class Endpoint:
+    def __init__(self, name, route, method, path, data=None, status=200, setup=None, token=None,
+                 content_type="application/json"):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.path = path
+        self.data = data
+        self.status = status
+        self.setup = setup
+        self.token = token
+        self.content_type = content_type
+
+
+def create_task(context, i):
+    return Task.objects.create(board=context.board, title=f"Benchmark delete {i}", owner=context.user)
+
+
+def create_board(context, i):
+    return Board.objects.create(title=f"Benchmark delete {i}", owner=context.user)
+
+
+def create_share(context, i):
+    return SharedUser.objects.get_or_create(board=context.board, shared_user=context.other_user)[0]
+
+
+def remove_share(context, i):
+    SharedUser.objects.filter(board=context.board, shared_user=context.other_user).delete()
+
+
+def create_token(context, i):
+    return AuthToken.objects.create(context.user)[1]
+
+
+def import_body(context, i, state):
+    return "\n".join(json.dumps({"title": f"Benchmark import {i} {row}"}) for row in range(100))
+
+
+# Every route of boards/urls.py and accounts/urls.py. Writes make new objects with unique titles each time.
+ENDPOINTS = [
+    Endpoint("auth.register", "api/auth/register/", "post", lambda c, i, s: "/api/auth/register/",
+             lambda c, i, s: {"username": f"benchmark-register-{i}", "email": f"benchmark-register-{i}@example.com",
+                              "password": "benchmark-password", "first_name": "Bench", "last_name": "Mark"},
+             status=201),
+    Endpoint("auth.login", "api/auth/login/", "post", lambda c, i, s: "/api/auth/login/",
+             lambda c, i, s: {"username": c.user.username, "password": BENCHMARK_PASSWORD}),
+    Endpoint("auth.user", "api/auth/user/", "get", lambda c, i, s: "/api/auth/user/"),
+    Endpoint("auth.logout", "api/auth/logout/", "post", lambda c, i, s: "/api/auth/logout/",
+             status=204, setup=create_token, token=lambda c, i, s: s),
+    Endpoint("auth.logoutall", "api/auth/logoutall/", "post", lambda c, i, s: "/api/auth/logoutall/",
+             status=204, setup=lambda c, i: AuthToken.objects.create(c.other_user)[1], token=lambda c, i, s: s),
+    Endpoint("board.create", "api/board/create/", "post", lambda c, i, s: "/api/board/create/",
+             lambda c, i, s: {"title": f"Benchmark create {i}"}, status=201),
+    Endpoint("board.list", "api/board/list/", "get", lambda c, i, s: "/api/board/list/"),
+    Endpoint("board.list.summary", "api/board/list/", "get", lambda c, i, s: "/api/board/list/?include=summary"),
+    Endpoint("board.info", "api/board/<str:url>/", "get", lambda c, i, s: f"/api/board/{c.board.url}/"),
+    Endpoint("board.info.compact", "api/board/<str:url>/", "get",
+             lambda c, i, s: f"/api/board/{c.board.url}/?payload=compact&exclude=description"),
+    Endpoint("board.update", "api/board/<str:url>/", "put", lambda c, i, s: f"/api/board/{c.board.url}/",
+             lambda c, i, s: {"title": f"Benchmark renamed {i}"}, status=204),
+    Endpoint("board.delete", "api/board/<str:url>/", "delete", lambda c, i, s: f"/api/board/{s.url}/",
+             setup=create_board),
+    Endpoint("task.list", "api/board/<str:url>/tasks/", "get", lambda c, i, s: f"/api/board/{c.board.url}/tasks/"),
+    Endpoint("task.bulk", "api/board/<str:url>/tasks/bulk/", "post",
+             lambda c, i, s: f"/api/board/{c.board.url}/tasks/bulk/",
+             lambda c, i, s: {"operations": [{"op": "create", "title": f"Benchmark bulk {i} {n}"} for n in range(20)]}),
+    Endpoint("board.changes", "api/board/<str:url>/changes/", "get",
+             lambda c, i, s: f"/api/board/{c.board.url}/changes/?since={s}",
+             setup=lambda c, i: max(0, Board.objects.get(id=c.board.id).version - 5)),
+    Endpoint("board.summary", "api/board/<str:url>/summary/", "get",
+             lambda c, i, s: f"/api/board/{c.board.url}/summary/"),
+    Endpoint("board.export", "api/board/<str:url>/export/", "get",
+             lambda c, i, s: f"/api/board/{c.board.url}/export/"),
+    Endpoint("board.import", "api/board/<str:url>/import/", "post",
+             lambda c, i, s: f"/api/board/{c.board.url}/import/", import_body, status=201,
+             content_type="application/x-ndjson"),
+    Endpoint("shareduser.create", "api/shareduser/create/", "post", lambda c, i, s: "/api/shareduser/create/",
+             lambda c, i, s: {"board_id": c.board.id, "shared_user_email": c.other_user.email}, status=201,
+             setup=remove_share),
+    Endpoint("shareduser.delete", "api/shareduser/delete/", "delete", lambda c, i, s: "/api/shareduser/delete/",
+             lambda c, i, s: {"board_id": c.board.id, "shared_user_email": c.other_user.email}, setup=create_share),
+    Endpoint("task.create", "api/task/create/", "post", lambda c, i, s: "/api/task/create/",
+             lambda c, i, s: {"board": c.board.id, "title": f"Benchmark task {i}"}),
+    Endpoint("task.search", "api/task/search/", "get", lambda c, i, s: "/api/task/search/?q=login+bug"),
+    Endpoint("task.info", "api/task/<int:pk>/", "get", lambda c, i, s: f"/api/task/{c.task.id}/"),
+    Endpoint("task.update", "api/task/<int:pk>/", "put", lambda c, i, s: f"/api/task/{c.task.id}/",
+             lambda c, i, s: {"board": c.board.id, "title": f"Benchmark updated {i}", "owner": c.user.id}),
+    Endpoint("task.delete", "api/task/<int:pk>/", "delete", lambda c, i, s: f"/api/task/{s.id}/",
+             setup=create_task),
+]
+
+
+# The routes of the url patterns (the knox include isn't ours, its views are replaced by accounts/urls.py)
+def api_routes():
+    return [
+        str(pattern.pattern)
+        for urls in [accounts_urls, boards_urls]
+        for pattern in urls.urlpatterns
+        if isinstance(pattern, URLPattern)
+    ]
+
+
+class BenchmarkContext:
+    def __init__(self, user, other_user, board, task, token):
+        self.user = user
+        self.other_user = other_user
+        self.board = board
+        self.task = task
+        self.token = token
+
+
+# Latency, throughput and queries of every API endpoint, on the data of seed_benchmark_data. The requests go through
+# the test client (the whole django stack, without a server). The benchmark user is the owner of the biggest board.
+# Writes are rolled back at the end, so runs on the same data can be compared. The results are JSON (--output file).
+# python manage.py benchmark_api --iterations 100 --output results.json [--endpoint board.info --endpoint task.list]
+class Command(BaseCommand):
+    help = "Benchmark every API endpoint on the benchmark data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50, help="Timed requests per endpoint")
+        parser.add_argument("--warmup", type=int, default=3, help="Requests per endpoint before timing")
+        parser.add_argument("--endpoint", action="append", help="Only run these endpoints (by name)")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS
+        if options["endpoint"]:
+            unknown = set(options["endpoint"]) - {endpoint.name for endpoint in ENDPOINTS}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in options["endpoint"]]
+
+        board = Board.objects.filter(owner__username__startswith=BENCHMARK_PREFIX) \
+            .annotate(task_count=Count("tasks")).order_by("-task_count").select_related("owner").first()
+        if board is None:
+            raise CommandError("No benchmark data, run python manage.py seed_benchmark_data first")
+
+        results = {}
+        try:
+            with transaction.atomic():
+                user = board.owner
+                other_user = User.objects.filter(username__startswith=BENCHMARK_PREFIX).exclude(id=user.id).first() \
+                    or User.objects.create_user(f"{BENCHMARK_PREFIX}other", f"{BENCHMARK_PREFIX}other@example.com")
+                task = Task.objects.filter(board=board).order_by("id").first() \
+                    or Task.objects.create(board=board, title="Benchmark task", owner=user)
+                context = BenchmarkContext(user, other_user, board, task, AuthToken.objects.create(user)[1])
+                client = Client(HTTP_HOST="localhost")
+                for endpoint in endpoints:
+                    results[endpoint.name] = self.run(client, context, endpoint, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+        output = {
+            "meta": {
+                "time": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "iterations": options["iterations"],
+                "board_tasks": board.task_count,
+                "users": User.objects.filter(username__startswith=BENCHMARK_PREFIX).count(),
+                "boards": Board.objects.filter(owner__username__startswith=BENCHMARK_PREFIX).count(),
+                "tasks": Task.objects.filter(board__owner__username__startswith=BENCHMARK_PREFIX).count(),
+                "not_benchmarked": sorted(set(api_routes()) - {endpoint.route for endpoint in ENDPOINTS}),
+            },
+            "endpoints": results,
+        }
+        text = json.dumps(output, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(text + "\n")
+            self.stderr.write(f"Results written to {options['output']}")
+        else:
+            self.stdout.write(text)
+
+    def request(self, client, context, endpoint, i):
+        state = endpoint.setup(context, i) if endpoint.setup else None
+        token = endpoint.token(context, i, state) if endpoint.token else context.token
+        kwargs = {"HTTP_AUTHORIZATION": f"Token {token}"}
+        if endpoint.data is not None:
+            data = endpoint.data(context, i, state)
+            kwargs["data"] = data if isinstance(data, str) else json.dumps(data)
+            kwargs["content_type"] = endpoint.content_type
+
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, endpoint.method)(endpoint.path(context, i, state), **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries), response.status_code
+
+    def run(self, client, context, endpoint, options):
+        self.stderr.write(f"{endpoint.name}...")
+        for i in range(options["warmup"]):
+            self.request(client, context, endpoint, f"warmup-{i}")
+
+        latencies = []
+        query_counts = []
+        errors = 0
+        for i in range(options["iterations"]):
+            elapsed, queries, status_code = self.request(client, context, endpoint, i)
+            latencies.append(elapsed)
+            query_counts.append(queries)
+            if status_code != endpoint.status:
+                errors += 1
+        total = sum(latencies)
+        return {
+            "route": endpoint.route,
+            "method": endpoint.method.upper(),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "requests_per_second": round(len(latencies) / total, 1) if total else None,
+            "queries_mean": round(sum(query_counts) / len(query_counts), 2),
+            "queries_max": max(query_counts),
+            "errors": errors,
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from knox.models import AuthToken
+from boards.models import Board, Task
+
+BENCHMARK_USERNAME = "benchmark-async-user"
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# Compare the read endpoints (board info, board list, user) served by the sync WSGI app (scrummaster/wsgi.py) and the
+# async ASGI app (scrummaster/asgi.py, see scrummaster/async_views.py) on the same data, with many clients at once.
+# Each app is run in its own process (the async views are picked when the urls are loaded). The requests are sent
+# straight to the app, without a server. --db-latency adds a wait to every query, like a database on another machine.
+# The benchmark user and boards are deleted at the end.
+# python manage.py benchmark_async --clients 64 --threads 8 --requests 2000 --db-latency 5
+class Command(BaseCommand):
+    help = "Benchmark the read endpoints under sync WSGI and async ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=64, help="Clients sending requests at the same time")
+        parser.add_argument("--threads", type=int, default=8,
+                            help="WSGI worker threads, and ASYNC_ORM_MAX_WORKERS for ASGI")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per app")
+        parser.add_argument("--tasks", type=int, default=200, help="Tasks on the benchmark board")
+        parser.add_argument("--db-latency", type=float, default=5, help="Milliseconds added to every query")
+        # Used by the benchmark to run one app in a child process
+        parser.add_argument("--serve", choices=["wsgi", "asgi"], help="(internal) Run one app")
+        parser.add_argument("--token", help="(internal)")
+        parser.add_argument("--board-url", help="(internal)")
+
+    def handle(self, *args, **options):
+        if options["serve"]:
+            return self.serve(options)
+
+        if User.objects.filter(username=BENCHMARK_USERNAME).exists():
+            raise CommandError("The benchmark user already exists, is another benchmark running?")
+        user = User.objects.create_user(BENCHMARK_USERNAME, "benchmark-async@example.com", "benchmark")
+        try:
+            token = AuthToken.objects.create(user)[1]
+            board = Board.objects.create(title="Benchmark board", owner=user)
+            Task.objects.bulk_create([
+                Task(board=board, title=f"Task {i}", description=f"Description of task {i}", priority=i % 5 + 1,
+                     owner=user if i % 2 else None)
+                for i in range(options["tasks"])
+            ])
+            Board.objects.bulk_create([Board(title=f"Benchmark board {i}", owner=user) for i in range(10)])
+
+            self.stdout.write(
+                f"{options['requests']} requests, {options['clients']} clients, {options['threads']} threads, "
+                f"{options['db_latency']} ms per query"
+            )
+            for app in ["wsgi", "asgi"]:
+                result = self.run_child(app, token, board, options)
+                self.stdout.write(
+                    f"{app:>5}: {result['requests_per_second']:8.1f} req/s, p50 {result['p50_ms']:7.1f} ms, "
+                    f"p95 {result['p95_ms']:7.1f} ms, p99 {result['p99_ms']:7.1f} ms, "
+                    f"{result['db_threads']} threads used the database, {result['errors']} errors"
+                )
+        finally:
+            Board.objects.filter(owner=user).delete()
+            user.delete()
+
+    def run_child(self, app, token, board, options):
+        command = [
+            sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "benchmark_async", "--serve", app,
+            "--token", token, "--board-url", str(board.url),
+        ]
+        for option in ["clients", "threads", "requests", "db_latency"]:
+            command += [f"--{option.replace('_', '-')}", str(options[option])]
+        env = dict(os.environ, ASYNC_READ_VIEWS="1" if app == "asgi" else "0")
+        connections.close_all()  # Nothing is left open (ex: SQLite locks) while the child runs
+        child = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if child.returncode != 0:
+            raise CommandError(f"The {app} benchmark failed:\n{child.stderr}")
+        return json.loads(child.stdout.strip().splitlines()[-1])
+
+    def serve(self, options):
+        # Every query waits db_latency, and the threads that run queries (each has its own connection) are counted
+        db_threads = set()
+        latency = options["db_latency"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            db_threads.add(threading.get_ident())
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        # (Called every time the thread connects again, the wrapper is only added once)
+        def add_latency(sender, connection, **kwargs):
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        connection_created.connect(add_latency, weak=False)
+        connections.close_all()
+
+        paths = [f"/api/board/{options['board_url']}/", "/api/board/list/", "/api/auth/user/"]
+        requests_per_client = max(1, options["requests"] // options["clients"])
+        if options["serve"] == "wsgi":
+            latencies, errors, elapsed = self.run_wsgi(paths, options, requests_per_client)
+        else:
+            latencies, errors, elapsed = self.run_asgi(paths, options, requests_per_client)
+
+        self.stdout.write(json.dumps({
+            "requests_per_second": len(latencies) / elapsed,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "db_threads": len(db_threads),
+            "errors": errors,
+        }))
+
+    # WSGI: a pool of worker threads (like a threaded WSGI server), every client waits for its request to be handled
+    def run_wsgi(self, paths, options, requests_per_client):
+        from scrummaster.wsgi import application
+
+        def handle(path):
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+                "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost", "REMOTE_ADDR": "127.0.0.1",
+                "HTTP_AUTHORIZATION": f"Token {options['token']}", "wsgi.input": BytesIO(), "wsgi.errors": sys.stderr,
+                "wsgi.url_scheme": "http", "wsgi.version": (1, 0), "wsgi.multithread": True,
+                "wsgi.multiprocess": False, "wsgi.run_once": False,
+            }
+            statuses = []
+            result = application(environ, lambda status, headers: statuses.append(status))
+            try:
+                b"".join(result)
+            finally:
+                result.close()  # Ends the request (closes the database connection)
+            return statuses[0].startswith("200")
+
+        latencies = []
+        errors = []
+        server = ThreadPoolExecutor(max_workers=options["threads"])
+        clients_left = [options["clients"]]
+        done = threading.Event()
+        lock = threading.Lock()
+
+        # The clients aren't threads (that would add threads the server doesn't have), the next request of a client is
+        # sent when its previous one is done
+        def send(number, i):
+            start = time.perf_counter()
+            future = server.submit(handle, paths[(number + i) % len(paths)])
+            future.add_done_callback(lambda future: received(number, i, start, future))
+
+        def received(number, i, start, future):
+            latencies.append(time.perf_counter() - start)
+            if future.exception() is not None or not future.result():
+                errors.append(1)
+            if i + 1 < requests_per_client:
+                return send(number, i + 1)
+            with lock:
+                clients_left[0] -= 1
+                if not clients_left[0]:
+                    done.set()
+
+        start = time.perf_counter()
+        for number in range(options["clients"]):
+            send(number, 0)
+        done.wait()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        return latencies, len(errors), elapsed
+
+    # ASGI: one event loop for every client, the ORM work runs in ASYNC_ORM_MAX_WORKERS threads
+    def run_asgi(self, paths, options, requests_per_client):
+        settings.ASYNC_ORM_MAX_WORKERS = options["threads"]
+        from scrummaster.asgi import application
+
+        async def handle(path):
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                "headers": [(b"host", b"localhost"), (b"authorization", f"Token {options['token']}".encode())],
+                "server": ("localhost", 80), "client": ("127.0.0.1", 0),
+            }
+            disconnected = asyncio.Event()
+            messages = [{"type": "http.request", "body": b"", "more_body": False}]
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+
+            await application(scope, receive, send)
+            disconnected.set()
+            return statuses[0] == 200
+
+        latencies = []
+        errors = []
+
+        async def client(number):
+            for i in range(requests_per_client):
+                start = time.perf_counter()
+                if not await handle(paths[(number + i) % len(paths)]):
+                    errors.append(1)
+                latencies.append(time.perf_counter() - start)
+
+        async def run():
+            await asyncio.gather(*[client(number) for number in range(options["clients"])])
+
+        start = time.perf_counter()
+        asyncio.run(run())
+        return latencies, len(errors), time.perf_counter() - start
@@ -0,0 +1,85 @@
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from boards.models import Board, SharedUser, Task
+from boards.serializers import BoardCompactSerializer, BoardInfoUrlSerializer
+from scrummaster.renderers import CompatibleJSONRenderer, FastJSONRenderer, MessagePackRenderer, orjson
+
+
+class Rollback(Exception):
+    pass
+
+
+# Compare the encode time, payload size and JSON parse time of the response renderers (scrummaster/renderers.py) on a
+# large board, for the full and the compact (?payload=compact) board info. The board is temporary, everything is rolled
+# back at the end.
+# python manage.py benchmark_renderers --tasks 5000 --runs 20
+class Command(BaseCommand):
+    help = "Benchmark the JSON and MessagePack renderers on a large board"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=5000, help="Tasks on the board")
+        parser.add_argument("--runs", type=int, default=20, help="Encodes per renderer")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                payloads = self.board_info(options["tasks"])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if not MessagePackRenderer.available:
+            self.stdout.write("msgpack isn't installed, skipping MessagePackRenderer")
+        for payload, data in payloads.items():
+            self.stdout.write(f"{payload} board info, {options['tasks']} tasks:")
+            for name, encode in self.encoders(data):
+                self.run(name, encode, options["runs"])
+
+    def encoders(self, data):
+        encoders = [
+            ("JsonResponse", lambda: json.dumps(data, cls=DjangoJSONEncoder).encode()),
+            ("CompatibleJSONRenderer", lambda: CompatibleJSONRenderer().render(data)),
+            ("FastJSONRenderer" if orjson else "FastJSONRenderer (no orjson)", lambda: FastJSONRenderer().render(data)),
+        ]
+        if MessagePackRenderer.available:
+            encoders.append(("MessagePackRenderer", lambda: MessagePackRenderer().render(data)))
+        return encoders
+
+    # The board info (GET api/board/<url>/, full and compact) of a new board with shared users and tasks
+    def board_info(self, tasks):
+        owner = User.objects.create_user("benchmark-renderers-owner", "benchmark-owner@example.com", "benchmark")
+        users = [
+            User.objects.create_user(f"benchmark-renderers-{i}", f"benchmark-{i}@example.com", "benchmark")
+            for i in range(10)
+        ]
+        board = Board.objects.create(title="Benchmark board", owner=owner)
+        SharedUser.objects.bulk_create([SharedUser(board=board, shared_user=user) for user in users])
+        Task.objects.bulk_create([
+            Task(board=board, title=f"Task {i}", description=f"Description of task {i} " * 4,
+                 priority=i % 5 + 1, owner=users[i % len(users)] if i % 3 else None)
+            for i in range(tasks)
+        ])
+        return {
+            "full": BoardInfoUrlSerializer(board.url).data,
+            "compact": BoardCompactSerializer(board.url).data,
+        }
+
+    def run(self, name, encode, runs):
+        content = encode()  # Warm up
+        start = time.perf_counter()
+        for _ in range(runs):
+            encode()
+        elapsed = time.perf_counter() - start
+        line = f"{name:>30}: {elapsed / runs * 1e3:8.2f} ms/encode, {len(content) / 1024:8.1f} KiB"
+
+        # How long a client takes to parse it (with the json module)
+        if "MessagePack" not in name:
+            start = time.perf_counter()
+            for _ in range(runs):
+                json.loads(content)
+            line += f", {(time.perf_counter() - start) / runs * 1e3:8.2f} ms/parse"
+        self.stdout.write(line)
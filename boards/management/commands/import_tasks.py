@@ -0,0 +1,36 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import exceptions
+from boards.models import Board
+from boards.changes import record_changes
+from boards.transfer import IMPORT_BATCH_SIZE, READERS, import_tasks
+
+
+# Add tasks to a board from an NDJSON or CSV file, like POST api/board/<url>/import/ (see boards/transfer.py)
+# python manage.py import_tasks <board url> tasks.csv [--batch-size 5000]
+class Command(BaseCommand):
+    help = "Import tasks into a board from an NDJSON or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("board_url", help="url (UUID) of the board")
+        parser.add_argument("path", help="NDJSON or CSV file, the format is taken from the extension")
+        parser.add_argument("--import-format", choices=list(READERS), help="Format of the file (default: extension)")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Tasks inserted at a time")
+
+    def handle(self, *args, **options):
+        try:
+            board = Board.objects.get(url=options["board_url"])
+        except (Board.DoesNotExist, ValidationError):
+            raise CommandError("No board with that url")
+        import_format = options["import_format"] or ("csv" if options["path"].endswith(".csv") else "ndjson")
+
+        with open(options["path"], newline="", encoding="utf-8") as file:
+            try:
+                with record_changes(board.id) as changes:
+                    result = import_tasks(board, READERS[import_format](file), changes, options["batch_size"])
+            except exceptions.ValidationError as error:
+                raise CommandError(f"Nothing was imported: {error.detail}")
+
+        self.stdout.write(
+            f"Imported {result['imported']} tasks in {result['seconds']}s ({result['rows_per_second']} rows/sec)"
+        )
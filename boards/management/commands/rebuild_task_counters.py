@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from boards.models import Board
+from boards.changes import record_changes
+from boards.counters import count_tasks, saved_counts, replace_counts
+
+
+# Count the tasks of every board again and fix the board task counters (boards/counters.py) that are wrong.
+# python manage.py rebuild_task_counters [--check] [--board <id> ...]
+class Command(BaseCommand):
+    help = "Verify the board task counters against the tasks and rebuild the ones that are wrong"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report wrong counters, don't fix them")
+        parser.add_argument("--board", type=int, action="append", help="Board id (default: every board)")
+
+    def handle(self, *args, **options):
+        board_ids = options["board"] or Board.objects.order_by("id").values_list("id", flat=True).iterator()
+        checked = 0
+        wrong = []
+        for board_id in board_ids:
+            checked += 1
+            if count_tasks(board_id) == saved_counts(board_id):
+                continue
+            if not options["check"]:
+                # Counted again as a write to the board, so no task write can happen in between and the new board
+                # version tells clients the summary changed
+                with record_changes(board_id):
+                    replace_counts(board_id, count_tasks(board_id))
+            wrong.append(board_id)
+            self.stdout.write(f"Board {board_id}: counters {'wrong' if options['check'] else 'rebuilt'}")
+
+        self.stdout.write(f"Checked {checked} boards, {len(wrong)} with wrong counters")
+        if options["check"] and wrong:
+            raise CommandError("Some board task counters are wrong, run without --check to rebuild them")
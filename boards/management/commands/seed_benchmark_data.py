@@ -0,0 +1,93 @@
+import random
+import time
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from boards.changes import record_changes
+from boards.models import PROGRESS_STATUSES, Board, SharedUser, Task
+
+BENCHMARK_PREFIX = "bench-"  # Username prefix of the generated users
+BENCHMARK_PASSWORD = "benchmark-password"
+
+
+# Number of tasks of every board. Board sizes are skewed (Pareto distribution, most boards are small and a few are very
+# big), the biggest board has max_tasks tasks so there is always one large board to benchmark.
+def board_sizes(boards, max_tasks, skew, rng):
+    sizes = [min(max_tasks, int(rng.paretovariate(skew) * 5) - 5) for _ in range(boards)]
+    if sizes:
+        sizes[0] = max_tasks
+    return sizes
+
+
+# Generate users, boards, shared users and tasks for the benchmarks (python manage.py benchmark_api). Every generated
+# user's username starts with "bench-" and the password is "benchmark-password", --clear deletes them (and their
+# boards) first. The same --seed gives the same data.
+# python manage.py seed_benchmark_data --users 200 --boards 500 --max-tasks 5000 --clear
+class Command(BaseCommand):
+    help = "Generate users, boards, shared users and tasks for the benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Users to create")
+        parser.add_argument("--boards", type=int, default=200, help="Boards to create, owned by random users")
+        parser.add_argument("--max-tasks", type=int, default=2000, help="Tasks on the biggest board")
+        parser.add_argument("--skew", type=float, default=1.2,
+                            help="Pareto shape of the board sizes, smaller values give bigger boards")
+        parser.add_argument("--max-shares", type=int, default=5, help="Most shared users per board")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed")
+        parser.add_argument("--clear", action="store_true", help="Delete the benchmark data generated before")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1:
+            raise CommandError("At least one user is needed")
+        if options["clear"]:
+            deleted = User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()[0]
+            self.stdout.write(f"Deleted {deleted} rows of benchmark data")
+        elif User.objects.filter(username__startswith=BENCHMARK_PREFIX).exists():
+            raise CommandError("There is benchmark data already, use --clear to replace it")
+
+        rng = random.Random(options["seed"])
+        start = time.perf_counter()
+        with transaction.atomic():
+            users = self.create_users(options["users"])
+            sizes = board_sizes(options["boards"], options["max_tasks"], options["skew"], rng)
+            shares = 0
+            for number, size in enumerate(sizes):
+                owner = users[0] if number == 0 else rng.choice(users)
+                board = Board.objects.create(title=f"Benchmark board {number}", owner=owner)
+                shares += self.share_board(board, users, rng.randint(0, options["max_shares"]), rng)
+                self.create_tasks(board, size, users, rng)
+
+        self.stdout.write(
+            f"Created {len(users)} users, {len(sizes)} boards, {shares} shared users and {sum(sizes)} tasks "
+            f"(biggest board {max(sizes, default=0)} tasks) in {time.perf_counter() - start:.1f}s"
+        )
+
+    def create_users(self, amount):
+        password = make_password(BENCHMARK_PASSWORD)  # Hashed once, every user gets the same password
+        User.objects.bulk_create([
+            User(username=f"{BENCHMARK_PREFIX}{number}", email=f"{BENCHMARK_PREFIX}{number}@example.com",
+                 first_name="Bench", last_name=f"User {number}", password=password)
+            for number in range(amount)
+        ])
+        return list(User.objects.filter(username__startswith=BENCHMARK_PREFIX).order_by("id"))
+
+    def share_board(self, board, users, amount, rng):
+        candidates = [user for user in users if user.id != board.owner_id]
+        shared_users = rng.sample(candidates, min(amount, len(candidates)))
+        SharedUser.objects.bulk_create([SharedUser(board=board, shared_user=user) for user in shared_users])
+        return len(shared_users)
+
+    # Inserted like an import (boards/transfer.py), so the task counters and the board version are kept up to date
+    def create_tasks(self, board, amount, users, rng):
+        with record_changes(board.id) as changes:
+            tasks = [
+                Task(board_id=board.id, title=f"Task {number}",
+                     description=" ".join(rng.choice(["fix", "add", "update", "the", "login", "board", "page", "bug",
+                                                       "test", "api"]) for _ in range(rng.randint(3, 40))),
+                     progress_status=rng.choice(PROGRESS_STATUSES), priority=rng.randint(1, 5),
+                     owner=rng.choice(users) if rng.random() < 0.7 else None, change_seq=changes.version)
+                for number in range(amount)
+            ]
+            Task.objects.bulk_create(tasks, batch_size=1000)
+            changes.tasks_imported(tasks)
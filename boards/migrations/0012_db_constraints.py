@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:03
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+# Shares made before the unique constraint can have duplicates, keep the first one of each
+def delete_duplicate_shared_users(apps, schema_editor):
+    SharedUser = apps.get_model('boards', 'SharedUser')
+    duplicates = SharedUser.objects.values('board_id', 'shared_user_id') \
+        .annotate(count=Count('id'), first_id=Min('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        SharedUser.objects.filter(board_id=duplicate['board_id'], shared_user_id=duplicate['shared_user_id']) \
+            .exclude(id=duplicate['first_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0011_change_tracking'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_shared_users, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shareduser',
+            index=models.Index(fields=['shared_user', 'board'], name='boards_shared_user_board_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['board', 'priority', 'id'], name='boards_task_board_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['board', 'progress_status', 'priority', 'id'], name='boards_task_board_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shareduser',
+            constraint=models.UniqueConstraint(fields=('board', 'shared_user'), name='boards_shareduser_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0012_db_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='title',
+            field=models.CharField(default='Title', max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('board', 'title'), name='boards_task_board_title_unique'),
+        ),
+    ]
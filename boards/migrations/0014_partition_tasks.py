@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import migrations
+
+"""
+Optional partitioning of the task table by board (TASK_PARTITIONS in settings.py).
+With Postgres and TASK_PARTITIONS set, the task table is turned into a table partitioned by the hash of board_id, with
+that many partitions. Reads and deletes of one board's tasks (the board info, board.delete()) then only touch the
+partition of the board. Otherwise (ex: SQLite in the tests) the table stays one normal table.
+
+TASK_PARTITIONS is read when this migration runs. The tasks are copied to the new table, so the migration takes as long
+as copying the table.
+
+The primary key of a partitioned table has to include the partition key, so it becomes (id, board_id). id is still
+unique, it comes from the same sequence as before.
+"""
+
+
+def partition_tasks(apps, schema_editor):
+    connection = schema_editor.connection
+    partitions = getattr(settings, "TASK_PARTITIONS", 0)
+    if connection.vendor != "postgresql" or not partitions:
+        return
+
+    table = apps.get_model("boards", "Task")._meta.db_table
+    new_table = f"{table}_partitioned"
+    quote = schema_editor.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [table])
+        if cursor.fetchone():
+            return  # Already partitioned
+        constraints = connection.introspection.get_constraints(cursor, table)
+        sequence = connection.introspection.get_sequences(cursor, table)[0]["name"]
+
+    # The new table has the same columns, defaults and checks, then the tasks are moved to it
+    statements = [
+        f"CREATE TABLE {quote(new_table)} (LIKE {quote(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY HASH (board_id)",
+    ]
+    for remainder in range(partitions):
+        statements.append(
+            f"CREATE TABLE {quote(f'{table}_p{remainder}')} PARTITION OF {quote(new_table)} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        )
+    statements += [
+        f"INSERT INTO {quote(new_table)} SELECT * FROM {quote(table)}",
+        f"ALTER SEQUENCE {quote(sequence)} OWNED BY NONE",  # So it isn't dropped with the old table
+        f"DROP TABLE {quote(table)}",
+        f"ALTER TABLE {quote(new_table)} RENAME TO {quote(table)}",
+        f"ALTER SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.id",
+        f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, board_id)",
+    ]
+
+    # Make the indexes and constraints of the old table again, with the same names so later migrations find them
+    for name, constraint in constraints.items():
+        if constraint["primary_key"] or constraint["check"]:
+            continue  # The primary key is made above, the checks were copied with the columns
+        columns = ", ".join(quote(column) for column in constraint["columns"])
+        if constraint["foreign_key"]:
+            to_table, to_column = constraint["foreign_key"]
+            statements.append(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} FOREIGN KEY ({columns}) "
+                f"REFERENCES {quote(to_table)} ({quote(to_column)}) DEFERRABLE INITIALLY DEFERRED"
+            )
+        elif constraint["unique"]:
+            statements.append(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} UNIQUE ({columns})")
+        elif constraint["index"]:
+            statements.append(f"CREATE INDEX {quote(name)} ON {quote(table)} ({columns})")
+
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0013_task_title_per_board'),
+    ]
+
+    operations = [
+        # Going back leaves the table partitioned, it works the same way for django
+        migrations.RunPython(partition_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+# Count the tasks that already exist
+def count_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('boards', 'Task')
+    BoardTaskCounter = apps.get_model('boards', 'BoardTaskCounter')
+    rows = Task.objects.values('board_id', 'progress_status', 'priority').annotate(count=Count('id')).order_by()
+    BoardTaskCounter.objects.bulk_create([BoardTaskCounter(**row) for row in rows.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0014_partition_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoardTaskCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('progress_status', models.CharField(max_length=50)),
+                ('priority', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+                ('board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_counters', to='boards.board')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='boardtaskcounter',
+            constraint=models.UniqueConstraint(fields=('board', 'progress_status', 'priority'), name='boards_counter_unique'),
+        ),
+        migrations.RunPython(count_existing_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,92 @@
+from django.db import migrations
+
+"""
+Full text search index of the tasks (see boards/search.py).
+Postgres: a generated tsvector column with a GIN index. SQLite: an FTS5 table with triggers that keep it up to date.
+"""
+
+POSTGRES_CREATE = [
+    """
+    ALTER TABLE boards_task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX boards_task_search_idx ON boards_task USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX boards_task_search_idx",
+    "ALTER TABLE boards_task DROP COLUMN search_vector",
+]
+
+# The FTS5 table only has the index, the text is read from boards_task (external content table)
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE boards_task_fts USING fts5(
+        title, description, content='boards_task', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    "INSERT INTO boards_task_fts(boards_task_fts) VALUES ('rebuild')",  # Index the tasks that already exist
+]
+
+# Also used by later migrations that make SQLite rebuild the task table (which drops the triggers)
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER boards_task_fts_insert AFTER INSERT ON boards_task BEGIN
+        INSERT INTO boards_task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER boards_task_fts_delete AFTER DELETE ON boards_task BEGIN
+        INSERT INTO boards_task_fts(boards_task_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER boards_task_fts_update AFTER UPDATE OF title, description ON boards_task BEGIN
+        INSERT INTO boards_task_fts(boards_task_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO boards_task_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS boards_task_fts_insert",
+    "DROP TRIGGER IF EXISTS boards_task_fts_delete",
+    "DROP TRIGGER IF EXISTS boards_task_fts_update",
+    "DROP TABLE boards_task_fts",
+]
+
+
+def run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        run(schema_editor, POSTGRES_CREATE)
+    elif vendor == "sqlite":
+        run(schema_editor, SQLITE_CREATE + SQLITE_TRIGGERS)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        run(schema_editor, POSTGRES_DROP)
+    elif vendor == "sqlite":
+        run(schema_editor, SQLITE_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('boards', '0015_board_task_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,7 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.core.exceptions import ValidationError
 import uuid
 
 # TODO: make shared_user have attribute of can_create, can_edit, etc which is set by the owner of a board when they
@@ -9,12 +8,20 @@ import uuid
 #  also, needs_validation which forces owner to accept/reject tasks before putting it on the board
 
 
+# the progress statuses the frontend uses for tasks (not enforced, progress_status is free text)
+PROGRESS_STATUSES = ["STUCK", "WORKING", "DONE", "ARCHIVED", "FUTURE"]
+
+
 # one board is one project or scrum board
 class Board(models.Model):
     title = models.CharField(max_length=100)  # title of the board
     owner = models.ForeignKey(User, related_name="board", on_delete=models.CASCADE)  # who owns/creates the board
     created_at = models.DateTimeField(auto_now_add=True)  # when it was created
     url = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    # goes up by one every time the board, its tasks or its shared users change, used for caching the board info and
+    # as the change sequence of the board (see boards/changes.py)
+    version = models.PositiveIntegerField(default=0, editable=False)
+    change_seq = models.PositiveIntegerField(default=0, editable=False)  # board version when the title last changed
 
     class Meta:
         unique_together = ['title', 'owner']
@@ -39,6 +46,18 @@ class SharedUser(models.Model):
     board = models.ForeignKey(Board, related_name="shared_users", on_delete=models.CASCADE)  # board allowed on
     # user allowed on the board
     shared_user = models.ForeignKey(User, related_name="shared_boards", on_delete=models.CASCADE)
+    change_seq = models.PositiveIntegerField(default=0, editable=False)  # board version when this was last changed
+
+    class Meta:
+        constraints = [
+            # you can't be shared to a board twice
+            models.UniqueConstraint(fields=['board', 'shared_user'], name='boards_shareduser_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'change_seq'], name='boards_shared_board_seq_idx'),
+            # the boards shared to a user (board list)
+            models.Index(fields=['shared_user', 'board'], name='boards_shared_user_board_idx'),
+        ]
 
     def __str__(self):
         return f"SHARED USER OBJECT. Board: \"{self.board}\", Shared user: \"{self.shared_user}\""
@@ -53,26 +72,45 @@ class SharedUser(models.Model):
             "shared_user_id": self.shared_user_id,
         }
 
-    # this ensures there can be no duplicate shared user models (ie, you can't be shared to a board twice)
-    def validate_unique(self, exclude=None, *args, **kwargs):
-        super(SharedUser, self).validate_unique(*args, **kwargs)
-        if self.__class__.objects.filter(board=self.board, shared_user=self.shared_user).exists():
-            raise ValidationError(message="SharedUser with this board and name already exists")
-
 
 # many-to-one, many tasks in one board
 class Task(models.Model):
     board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name="tasks")  # board the task belongs to
     date_created = models.DateTimeField(auto_now_add=True)  # when created
-    title = models.CharField(max_length=100, unique=True, default="Title")  # title, unique so no copies
+    title = models.CharField(max_length=100, default="Title")  # title, unique in its board so no copies
     description = models.TextField(default="")  # description, can be left blank aka ""
     progress_status = models.CharField(max_length=50, default="WORKING")  # the progress of the task, ex:
-    # STUCK [Red], WORKING [Blue], DONE [Green], ARCHIVED [Greyed out], FUTURE [another color]
+    # STUCK [Red], WORKING [Blue], DONE [Green], ARCHIVED [Greyed out], FUTURE [another color] (PROGRESS_STATUSES)
 
     # who is in charge/owns the task, transferable/updatable, can be null
     owner = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     # priority of thing, from 1 --> 5
     priority = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(5)])
+    change_seq = models.PositiveIntegerField(default=0, editable=False)  # board version when this was last changed
+
+    class Meta:
+        constraints = [
+            # Scoped to the board (instead of the whole table) so the table can be partitioned by board, see
+            # TASK_PARTITIONS in settings.py
+            models.UniqueConstraint(fields=['board', 'title'], name='boards_task_board_title_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['board', 'change_seq'], name='boards_task_board_seq_idx'),
+            # the task list of a board, sorted by priority (the id is the tie breaker of the page cursor)
+            models.Index(fields=['board', 'priority', 'id'], name='boards_task_board_prio_idx'),
+            # the same, filtered by progress status
+            models.Index(fields=['board', 'progress_status', 'priority', 'id'], name='boards_task_board_status_idx'),
+        ]
+
+    # Remember what the task is counted as in the board's task counters (boards/changes.py), so an update knows which
+    # counter to take it out of. Not set if those fields weren't loaded.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        task = super().from_db(db, field_names, values)
+        loaded = task.__dict__
+        if "board_id" in loaded and "progress_status" in loaded and "priority" in loaded:
+            task.counted_as = (task.board_id, task.progress_status, task.priority)
+        return task
 
     def __str__(self):
         return f"TASK OBJECT. Board: \"{self.board.title}\", task: \"{self.title}\""
@@ -89,4 +127,41 @@ class Task(models.Model):
             "date_created": self.date_created,
             "owner": self.owner,
             "priority": self.priority
-        }
\ No newline at end of file
+        }
+
+
+# Record of a deleted task or shared user, so that clients syncing changes (GET api/board/<url>/changes/) know it's gone
+class Tombstone(models.Model):
+    TASK = "task"
+    SHARED_USER = "shared_user"
+    KIND_CHOICES = [(TASK, "Task"), (SHARED_USER, "Shared user")]
+
+    board = models.ForeignKey(Board, related_name="tombstones", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)  # what was deleted
+    object_id = models.PositiveIntegerField()  # id of the deleted task or shared user
+    change_seq = models.PositiveIntegerField()  # board version when it was deleted
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['board', 'change_seq'], name='boards_tomb_board_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"TOMBSTONE OBJECT. Board id: \"{self.board_id}\", {self.kind}: \"{self.object_id}\""
+
+
+# How many tasks of a board have this progress status and priority, kept up to date by every task write (see
+# boards/counters.py)
+class BoardTaskCounter(models.Model):
+    board = models.ForeignKey(Board, related_name="task_counters", on_delete=models.CASCADE)
+    progress_status = models.CharField(max_length=50)
+    priority = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'progress_status', 'priority'], name='boards_counter_unique'),
+        ]
+
+    def __str__(self):
+        return f"TASK COUNTER OBJECT. Board id: \"{self.board_id}\", {self.progress_status}/{self.priority}: {self.count}"
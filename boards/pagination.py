@@ -0,0 +1,50 @@
+import base64
+import binascii
+import json
+from rest_framework import exceptions
+
+"""
+Keyset (cursor) pagination helpers.
+Instead of using OFFSET (which gets slower the further into the list you go), the cursor stores the sort key of the
+last item on the page, and the next page is everything after that key. The cursor is opaque to the client, it is just
+the sort key as JSON encoded in base64.
+"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# Turn the sort key of the last item on a page (ex: [priority, id]) into a cursor string
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode()).decode()
+
+
+# Turn a cursor string back into the sort key, raises a validation error (400) if the cursor was tampered with
+def decode_cursor(cursor, length):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError):
+        raise exceptions.ValidationError({"cursor": ["Invalid cursor."]})
+    if not isinstance(position, list) or len(position) != length \
+            or not all(isinstance(value, int) for value in position):
+        raise exceptions.ValidationError({"cursor": ["Invalid cursor."]})
+    return position
+
+
+# Get the page size from the "limit" query parameter
+def get_page_size(query_params):
+    limit = query_params.get("limit")
+    if limit is None or limit == "":
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise exceptions.ValidationError({"limit": ["A valid integer is required."]})
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise exceptions.ValidationError({"limit": [f"Ensure this value is between 1 and {MAX_PAGE_SIZE}."]})
+    return limit
+
+
+# Pagination is opt in, a request is paginated if it has a cursor or a limit
+def is_paginated(query_params):
+    return "cursor" in query_params or "limit" in query_params
@@ -0,0 +1,100 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Board, SharedUser, Task
+
+"""
+Full text task search over the title and the description of the tasks.
+The search index is made by boards/migrations/0016_task_search.py and is kept up to date by the database itself, so
+every way of writing tasks (the API, bulk writes, the admin) is searchable right away:
+    Postgres --> a generated tsvector column (boards_task.search_vector, the title weighs more than the description)
+                 with a GIN index, ranked with ts_rank
+    SQLite --> an FTS5 table (boards_task_fts) kept up to date by triggers, ranked with bm25
+Other databases fall back to a (slow) case insensitive "contains" on the title and the description, unranked.
+
+Both stem english words (ex: "fixing" finds "fixed"), every word of the query has to be found in the task.
+
+Results are ordered by score (best first) and then id. The score is the rank as an integer, so the results can be
+paginated with a cursor like the rest of the API (pagination.py), the cursor being the [score, id] of the last result.
+
+Note for SQLite: django rebuilds a table when some of its fields are changed by a migration, which drops the triggers
+on the table. A migration that changes a Task field has to create the triggers again (see the 0016 migration).
+"""
+
+SEARCH_CONFIG = "english"  # Postgres text search configuration, the same as in the migration
+SCORE_SCALE = 1000000  # The rank is multiplied by this and rounded to get the score
+
+
+# The words of the search query. Anything else (quotes, operators, ...) is ignored so the query is always valid.
+def search_words(query):
+    return re.findall(r"\w+", query)
+
+
+# The ids of the boards the user owns or is shared on, as SQL (and its params) to use in "board_id IN (...)"
+def _accessible_board_ids(user_id):
+    board_ids = Board.objects.filter(owner_id=user_id).values("id") \
+        .union(SharedUser.objects.filter(shared_user_id=user_id).values("board_id"))
+    return board_ids.query.sql_with_params()
+
+
+def _search_sql(user_id, query, board_id):
+    quote = connection.ops.quote_name
+    task_table = quote(Task._meta.db_table)
+    if board_id is not None:
+        board_filter, board_params = "t.board_id = %s", [board_id]
+    else:
+        board_ids_sql, board_ids_params = _accessible_board_ids(user_id)
+        board_filter, board_params = f"t.board_id IN ({board_ids_sql})", list(board_ids_params)
+
+    if connection.vendor == "postgresql":
+        sql = f"""
+            SELECT t.id AS id, CAST(ts_rank(t.search_vector, query) * {SCORE_SCALE} AS INTEGER) AS score
+            FROM {task_table} t, plainto_tsquery(%s, %s) query
+            WHERE t.search_vector @@ query AND {board_filter}
+        """
+        return sql, [SEARCH_CONFIG, " ".join(search_words(query))] + board_params
+
+    # bm25() is negative, lower is better. The title weighs more than the description.
+    match = " ".join(f'"{word}"' for word in search_words(query))
+    sql = f"""
+        SELECT t.id AS id, CAST(-bm25(boards_task_fts, 2.0, 1.0) * {SCORE_SCALE} AS INTEGER) AS score
+        FROM boards_task_fts JOIN {task_table} t ON t.id = boards_task_fts.rowid
+        WHERE boards_task_fts MATCH %s AND {board_filter}
+    """
+    return sql, [match] + board_params
+
+
+# Search the tasks of the boards the user can see (or only of board_id, access to it must be checked already).
+# after is the [score, id] of the last result of the previous page (or None). Returns up to limit (id, score).
+def search_tasks(user_id, query, board_id=None, after=None, limit=50):
+    if not search_words(query):
+        return []
+
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return _search_tasks_unindexed(user_id, query, board_id, after, limit)
+
+    sql, params = _search_sql(user_id, query, board_id)
+    sql = f"SELECT id, score FROM ({sql}) results"
+    if after is not None:
+        after_score, after_id = after
+        sql += " WHERE score < %s OR (score = %s AND id > %s)"
+        params += [after_score, after_score, after_id]
+    sql += " ORDER BY score DESC, id LIMIT %s"
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+# No search index, every word has to be in the title or the description. Every result has a score of 0.
+def _search_tasks_unindexed(user_id, query, board_id, after, limit):
+    tasks = Task.objects.all()
+    if board_id is not None:
+        tasks = tasks.filter(board_id=board_id)
+    else:
+        tasks = tasks.filter(Q(board__owner_id=user_id) | Q(board__shared_users__shared_user_id=user_id))
+    for word in search_words(query):
+        tasks = tasks.filter(Q(title__icontains=word) | Q(description__icontains=word))
+    if after is not None:
+        tasks = tasks.filter(id__gt=after[1])
+    return [(task_id, 0) for task_id in tasks.order_by("id").values_list("id", flat=True).distinct()[:limit]]
@@ -1,8 +1,16 @@
 from rest_framework import serializers
-from .models import Board, SharedUser, Task
+from .models import Board, SharedUser, Task, Tombstone
+from django.db import transaction
 from django.db.utils import IntegrityError
 from django.contrib.auth.models import User
 from rest_framework import exceptions
+from django.db.models import Q
+from .pagination import encode_cursor
+from .access import get_board_access
+from .counters import get_task_summaries
+from .search import search_tasks
+from .fieldsets import select_task_fields
+from scrummaster.profiling import timed
 
 """
 Serializers for API.
@@ -48,204 +56,210 @@ class BoardUpdateSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'created_at']  # Read only, title is only thing that can be updated
 
 
+# Helpers used to build the board detail dictionaries. The related user objects must already be loaded (with
+# select_related) so that building the dictionaries never goes back to the database, no matter how big the board is.
+def user_info(user):
+    return {
+        "id": user.id,
+        "username": user.username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+    }
+
+
+# fields (boards/fieldsets.py) is the list of fields to include, or None for all of them. Called once per task, so it
+# isn't timed itself (the to_representation() calling it is)
+def task_info(task, fields=None):
+    if fields is not None:
+        info = {field: getattr(task, field) for field in fields if field != "owner"}
+        if "owner" in fields:
+            info["owner"] = user_info(task.owner) if task.owner_id is not None else None
+        return info
+    return {
+        "id": task.id,
+        "date_created": task.date_created,
+        "title": task.title,
+        "description": task.description,
+        "progress_status": task.progress_status,
+        "priority": task.priority,
+        "owner": user_info(task.owner) if task.owner_id is not None else None,  # Owner can be removed from a task
+    }
+
+
+def shared_user_info(shared_user):
+    # The id is the id of the SharedUser object (not the user), which is what the frontend uses to delete it
+    shared_user_dict = user_info(shared_user.shared_user)
+    shared_user_dict["id"] = shared_user.id
+    return shared_user_dict
+
+
+# Gets the board (with its owner), the tasks (with their owners) and the shared users (with their users).
+# This is always 3 queries, no matter how many tasks or shared users the board has. task_fields only loads some of the
+# task fields (boards/fieldsets.py).
+def load_board_detail(task_fields=None, **lookup):
+    board = Board.objects.select_related("owner").get(**lookup)
+    tasks = select_task_fields(Task.objects.filter(board_id=board.id), task_fields)
+    shared_users = SharedUser.objects.filter(board_id=board.id).select_related("shared_user")
+    return board, tasks, shared_users
+
+
+def get_board_detail(task_fields=None, **lookup):
+    board, tasks, shared_users = load_board_detail(task_fields, **lookup)
+    task_info_list = [task_info(task, task_fields) for task in tasks]
+    shared_user_info_list = [shared_user_info(shared_user) for shared_user in shared_users]
+    return board, task_info_list, shared_user_info_list
+
+
 # Board Info serializer. Takes in the ID of the board.
 # For to_representation(), it will return all of the board info (board, owner, tasks, shared_users)
 class BoardInfoSerializer(serializers.Serializer):
     board_id = serializers.IntegerField()  # Only input is the ID of the board
 
     # For API response, returns the board, owner, tasks and shared_users in a dictionary.
+    @timed("serialize")
     def to_representation(self, instance):
-        board = Board.objects.get(id=instance)
-
-        owner_info = {
-            "id": board.owner_id,
-            "username": board.owner.username,
-            "first_name": board.owner.first_name,
-            "last_name": board.owner.last_name,
-            "email": board.owner.email,
-        }
+        board, task_info_list, shared_user_info_list = get_board_detail(id=instance)
 
         # Put the owner info inside the board info
         board_info = {
             "id": board.id,
             "title": board.title,
-            "owner": owner_info,
+            "owner": user_info(board.owner),
             "url": board.url,
         }
 
-        # Get tasks and put them into a list
-        tasks = Task.objects.all().filter(board_id=instance)
-
-        task_info = []
-
-        if tasks:
-            for task in tasks:
-                task_dict = {
-                    "id": task.id,
-                    "date_created": task.date_created,
-                    "title": task.title,
-                    "description": task.description,
-                    "progress_status": task.progress_status,
-                    "priority": task.priority,
-                    "owner": {
-                        "id": task.owner_id,
-                        "username": task.owner.username,
-                        "first_name": task.owner.first_name,
-                        "last_name": task.owner.last_name,
-                        "email": task.owner.email,
-                    }
-                }
-                task_info.append(task_dict)
-
-        # Get shared users
-        shared_users = SharedUser.objects.all().filter(board_id=instance)
-        shared_user_info = []
-        if shared_users:
-            for shared_user in shared_users:
-                shared_user_dict = {
-                    "id": shared_user.id,
-                    "username": shared_user.shared_user.username,
-                    "first_name": shared_user.shared_user.first_name,
-                    "last_name": shared_user.shared_user.last_name,
-                    "email": shared_user.shared_user.email,
-                }
-                shared_user_info.append(shared_user_dict)
-
         # Compile all of the info and return it as a dictionary
         return_info = {
             "board": board_info,  # This is also where the owner info resides
-            "tasks": task_info,
-            "shared_users": shared_user_info,
+            "tasks": task_info_list,
+            "shared_users": shared_user_info_list,
         }
         return return_info
 
-# Takes in the URL of a board instead of the ID, does same thing as BoardInfoSerializer
+
+# Task counts of a board by progress status and priority, read from the task counters (boards/counters.py) instead of
+# counting the tasks. Takes in the board.
+class BoardSummarySerializer(serializers.Serializer):
+    @timed("serialize")
+    def to_representation(self, instance):
+        return {
+            "board_id": instance.id,
+            "version": instance.version,
+            "summary": get_task_summaries([instance.id])[instance.id],
+        }
+
+
+# Takes in the URL of a board instead of the ID, does same thing as BoardInfoSerializer. Context can have "task_fields"
+# (boards/fieldsets.py) to only include some of the task fields.
 class BoardInfoUrlSerializer(serializers.Serializer):
     board_url = serializers.UUIDField()
 
     # For API response, returns the board, owner, tasks and shared_users in a dictionary.
+    @timed("serialize")
     def to_representation(self, instance):
-        board = Board.objects.get(url=instance)
-
-        owner_info = {
-            "id": board.owner_id,
-            "username": board.owner.username,
-            "first_name": board.owner.first_name,
-            "last_name": board.owner.last_name,
-            "email": board.owner.email,
+        task_fields = self.context.get("task_fields")
+        board, task_info_list, shared_user_info_list = get_board_detail(task_fields, url=instance)
+
+        # Put the owner info, tasks and shared users inside the board info
+        board_info = {
+            "id": board.id,
+            "title": board.title,
+            "owner": user_info(board.owner),
+            "url": board.url,
+            "tasks": task_info_list,
+            "shared_users": shared_user_info_list,
         }
+        return board_info
 
 
+# Task dictionary of the compact board info, the owner is only the user id
+def compact_task_info(task, fields=None):
+    if fields is not None:
+        return {field: task.owner_id if field == "owner" else getattr(task, field) for field in fields}
+    return {
+        "id": task.id,
+        "date_created": task.date_created,
+        "title": task.title,
+        "description": task.description,
+        "progress_status": task.progress_status,
+        "priority": task.priority,
+        "owner": task.owner_id,
+    }
+
+
+# Compact version of BoardInfoUrlSerializer (GET api/board/<url>/?payload=compact). Every user is in "users" once, keyed
+# by id (as a string, like JSON object keys), and the owner, the task owners and the shared users only have the user id.
+# On a board with many tasks and few users this is a lot smaller and faster to encode and parse.
+# Context can have "task_fields", like BoardInfoUrlSerializer.
+class BoardCompactSerializer(serializers.Serializer):
+    board_url = serializers.UUIDField()
 
-        # Get tasks and put them into a list
-        tasks = Task.objects.all().filter(board_id=board.id)
-
-        task_info = []
-
-        if tasks:
-            for task in tasks:
-                task_dict = {
-                    "id": task.id,
-                    "date_created": task.date_created,
-                    "title": task.title,
-                    "description": task.description,
-                    "progress_status": task.progress_status,
-                    "priority": task.priority,
-                    "owner": {
-                        "id": task.owner_id,
-                        "username": task.owner.username,
-                        "first_name": task.owner.first_name,
-                        "last_name": task.owner.last_name,
-                        "email": task.owner.email,
-                    }
-                }
-                task_info.append(task_dict)
-
-        # Get shared users
-        shared_users = SharedUser.objects.all().filter(board_id=board.id)
-        shared_user_info = []
-        if shared_users:
-            for shared_user in shared_users:
-                shared_user_dict = {
-                    "id": shared_user.id,
-                    "username": shared_user.shared_user.username,
-                    "first_name": shared_user.shared_user.first_name,
-                    "last_name": shared_user.shared_user.last_name,
-                    "email": shared_user.shared_user.email,
-                }
-                shared_user_info.append(shared_user_dict)
+    @timed("serialize")
+    def to_representation(self, instance):
+        task_fields = self.context.get("task_fields")
+        board, tasks, shared_users = load_board_detail(task_fields, url=instance)
+        users = {str(board.owner_id): user_info(board.owner)}
+        with_owner = task_fields is None or "owner" in task_fields
+
+        task_info_list = []
+        for task in tasks:
+            if with_owner and task.owner_id is not None and str(task.owner_id) not in users:
+                users[str(task.owner_id)] = user_info(task.owner)
+            task_info_list.append(compact_task_info(task, task_fields))
+
+        # "id" is the id of the SharedUser object, like in the full board info
+        shared_user_info_list = []
+        for shared_user in shared_users:
+            users.setdefault(str(shared_user.shared_user_id), user_info(shared_user.shared_user))
+            shared_user_info_list.append({"id": shared_user.id, "user": shared_user.shared_user_id})
 
-        # Put the owner info inside the board info
         board_info = {
             "id": board.id,
             "title": board.title,
-            "owner": owner_info,
+            "owner": board.owner_id,
             "url": board.url,
-            "tasks": task_info,
-            "shared_users": shared_user_info,
+            "users": users,
+            "tasks": task_info_list,
+            "shared_users": shared_user_info_list,
         }
         return board_info
 
-        # Compile all of the info and return it as a dictionary
-        # return_info = {
-        #     "board": board_info,  # This is also where the owner info resides
-        #     "tasks": task_info,
-        #     "shared_users": shared_user_info,
-        # }
-        # return return_info
+
+# Board dictionary used by the board list. The owner must already be loaded (with select_related)
+def board_list_info(board):
+    return {
+        "id": board.id,
+        "title": board.title,
+        "owner": user_info(board.owner),
+        "url": board.url,
+    }
 
 
+# Add the task summary (boards/counters.py) to every board of the board list, one query for all of them
+def add_task_summaries(board_info_list):
+    summaries = get_task_summaries([board_info["id"] for board_info in board_info_list])
+    for board_info in board_info_list:
+        board_info["summary"] = summaries[board_info["id"]]
+
+
+# Context has "include_summary" (optional) to add the task summary of every board
 class BoardListSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()  # Only parameter we take in is user id
 
     # Used for returning a JSON response with all of the boards
+    @timed("serialize")
     def to_representation(self, instance):
-        # Find boards owned by user, then put them into a list with proper info
-        owned_boards = Board.objects.all().filter(owner_id=instance)
-        owned_boards_list = []
+        # Find boards owned by user, then put them into a list with proper info. The owner is joined in the same query.
+        owned_boards = Board.objects.filter(owner_id=instance).select_related("owner")
+        owned_boards_list = [board_list_info(owned_board) for owned_board in owned_boards]
 
-        if owned_boards:
-            # Since the owner info is the same, we will only query for it once at the beginning and then just use
-            # the data multiple times in order to save database queries.
-            owner_info_dict = {
-                "id": owned_boards[0].owner.id,
-                "username": owned_boards[0].owner.username,
-                "first_name": owned_boards[0].owner.first_name,
-                "last_name": owned_boards[0].owner.last_name,
-                "email": owned_boards[0].owner.email,
-            }
-
-            for owned_board in owned_boards:
-                owner_board_dict = {
-                    "id": owned_board.id,
-                    "title": owned_board.title,
-                    "owner": owner_info_dict,
-                    "url": owned_board.url,
-                }
-                # Add the info of the board to the owned_boards_list
-                owned_boards_list.append(owner_board_dict)
-
-        # Get the boards the user has been shared to, (aka for each shared user object get shared_user.board)
-        shared_boards_list = []
-        shared_users = SharedUser.objects.all().filter(shared_user_id=instance)
-        if shared_users:
-            shared_boards = [shared_user.board for shared_user in shared_users]
-            # Go through and store every board in the list
-            for shared_board in shared_boards:
-                owner_info_dict = {
-                    "id": shared_board.owner_id,
-                    "username": shared_board.owner.username,
-                    "first_name": shared_board.owner.first_name,
-                    "last_name": shared_board.owner.last_name,
-                    "email": shared_board.owner.email,
-                }
-                shared_board_dict = {
-                    "id": shared_board.id,
-                    "title": shared_board.title,
-                    "owner": owner_info_dict,
-                    "url": shared_board.url,
-                }
-                shared_boards_list.append(shared_board_dict)
+        # Get the boards the user has been shared to, (aka for each shared user object get shared_user.board).
+        # The board and the board owner are joined in the same query, so this is one query no matter how many boards.
+        shared_users = SharedUser.objects.filter(shared_user_id=instance).select_related("board__owner")
+        shared_boards_list = [board_list_info(shared_user.board) for shared_user in shared_users]
+        if self.context.get("include_summary"):
+            add_task_summaries(owned_boards_list + shared_boards_list)
 
         # Return the owned boards and shared boards as dict which will become JSON response
         return_info = {
@@ -256,6 +270,187 @@ class BoardListSerializer(serializers.Serializer):
         return return_info
 
 
+# Paginated version of the BoardListSerializer. Owned and shared boards are fetched together ordered by id (one query per
+# page), and the cursor is the id of the last board on the page. Takes in the user id, context has "after" (the id from
+# the cursor, or None for the first page), "limit" and "include_summary" (optional).
+class BoardListPageSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+
+    @timed("serialize")
+    def to_representation(self, instance):
+        after = self.context.get("after")
+        limit = self.context["limit"]
+
+        shared_board_ids = SharedUser.objects.filter(shared_user_id=instance).values("board_id")
+        boards = Board.objects.filter(Q(owner_id=instance) | Q(id__in=shared_board_ids)) \
+            .select_related("owner").order_by("id")
+        if after is not None:
+            boards = boards.filter(id__gt=after)
+        boards = list(boards[:limit + 1])  # Get one extra board to know if there is another page
+
+        next_cursor = None
+        if len(boards) > limit:
+            boards = boards[:limit]
+            next_cursor = encode_cursor([boards[-1].id])
+
+        owned_boards_list = []
+        shared_boards_list = []
+        for board in boards:
+            if board.owner_id == instance:
+                owned_boards_list.append(board_list_info(board))
+            else:
+                shared_boards_list.append(board_list_info(board))
+        if self.context.get("include_summary"):
+            add_task_summaries(owned_boards_list + shared_boards_list)
+
+        return_info = {
+            "owned_boards": owned_boards_list,
+            "shared_boards": shared_boards_list,
+            "isOnSpecificBoard": False,
+            "next_cursor": next_cursor,
+        }
+        return return_info
+
+
+# Query parameters (filters) for the task list, all of them are optional
+class TaskListQuerySerializer(serializers.Serializer):
+    progress_status = serializers.CharField(required=False, max_length=50)
+    priority = serializers.IntegerField(required=False, min_value=1, max_value=5)
+    owner = serializers.IntegerField(required=False)  # id of the task owner
+
+
+# One page of the tasks on a board, ordered by (priority, id). Takes in the board id, context has "filters" (validated
+# TaskListQuerySerializer data), "after" (the [priority, id] from the cursor, or None for the first page), "limit" and
+# "fields" (optional, boards/fieldsets.py).
+# Only the tasks on the page are loaded, so the time taken depends on the page size and not on the size of the board.
+class TaskListSerializer(serializers.Serializer):
+    board_id = serializers.IntegerField()
+
+    @timed("serialize")
+    def to_representation(self, instance):
+        filters = self.context.get("filters", {})
+        after = self.context.get("after")
+        limit = self.context["limit"]
+        fields = self.context.get("fields")
+
+        # The priority is always loaded since the cursor needs it
+        tasks = select_task_fields(Task.objects.filter(board_id=instance), fields, required=["priority"]) \
+            .order_by("priority", "id")
+        if "progress_status" in filters:
+            tasks = tasks.filter(progress_status=filters["progress_status"])
+        if "priority" in filters:
+            tasks = tasks.filter(priority=filters["priority"])
+        if "owner" in filters:
+            tasks = tasks.filter(owner_id=filters["owner"])
+        if after is not None:
+            # Everything after the last task of the previous page in (priority, id) order
+            after_priority, after_id = after
+            tasks = tasks.filter(Q(priority__gt=after_priority) | Q(priority=after_priority, id__gt=after_id))
+        tasks = list(tasks[:limit + 1])  # Get one extra task to know if there is another page
+
+        next_cursor = None
+        if len(tasks) > limit:
+            tasks = tasks[:limit]
+            next_cursor = encode_cursor([tasks[-1].priority, tasks[-1].id])
+
+        return_info = {
+            "tasks": [task_info(task, fields) for task in tasks],
+            "next_cursor": next_cursor,
+        }
+        return return_info
+
+
+# Query parameters of the task search. board is the url of a board, to only search that board.
+class TaskSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    board = serializers.UUIDField(required=False)
+
+
+# One page of task search results (boards/search.py), best match first. Takes in the user id, context has "query",
+# "board_id" (None to search every board the user can see), "after" (the [score, id] from the cursor, or None for the
+# first page) and "limit". The tasks of the page are loaded with their board and owner in one query.
+class TaskSearchSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+
+    @timed("serialize")
+    def to_representation(self, instance):
+        limit = self.context["limit"]
+        results = search_tasks(
+            instance, self.context["query"], self.context.get("board_id"), self.context.get("after"), limit + 1
+        )
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last_id, last_score = results[-1]
+            next_cursor = encode_cursor([last_score, last_id])
+
+        tasks = Task.objects.select_related("board", "owner").in_bulk([task_id for task_id, _ in results])
+        result_list = []
+        for task_id, score in results:
+            task = tasks[task_id]
+            result = task_info(task)
+            result["board"] = {"id": task.board.id, "title": task.board.title, "url": task.board.url}
+            result["score"] = score
+            result_list.append(result)
+
+        return_info = {
+            "results": result_list,
+            "next_cursor": next_cursor,
+        }
+        return return_info
+
+
+# Query parameters for the board changes, since is the board version the client already has
+class BoardChangeQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0)
+
+
+# What changed on a board since a version. Takes in the board (with its owner loaded), context has "since".
+# Everything with a change_seq newer than "since" is returned (see boards/changes.py), so the amount of queries and the
+# size of the response depend on how much changed, not on the size of the board.
+class BoardChangeListSerializer(serializers.Serializer):
+    board_url = serializers.UUIDField()
+
+    @timed("serialize")
+    def to_representation(self, instance):
+        since = self.context.get("since", 0)
+        tasks = Task.objects.filter(board_id=instance.id).select_related("owner")
+        shared_users = SharedUser.objects.filter(board_id=instance.id).select_related("shared_user")
+        deleted_task_ids = []
+        deleted_shared_user_ids = []
+        # since=0 is everything, so there is nothing to delete
+        if since > 0:
+            tasks = tasks.filter(change_seq__gt=since)
+            shared_users = shared_users.filter(change_seq__gt=since)
+            tombstones = Tombstone.objects.filter(board_id=instance.id, change_seq__gt=since) \
+                .values_list("kind", "object_id")
+            for kind, object_id in tombstones:
+                if kind == Tombstone.TASK:
+                    deleted_task_ids.append(object_id)
+                else:
+                    deleted_shared_user_ids.append(object_id)
+
+        task_info_list = [task_info(task) for task in tasks]
+        shared_user_info_list = [shared_user_info(shared_user) for shared_user in shared_users]
+        # A task that was moved off the board and back again is deleted and changed, it's only given as changed
+        task_ids = {task["id"] for task in task_info_list}
+
+        return_info = {
+            "version": instance.version,
+            "since": since,
+            # The board info is only given if the title changed
+            "board": board_list_info(instance) if since == 0 or instance.change_seq > since else None,
+            "tasks": task_info_list,
+            "shared_users": shared_user_info_list,
+            "deleted": {
+                "tasks": sorted(set(deleted_task_ids) - task_ids),
+                "shared_users": sorted(set(deleted_shared_user_ids)),
+            },
+        }
+        return return_info
+
+
 # Shared User serializer for POST (create)
 class SharedUserCreateSerializer(serializers.Serializer):
     # to create all we need is a board id and the email of the shared user.
@@ -263,20 +458,14 @@ class SharedUserCreateSerializer(serializers.Serializer):
     shared_user_email = serializers.EmailField()
 
     def create(self, validated_data):  # POST request
-        # Check if board exists
-        try:
-            board = Board.objects.get(id=validated_data['board_id'])
-        except Exception:
-            raise exceptions.NotFound
-
-        # Check if there is a user (should be, just another layer of protection), and if the user is
-        # the owner of the board
-        owner = None
+        # Check if there is a user (should be, just another layer of protection), then check that the board exists and
+        # that the user is the owner of the board
         request = self.context.get("request")
-        if request and hasattr(request, 'user'):
-            owner = request.user
-        if owner is None or board.owner != owner:
+        if request is None or not hasattr(request, 'user'):
             raise exceptions.NotFound
+        access = get_board_access(request).for_board_id(validated_data['board_id'])
+        access.require_owner()
+        board = access.board
 
         # Check if the user who we want to add exists
         try:
@@ -284,18 +473,19 @@ class SharedUserCreateSerializer(serializers.Serializer):
         except Exception:
             raise exceptions.NotFound("No user with that email")
 
-        # See if the shared_user already exists. If it is, we raise a validation error
-        check_shared_user = None
+        # Passed all tests, put it together, create the shared user
+        # The ChangeRecorder of the write (boards/changes.py) is given to save() by the view
+        # The unique constraint on (board, shared_user) tells us if the user is already added, no need to check first
+        changes = validated_data.get('changes')
         try:
-            check_shared_user = SharedUser.objects.get(board=board, shared_user=user)
-        except Exception:
-            pass
-        if check_shared_user:
+            with transaction.atomic():
+                shared_user = SharedUser.objects.create(
+                    board=board, shared_user=user, change_seq=changes.version if changes else 0
+                )
+        except IntegrityError:
             raise exceptions.ValidationError({"detail": "This user is already added to the board"})
-
-        # Passed all tests, put it together, create the shared user
-        shared_user = SharedUser.objects.create(board=board, shared_user=user)
-        shared_user.save()
+        if changes:
+            changes.shared_user_saved(shared_user)
         return_info = {
             "shared_user": {
                 "username": user.username,
@@ -324,27 +514,36 @@ class SharedUserDeleteSerializer(serializers.Serializer):
     def create(self, validated_data):  # Actually a DELETE request
         # Check if shared_user exists
         try:
-            print(validated_data)
             user = User.objects.get(email=validated_data['shared_user_email'])
             shared_user = SharedUser.objects.get(board_id=validated_data['board_id'], shared_user=user)
         except Exception as e:
             raise exceptions.NotFound("Shared user not found")
 
         # Check if owner of the board
-        board = Board.objects.get(id=validated_data['board_id'])  # already checked that board exists above
-        owner = None
         request = self.context.get("request")
-        if request and hasattr(request, 'user'):
-            owner = request.user
-        if owner is None or board.owner != owner:
+        if request is None or not hasattr(request, 'user'):
             raise exceptions.NotFound
+        get_board_access(request).for_board_id(validated_data['board_id']).require_owner()
 
         # Passed shared user exists and is board owner checks. Delete the shared user now and return "".
+        if "changes" in validated_data:  # The ChangeRecorder of the write (boards/changes.py) given by the view
+            validated_data['changes'].shared_user_deleted(shared_user.id, user.id)
         shared_user.delete()
+        get_board_access(request).forget(validated_data['board_id'])
         return ""
 
 
 # Task serializer for POST, PUT, DELETE. GET does not use serializer
+# Titles are unique in a board. Instead of checking first, the database tells us when the title is taken (the unique
+# constraint on board and title), save() is run in a savepoint so the rest of the request's transaction can go on.
+def save_task(save):
+    try:
+        with transaction.atomic():
+            return save()
+    except IntegrityError:
+        raise serializers.ValidationError({"title": ["A task with this title already exists in the board."]})
+
+
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
@@ -360,24 +559,10 @@ class TaskSerializer(serializers.ModelSerializer):
         if user is None:
             raise serializers.ValidationError("Incorrect Credentials")
 
-        # Try to get the board
-        try:
-            board = Board.objects.get(id=validated_data['board'].id)
-        except Exception:
-            raise exceptions.NotFound
-
-        # see if they have access to the board (if they are owner or shared user)
-        allowed = False
-        if user.id is board.owner.id:
-            allowed = True
-        else:
-            try:
-                user = board.shared_users.get(board=board, shared_user=user)
-                allowed = True
-            except Exception as e:
-                raise exceptions.NotFound
-        if allowed is False:
-            raise serializers.ValidationError("Incorrect Credentials")
+        # See if they have access to the board (if they are owner or shared user), 404 if not. The board was already
+        # loaded when the data was validated.
+        board = validated_data['board']
+        get_board_access(request).for_board(board)
 
         # Create the task
 
@@ -390,10 +575,147 @@ class TaskSerializer(serializers.ModelSerializer):
             task.priority = validated_data['priority']
         if "owner" in validated_data:
             task.owner = validated_data['owner']
+        if "change_seq" in validated_data:
+            task.change_seq = validated_data['change_seq']
         # Try to save the task, then return
+        save_task(task.save)
+        return task  # Finally return the task
+
+    def update(self, instance, validated_data):  # PUT request
+        return save_task(lambda: super(TaskSerializer, self).update(instance, validated_data))
+
+
+# One operation of a bulk task request. "create" needs a title, "update" needs the id of the task and the fields to
+# change, "delete" only needs the id of the task.
+class TaskBulkOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=["create", "update", "delete"])
+    id = serializers.IntegerField(required=False)
+    title = serializers.CharField(max_length=100, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    progress_status = serializers.CharField(max_length=50, required=False)
+    priority = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    owner = serializers.IntegerField(required=False, allow_null=True)  # id of the task owner
+
+    def validate(self, data):
+        if data["op"] == "create" and "title" not in data:
+            raise serializers.ValidationError({"title": ["This field is required."]})
+        if data["op"] != "create" and "id" not in data:
+            raise serializers.ValidationError({"id": ["This field is required."]})
+        return data
+
+
+# Create, update and delete many tasks of one board at once. The board and the ChangeRecorder of the write
+# (boards/changes.py) are given to save(), the view checks access to the board once for the whole request. Everything
+# is checked with a few queries for the whole batch, then applied with bulk queries in one transaction, so the amount
+# of queries doesn't depend on the amount of tasks. If any operation has an error, nothing is applied and the errors
+# are given per operation (in the same order as the operations).
+class TaskBulkSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 1000
+    TASK_FIELDS = ["title", "description", "progress_status", "priority", "owner"]
+
+    operations = TaskBulkOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        if len(operations) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(f"Ensure there are no more than {self.MAX_OPERATIONS} operations.")
+        return operations
+
+    def create(self, validated_data):
+        board = validated_data["board"]
+        changes = validated_data["changes"]
+        operations = validated_data["operations"]
+        request = self.context.get("request")
+        errors = [{} for _ in operations]
+
+        # Load every task being updated or deleted, every task owner and every task with a title being used, one query
+        # each
+        task_ids = [operation["id"] for operation in operations if operation["op"] != "create"]
+        tasks = Task.objects.filter(board_id=board.id, id__in=task_ids).select_related("owner")
+        tasks = {task.id: task for task in tasks}
+        owner_ids = {operation["owner"] for operation in operations if operation.get("owner") is not None}
+        owners = {user.id: user for user in User.objects.filter(id__in=owner_ids)}
+        titles = [operation["title"] for operation in operations if "title" in operation]
+        taken_titles = dict(Task.objects.filter(board_id=board.id, title__in=titles).values_list("title", "id"))
+
+        seen_ids = set()
+        seen_titles = set()
+        for operation, error in zip(operations, errors):
+            if operation["op"] != "create":
+                if operation["id"] not in tasks:
+                    error["id"] = ["Task not found."]
+                elif operation["id"] in seen_ids:
+                    error["id"] = ["This task is already in another operation."]
+                seen_ids.add(operation["id"])
+            if operation["op"] == "delete":
+                continue
+            if operation.get("owner") is not None and operation["owner"] not in owners:
+                error["owner"] = ["No user with that id."]
+            if "title" in operation:
+                title = operation["title"]
+                if title in seen_titles or taken_titles.get(title, operation.get("id")) != operation.get("id"):
+                    error["title"] = ["A task with this title already exists in the board."]
+                seen_titles.add(title)
+        if any(errors):
+            raise serializers.ValidationError({"operations": errors})
+
+        # Everything is valid, build the changes
+        new_tasks = []
+        updated_tasks = []
+        updated_fields = {"change_seq"}
+        deleted_ids = []
+        for operation in operations:
+            if operation["op"] == "delete":
+                deleted_ids.append(operation["id"])
+                changes.task_deleted(tasks[operation["id"]])
+                continue
+            if operation["op"] == "create":
+                task = Task(board=board, owner=request.user)
+                new_tasks.append(task)
+            else:
+                task = tasks[operation["id"]]
+                updated_tasks.append(task)
+            task.change_seq = changes.version
+            for field in self.TASK_FIELDS:
+                if field not in operation:
+                    continue
+                if field == "owner":
+                    task.owner = owners.get(operation["owner"])
+                else:
+                    setattr(task, field, operation[field])
+                updated_fields.add(field)
+
         try:
-            task.save()
-        except Exception as e:
-            raise e
+            with transaction.atomic():
+                if deleted_ids:
+                    Task.objects.filter(board_id=board.id, id__in=deleted_ids).delete()
+                if updated_tasks:
+                    Task.objects.bulk_update(updated_tasks, list(updated_fields))
+                if new_tasks:
+                    Task.objects.bulk_create(new_tasks)
+        except IntegrityError:  # Another request took one of the titles after we checked
+            raise serializers.ValidationError({"detail": "A task with one of these titles already exists."})
+
+        # Some databases (ex: SQLite) don't give back the ids of bulk created tasks, so get them by their titles
+        if new_tasks and new_tasks[0].id is None:
+            created_ids = dict(Task.objects.filter(board_id=board.id, title__in=[task.title for task in new_tasks])
+                               .values_list("title", "id"))
+            for task in new_tasks:
+                task.id = created_ids[task.title]
+
+        for task in new_tasks:
+            changes.task_saved(task, created=True)
+        for task in updated_tasks:
+            changes.task_saved(task)
+
+        # Results in the same order as the operations
+        results = []
+        new_tasks_iter = iter(new_tasks)
+        for operation in operations:
+            if operation["op"] == "delete":
+                results.append({"op": "delete", "id": operation["id"]})
+            elif operation["op"] == "create":
+                results.append({"op": "create", "task": task_info(next(new_tasks_iter))})
+            else:
+                results.append({"op": "update", "task": task_info(tasks[operation["id"]])})
+        return results
 
-        return task  # Finally return the task
@@ -1,6 +1,47 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import pstats
+import sqlite3
+from io import StringIO
+import tempfile
+import threading
+import time
+from asgiref.sync import async_to_sync, sync_to_async
+from unittest import mock, skipUnless
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.management import call_command, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+from django.db.models import Count
+from django.http import JsonResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory, AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from rest_framework import status
+from knox.models import AuthToken
+from accounts.auth import token_cache
+from .models import PROGRESS_STATUSES, Board, SharedUser, Task, BoardTaskCounter, Tombstone
+from .serializers import BoardInfoSerializer, BoardInfoUrlSerializer, BoardListSerializer, TaskListSerializer, \
+    BoardChangeListSerializer
+from .access import BoardAccessResolver, get_board_access
+from .cache import get_snapshot_cache
+from .changes import record_changes
+from .counters import count_tasks, saved_counts
+from .events import get_event_broker
+from .event_stream import BoardEventStream
+from scrummaster import renderers
+from scrummaster.async_views import async_read_view, run_orm
+from scrummaster.db.pool import ConnectionPool, PoolTimeout
+from scrummaster.metrics import registry as metrics_registry
+from scrummaster.routers import get_pin_cache, pin_key
+from scrummaster.profiling import RequestTimings, _current_timings, timed
+from scrummaster.query_budget import QueryBudgetExceeded, QueryBudgetTestMixin, get_query_budget
+from .api import BoardInfo, BoardList, BoardChangeList, BoardExport, BoardSummary, TaskBulk, TaskInfo, TaskList
+from . import urls as boards_urls
+from accounts import urls as accounts_urls
 
 # Create your tests here.
 """
@@ -64,4 +105,1762 @@ TaskInfo:
     -Try and delete task as shared user
     -Try and delete task without being owner or shared user
     -Try and delete task with missing information
-"""
\ No newline at end of file
+"""
+
+# Creates a user with a knox token. Returns the user and the token to put in the authorization header.
+def create_user(username, email, first_name="Bob", last_name="Smith"):
+    user = User.objects.create_user(username, email, "Ilovehotdogs17")
+    user.first_name = first_name
+    user.last_name = last_name
+    user.save()
+    token = AuthToken.objects.create(user)[1]
+    return user, token
+
+
+# The queries of a request without the token authentication ones (the token cache is only used with a shared cache,
+# see accounts/auth.py)
+def without_authentication(queries):
+    authentication = ('SELECT "knox_authtoken"', 'SELECT "auth_user"')
+    return [query for query in queries if not query['sql'].startswith(authentication)]
+
+
+# The board detail serializers must use the same amount of queries no matter how many tasks or shared users there are
+class BoardInfoQueryCount(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.small_board = Board.objects.create(title="Small board", owner=self.owner)
+        self.big_board = Board.objects.create(title="Big board", owner=self.owner)
+
+        # One task and one shared user on the small board, lots of both on the big board
+        other_user, _ = create_user("Alice1", "alice1@gmail.com")
+        Task.objects.create(board=self.small_board, title="Small task", owner=self.owner)
+        SharedUser.objects.create(board=self.small_board, shared_user=other_user)
+        for i in range(30):
+            task_owner = self.owner if i % 2 else other_user
+            Task.objects.create(board=self.big_board, title=f"Big task {i}", owner=task_owner)
+        for i in range(10):
+            shared_user, _ = create_user(f"Shared{i}", f"shared{i}@gmail.com")
+            SharedUser.objects.create(board=self.big_board, shared_user=shared_user)
+
+    def test_board_info_url_serializer(self):
+        with self.assertNumQueries(3):
+            small_data = BoardInfoUrlSerializer(self.small_board.url).data
+        with self.assertNumQueries(3):
+            big_data = BoardInfoUrlSerializer(self.big_board.url).data
+
+        self.assertEqual(len(small_data['tasks']), 1)
+        self.assertEqual(len(big_data['tasks']), 30)
+        self.assertEqual(len(big_data['shared_users']), 10)
+        self.assertEqual(big_data['owner']['username'], self.owner.username)
+
+    def test_board_info_serializer(self):
+        with self.assertNumQueries(3):
+            small_data = BoardInfoSerializer(self.small_board.id).data
+        with self.assertNumQueries(3):
+            big_data = BoardInfoSerializer(self.big_board.id).data
+
+        self.assertEqual(len(small_data['tasks']), 1)
+        self.assertEqual(len(big_data['tasks']), 30)
+        self.assertEqual(len(big_data['shared_users']), 10)
+        self.assertEqual(big_data['board']['owner']['email'], self.owner.email)
+
+    def test_board_info_response(self):
+        url = f"/api/board/{self.big_board.url}/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task = response.json()['tasks'][0]
+        self.assertEqual(
+            sorted(task.keys()),
+            ['date_created', 'description', 'id', 'owner', 'priority', 'progress_status', 'title']
+        )
+        self.assertEqual(sorted(task['owner'].keys()), ['email', 'first_name', 'id', 'last_name', 'username'])
+        shared_user = response.json()['shared_users'][0]
+        self.assertEqual(SharedUser.objects.get(id=shared_user['id']).shared_user.username, shared_user['username'])
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The board list must use the same amount of queries no matter how many boards, and the paginated mode must go through
+# every board exactly once
+class BoardListQueryCount(TestCase):
+    def setUp(self):
+        self.user, self.token = create_user("Bob475", "bob@gmail.com")
+        for i in range(5):
+            Board.objects.create(title=f"Owned board {i}", owner=self.user)
+        for i in range(7):
+            other_user, _ = create_user(f"Other{i}", f"other{i}@gmail.com")
+            board = Board.objects.create(title=f"Shared board {i}", owner=other_user)
+            SharedUser.objects.create(board=board, shared_user=self.user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def test_board_list_serializer(self):
+        with self.assertNumQueries(2):
+            data = BoardListSerializer(self.user.id).data
+        self.assertEqual(len(data['owned_boards']), 5)
+        self.assertEqual(len(data['shared_boards']), 7)
+        self.assertEqual(data['shared_boards'][0]['owner']['username'], "Other0")
+        self.assertFalse(data['isOnSpecificBoard'])
+        self.assertNotIn('next_cursor', data)
+
+    def test_board_list_pages(self):
+        url = "/api/board/list/"
+        response = self.client.get(url, {"limit": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        owned_ids = []
+        shared_ids = []
+        pages = 0
+        while True:
+            pages += 1
+            data = response.json()
+            owned_ids += [board['id'] for board in data['owned_boards']]
+            shared_ids += [board['id'] for board in data['shared_boards']]
+            if data['next_cursor'] is None:
+                break
+            response = self.client.get(url, {"limit": 5, "cursor": data['next_cursor']})
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(sorted(owned_ids), list(Board.objects.filter(owner=self.user).values_list('id', flat=True)))
+        self.assertEqual(len(shared_ids), 7)
+        self.assertEqual(len(set(owned_ids + shared_ids)), 12)
+
+    def test_board_list_bad_cursor(self):
+        response = self.client.get("/api/board/list/", {"cursor": "not a cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/board/list/", {"limit": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Owner, shared user and other user access to boards and tasks, and that the access check is only done once per request
+class BoardAccessChecks(TestCase):
+    def setUp(self):
+        self.owner, self.owner_token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, self.shared_token = create_user("Alice1", "alice1@gmail.com")
+        self.other_user, self.other_token = create_user("Eve1", "eve1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        SharedUser.objects.create(board=self.board, shared_user=self.shared_user)
+        self.task = Task.objects.create(board=self.board, title="Task", owner=self.owner)
+
+    def test_board_info(self):
+        url = f"/api/board/{self.board.url}/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.shared_token}"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        # Shared users can't rename or delete the board
+        self.assertEqual(self.client.put(url, {"title": "New"}, content_type="application/json").status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.other_token}"
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get("/api/board/not-a-uuid/").status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.owner_token}"
+        self.assertEqual(self.client.put(url, {"title": "New"}, content_type="application/json").status_code,
+                         status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Board.objects.get(id=self.board.id).title, "New")
+
+    def test_task_create_as_shared_user(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.shared_token}"
+        data = {"board": self.board.id, "title": "Shared user task"}
+        response = self.client.post("/api/task/create/", data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The task owner defaults to the user who created it
+        self.assertEqual(response.json()['task']['owner']['username'], self.shared_user.username)
+
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.other_token}"
+        data = {"board": self.board.id, "title": "Other user task"}
+        response = self.client.post("/api/task/create/", data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Task.objects.filter(title="Other user task").exists())
+
+    def test_task_info(self):
+        url = f"/api/task/{self.task.id}/"
+        data = {"board": self.board.id, "title": "Updated task", "owner": self.shared_user.id}
+
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.other_token}"
+        self.assertEqual(self.client.put(url, data, content_type="application/json").status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.shared_token}"
+        response = self.client.put(url, data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['task']['title'], "Updated task")
+
+        # Can't move the task to a board the user can't see
+        other_board = Board.objects.create(title="Other board", owner=self.other_user)
+        data['board'] = other_board.id
+        self.assertEqual(self.client.put(url, data, content_type="application/json").status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Task.objects.get(id=self.task.id).board_id, self.board.id)
+
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_200_OK)
+        self.assertFalse(Task.objects.filter(id=self.task.id).exists())
+
+    def test_access_is_memoized(self):
+        request = RequestFactory().get("/")
+        request.user = self.shared_user
+        with self.assertNumQueries(1):
+            access = get_board_access(request).for_board_url(self.board.url)
+            get_board_access(request).for_board_id(self.board.id)
+            get_board_access(request).for_board(self.board)
+        self.assertFalse(access.is_owner)
+
+        request = RequestFactory().get("/")
+        request.user = self.owner
+        with self.assertNumQueries(1):
+            task, access = get_board_access(request).for_task(self.task.id)
+            get_board_access(request).for_board_url(self.board.url)
+        self.assertTrue(access.is_owner)
+        self.assertEqual(task.board, self.board)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The task list goes through every task once in (priority, id) order, filters work and a page is always the same amount
+# of queries no matter how big the board is
+class TaskListPages(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        for i in range(25):
+            Task.objects.create(
+                board=self.board, title=f"Task {i}", priority=i % 5 + 1,
+                progress_status="DONE" if i % 3 == 0 else "WORKING",
+                owner=self.owner if i % 2 else self.other_user,
+            )
+        self.url = f"/api/board/{self.board.url}/tasks/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def test_pages(self):
+        tasks = []
+        response = self.client.get(self.url, {"limit": 10})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            tasks += response.json()['tasks']
+            if response.json()['next_cursor'] is None:
+                break
+            response = self.client.get(self.url, {"limit": 10, "cursor": response.json()['next_cursor']})
+
+        expected = list(Task.objects.filter(board=self.board).order_by("priority", "id").values_list("id", flat=True))
+        self.assertEqual([task['id'] for task in tasks], expected)
+
+    def test_filters(self):
+        response = self.client.get(self.url, {"progress_status": "DONE", "priority": 1, "owner": self.other_user.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = Task.objects.filter(
+            board=self.board, progress_status="DONE", priority=1, owner=self.other_user
+        ).values_list("id", flat=True)
+        self.assertEqual(sorted(task['id'] for task in response.json()['tasks']), sorted(expected))
+
+        self.assertEqual(self.client.get(self.url, {"priority": 9}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_page_query_count(self):
+        with self.assertNumQueries(1):
+            TaskListSerializer(self.board.id, context={"limit": 5}).data
+        for i in range(25, 60):
+            Task.objects.create(board=self.board, title=f"Task {i}", owner=self.owner)
+        with self.assertNumQueries(1):
+            data = TaskListSerializer(self.board.id, context={"limit": 5}).data
+        self.assertEqual(len(data['tasks']), 5)
+
+    def test_no_access(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.other_token}"
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Board info is cached per board version, every write bumps the version, and the ETag gives a 304 without loading tasks
+class BoardSnapshotCache(TestCase):
+    def setUp(self):
+        get_snapshot_cache().clear()
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, _ = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.task = Task.objects.create(board=self.board, title="Task", owner=self.owner)
+        self.url = f"/api/board/{self.board.url}/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def get_version(self):
+        return Board.objects.get(id=self.board.id).version
+
+    def test_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        # Same version, 304 and the task table is not touched
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([query for query in queries if "boards_task" in query['sql']])
+
+        # After a write the ETag changes and the new data is returned
+        data = {"board": self.board.id, "title": "New task"}
+        self.client.post("/api/task/create/", data, content_type="application/json")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()['tasks']), 2)
+
+    def test_cached_snapshot(self):
+        self.client.get(self.url)
+        # Served from the cache, so the tasks aren't loaded again
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['tasks'][0]['title'], "Task")
+        self.assertFalse([query for query in queries if "boards_task" in query['sql']])
+
+    # Users are listed once in "users", the tasks and shared users only have the user id
+    def test_compact_payload(self):
+        SharedUser.objects.create(board=self.board, shared_user=self.shared_user)
+        for i in range(20):
+            Task.objects.create(board=self.board, title=f"Task {i}", owner=self.owner if i % 2 else self.shared_user)
+        Board.objects.filter(id=self.board.id).update(version=self.get_version() + 1)
+        full = self.client.get(self.url)
+        compact = self.client.get(self.url, {"payload": "compact"})
+        self.assertEqual(compact.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(compact['ETag'], full['ETag'])
+        self.assertLess(len(compact.content), len(full.content) * 2 / 3)
+
+        data = compact.json()
+        self.assertEqual(set(data['users']), {str(self.owner.id), str(self.shared_user.id)})
+        self.assertEqual(data['users'][str(self.owner.id)]['email'], "bob@gmail.com")
+        self.assertEqual(data['owner'], self.owner.id)
+        self.assertEqual(data['shared_users'][0]['user'], self.shared_user.id)
+        # Same tasks as the full payload, with the owner dict replaced by its id
+        for full_task, compact_task in zip(full.json()['tasks'], data['tasks']):
+            self.assertEqual(compact_task['owner'], full_task['owner']['id'])
+            self.assertEqual({**full_task, "owner": None}, {**compact_task, "owner": None})
+
+        response = self.client.get(self.url, {"payload": "compact"}, HTTP_IF_NONE_MATCH=compact['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, {"payload": "tiny"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_bump_version(self):
+        version = self.get_version()
+        task_url = f"/api/task/{self.task.id}/"
+        self.client.put(task_url, {"board": self.board.id, "title": "Updated"}, content_type="application/json")
+        self.assertEqual(self.get_version(), version + 1)
+
+        data = {"board_id": self.board.id, "shared_user_email": self.shared_user.email}
+        self.client.post("/api/shareduser/create/", data, content_type="application/json")
+        self.assertEqual(self.get_version(), version + 2)
+        self.client.delete("/api/shareduser/delete/", data, content_type="application/json")
+        self.assertEqual(self.get_version(), version + 3)
+
+        self.client.put(self.url, {"title": "Renamed"}, content_type="application/json")
+        self.assertEqual(self.get_version(), version + 4)
+        self.assertEqual(self.client.get(self.url).json()['title'], "Renamed")
+
+        self.client.delete(task_url)
+        self.assertEqual(self.get_version(), version + 5)
+        self.assertEqual(self.client.get(self.url).json()['tasks'], [])
+
+    @override_settings(CACHES=dict(settings.CACHES, default={
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'scrummaster-test-cache'),
+    }))
+    def test_file_cache(self):
+        get_snapshot_cache().clear()
+        first = self.client.get(self.url).json()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url).json()
+        self.assertEqual(first, second)
+        self.assertFalse([query for query in queries if "boards_task" in query['sql']])
+        get_snapshot_cache().clear()
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Bulk task create/update/delete, errors are given per operation and the amount of queries doesn't depend on the amount
+# of operations
+class TaskBulkOperations(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.tasks = [Task.objects.create(board=self.board, title=f"Task {i}", owner=self.owner) for i in range(4)]
+        self.url = f"/api/board/{self.board.url}/tasks/bulk/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def post(self, operations):
+        return self.client.post(self.url, {"operations": operations}, content_type="application/json")
+
+    def test_bulk(self):
+        operations = [
+            {"op": "create", "title": "New task", "priority": 3},
+            {"op": "update", "id": self.tasks[0].id, "progress_status": "DONE", "owner": self.other_user.id},
+            {"op": "delete", "id": self.tasks[1].id},
+            {"op": "create", "title": "Another new task", "description": "Description"},
+        ]
+        response = self.post(operations)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+
+        self.assertEqual([result['op'] for result in results], ["create", "update", "delete", "create"])
+        self.assertEqual(Task.objects.get(id=results[0]['task']['id']).priority, 3)
+        self.assertEqual(results[0]['task']['owner']['username'], self.owner.username)
+        self.assertEqual(results[1]['task']['owner']['username'], self.other_user.username)
+        self.assertEqual(Task.objects.get(id=self.tasks[0].id).progress_status, "DONE")
+        self.assertFalse(Task.objects.filter(id=self.tasks[1].id).exists())
+        self.assertEqual(Task.objects.get(id=results[3]['task']['id']).description, "Description")
+        self.assertEqual(Task.objects.filter(board=self.board).count(), 5)
+
+    def test_errors(self):
+        operations = [
+            {"op": "create", "title": "Task 2"},  # title already used
+            {"op": "update", "id": self.tasks[0].id, "title": "Fine"},
+            {"op": "delete", "id": 123456},  # no task
+            {"op": "create"},  # no title
+        ]
+        response = self.post(operations)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()['operations']
+        self.assertIn("title", errors[3])
+
+        operations[3]['title'] = "Title"
+        response = self.post(operations)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.json()['operations']
+        self.assertIn("title", errors[0])
+        self.assertEqual(errors[1], {})
+        self.assertIn("id", errors[2])
+        # Nothing was applied
+        self.assertEqual(Task.objects.get(id=self.tasks[0].id).title, "Task 0")
+
+    def test_no_access(self):
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.other_token}"
+        response = self.post([{"op": "delete", "id": self.tasks[0].id}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Task.objects.filter(id=self.tasks[0].id).exists())
+
+    def test_query_count(self):
+        def operations(start, creates, updates):
+            return [{"op": "create", "title": f"Bulk {i}"} for i in range(start, start + creates)] + \
+                   [{"op": "update", "id": task.id, "priority": 2} for task in self.tasks[:updates]]
+
+        # Authenticate once first, so the token is cached for both requests (accounts/auth.py)
+        self.client.get(f"/api/board/{self.board.url}/")
+        # Both requests change the same two task counters (boards/counters.py), which already exist
+        Task.objects.create(board=self.board, title="Priority 2", priority=2)
+        call_command("rebuild_task_counters", stdout=StringIO())
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post(operations(0, 1, 1)).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as big:
+            self.assertEqual(self.post(operations(10, 30, 4)).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(small), len(big))
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Board changes since a version: changed tasks and shared users, deletions as tombstones, and board info only if renamed
+class BoardChangeSync(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, _ = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.other_board = Board.objects.create(title="Other board", owner=self.owner)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+        # Tasks are made through the API so the board is at version 1 afterwards
+        operations = [{"op": "create", "title": f"Task {i}"} for i in range(5)]
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": operations},
+                         content_type="application/json")
+        self.tasks = list(Task.objects.filter(board=self.board).order_by("id"))
+        self.url = f"/api/board/{self.board.url}/changes/"
+
+    def changes(self, since):
+        response = self.client.get(self.url, {"since": since})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_changes(self):
+        everything = self.changes(0)
+        self.assertEqual(len(everything['tasks']), 5)
+        self.assertEqual(everything['board']['title'], "Board")
+        version = everything['version']
+
+        # Nothing changed
+        nothing = self.changes(version)
+        self.assertEqual(nothing['tasks'], [])
+        self.assertIsNone(nothing['board'])
+
+        task_url = f"/api/task/{self.tasks[0].id}/"
+        self.client.put(task_url, {"board": self.board.id, "title": "Updated"}, content_type="application/json")
+        self.client.delete(f"/api/task/{self.tasks[1].id}/")
+        self.client.post("/api/task/create/", {"board": self.board.id, "title": "New"}, content_type="application/json")
+        data = {"board_id": self.board.id, "shared_user_email": self.shared_user.email}
+        self.client.post("/api/shareduser/create/", data, content_type="application/json")
+        self.client.put(f"/api/board/{self.board.url}/", {"title": "Renamed"}, content_type="application/json")
+
+        changes = self.changes(version)
+        self.assertEqual(changes['version'], version + 5)
+        self.assertEqual(sorted(task['title'] for task in changes['tasks']), ["New", "Updated"])
+        self.assertEqual(changes['deleted']['tasks'], [self.tasks[1].id])
+        self.assertEqual(changes['shared_users'][0]['username'], self.shared_user.username)
+        self.assertEqual(changes['board']['title'], "Renamed")
+
+        # Removing the shared user leaves a tombstone
+        version = changes['version']
+        shared_user_id = changes['shared_users'][0]['id']
+        self.client.delete("/api/shareduser/delete/", data, content_type="application/json")
+        changes = self.changes(version)
+        self.assertEqual(changes['deleted']['shared_users'], [shared_user_id])
+        self.assertEqual(changes['tasks'], [])
+
+    def test_move_and_bulk(self):
+        version = self.changes(0)['version']
+        other_version = Board.objects.get(id=self.other_board.id).version
+
+        # Moving a task off the board is a deletion on this board and a change on the other board
+        task_url = f"/api/task/{self.tasks[0].id}/"
+        self.client.put(task_url, {"board": self.other_board.id, "title": "Moved"}, content_type="application/json")
+        self.assertEqual(self.changes(version)['deleted']['tasks'], [self.tasks[0].id])
+        other_changes = self.client.get(f"/api/board/{self.other_board.url}/changes/",
+                                        {"since": other_version}).json()
+        self.assertEqual([task['title'] for task in other_changes['tasks']], ["Moved"])
+
+        version = self.changes(0)['version']
+        operations = [
+            {"op": "create", "title": "Bulk"},
+            {"op": "update", "id": self.tasks[2].id, "priority": 4},
+            {"op": "delete", "id": self.tasks[3].id},
+        ]
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": operations},
+                         content_type="application/json")
+        changes = self.changes(version)
+        self.assertEqual(changes['version'], version + 1)
+        self.assertEqual(sorted(task['title'] for task in changes['tasks']), ["Bulk", "Task 2"])
+        self.assertEqual(changes['deleted']['tasks'], [self.tasks[3].id])
+
+    def test_bad_since(self):
+        response = self.client.get(self.url, {"since": 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"since": -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_query_count(self):
+        version = self.changes(0)['version']
+        self.client.put(f"/api/task/{self.tasks[0].id}/", {"board": self.board.id, "title": "Updated"},
+                        content_type="application/json")
+        board = Board.objects.select_related("owner").get(id=self.board.id)
+        with self.assertNumQueries(3):
+            data = BoardChangeListSerializer(board, context={"since": version}).data
+        self.assertEqual(len(data['tasks']), 1)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Task titles are unique in their board, not across all boards
+class TaskTitles(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.other_board = Board.objects.create(title="Other board", owner=self.owner)
+        self.task = Task.objects.create(board=self.board, title="Task")
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def create(self, board, title):
+        data = {"board": board.id, "title": title}
+        return self.client.post("/api/task/create/", data, content_type="application/json")
+
+    def test_same_title_other_board(self):
+        self.assertEqual(self.create(self.other_board, "Task").status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.filter(title="Task").count(), 2)
+
+    def test_same_title_same_board(self):
+        version = Board.objects.get(id=self.board.id).version
+        response = self.create(self.board, "Task")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"title": ["A task with this title already exists in the board."]})
+        # The whole write was rolled back
+        self.assertEqual(Board.objects.get(id=self.board.id).version, version)
+
+    def test_update_to_taken_title(self):
+        other_task = Task.objects.create(board=self.board, title="Other task", owner=self.owner)
+        data = {"board": self.board.id, "title": "Task"}
+        response = self.client.put(f"/api/task/{other_task.id}/", data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("title", response.data)
+        self.assertEqual(Task.objects.get(id=other_task.id).title, "Other task")
+
+        # Moving it to a board where the title is free is fine
+        self.create(self.other_board, "Other task")
+        data = {"board": self.other_board.id, "title": "Task"}
+        response = self.client.put(f"/api/task/{other_task.id}/", data, content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The board task counters are kept up to date by every task write, and give the board summary
+class BoardTaskCounters(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.other_board = Board.objects.create(title="Other board", owner=self.owner)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": [
+            {"op": "create", "title": "Task 0", "progress_status": "DONE", "priority": 1},
+            {"op": "create", "title": "Task 1", "progress_status": "STUCK", "priority": 5},
+            {"op": "create", "title": "Task 2", "priority": 1},
+        ]}, content_type="application/json")
+        self.tasks = list(Task.objects.filter(board=self.board).order_by("title"))
+
+    def assertCountersCorrect(self):
+        for board in [self.board, self.other_board]:
+            self.assertEqual(saved_counts(board.id), count_tasks(board.id))
+
+    def test_task_writes(self):
+        self.assertCountersCorrect()
+        self.client.post("/api/task/create/", {"board": self.board.id, "title": "New", "priority": 3},
+                         content_type="application/json")
+        self.assertCountersCorrect()
+        self.client.put(f"/api/task/{self.tasks[0].id}/", {"board": self.board.id, "title": "Task 0",
+                        "progress_status": "WORKING", "priority": 2}, content_type="application/json")
+        self.assertCountersCorrect()
+        # Moved to another board
+        self.client.put(f"/api/task/{self.tasks[1].id}/", {"board": self.other_board.id, "title": "Task 1"},
+                        content_type="application/json")
+        self.assertCountersCorrect()
+        self.client.delete(f"/api/task/{self.tasks[2].id}/")
+        self.assertCountersCorrect()
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": [
+            {"op": "update", "id": self.tasks[0].id, "progress_status": "DONE"},
+            {"op": "create", "title": "Bulk", "progress_status": "FUTURE"},
+        ]}, content_type="application/json")
+        self.assertCountersCorrect()
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": [
+            {"op": "delete", "id": self.tasks[0].id},
+        ]}, content_type="application/json")
+        self.assertCountersCorrect()
+
+    # Writes to a task that another write changed after it was loaded (requests running at the same time). The task
+    # is read again once the board is locked, so it is only counted and deleted once.
+    def test_concurrent_task_writes(self):
+        def load(task):
+            return BoardAccessResolver(self.owner).for_task(task.id)
+
+        def write_loaded(loaded, method, *args, **kwargs):
+            with mock.patch.object(BoardAccessResolver, "for_task", return_value=loaded):
+                return getattr(self.client, method)(*args, content_type="application/json", **kwargs)
+
+        # Deleted twice
+        url = f"/api/task/{self.tasks[2].id}/"
+        loaded = load(self.tasks[2])
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(write_loaded(loaded, "delete", url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Tombstone.objects.filter(kind=Tombstone.TASK, object_id=self.tasks[2].id).count(), 1)
+        self.assertCountersCorrect()
+
+        # Two status changes
+        url = f"/api/task/{self.tasks[0].id}/"
+        loaded = load(self.tasks[0])
+        self.client.put(url, {"board": self.board.id, "title": "Task 0", "progress_status": "STUCK"},
+                        content_type="application/json")
+        response = write_loaded(loaded, "put", url, {"board": self.board.id, "title": "Task 0",
+                                                     "progress_status": "WORKING"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertCountersCorrect()
+
+        # Updated after it was deleted, it isn't saved again
+        url = f"/api/task/{self.tasks[1].id}/"
+        loaded = load(self.tasks[1])
+        self.client.delete(url)
+        response = write_loaded(loaded, "put", url, {"board": self.board.id, "title": "Task 1"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Task.objects.filter(id=self.tasks[1].id).exists())
+        self.assertCountersCorrect()
+
+    def test_summary(self):
+        url = f"/api/board/{self.board.url}/summary/"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['summary'], {
+            "total": 3,
+            "progress_status": {"DONE": 1, "STUCK": 1, "WORKING": 1},
+            "priority": {"1": 2, "5": 1},
+        })
+        self.assertFalse([query for query in queries if 'FROM "boards_task"' in query['sql']])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_board_list(self):
+        response = self.client.get("/api/board/list/")
+        self.assertNotIn("summary", response.json()['owned_boards'][0])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/board/list/?include=summary")
+        summaries = {board['id']: board['summary'] for board in response.json()['owned_boards']}
+        self.assertEqual(summaries[self.board.id]['total'], 3)
+        self.assertEqual(summaries[self.other_board.id], {"total": 0, "progress_status": {}, "priority": {}})
+        # The boards, the shared boards and the counters of all of them
+        self.assertEqual(len(without_authentication(queries)), 3)
+
+        response = self.client.get("/api/board/list/?include=summary&limit=1")
+        self.assertIn("summary", response.json()['owned_boards'][0])
+
+    def test_rebuild_command(self):
+        BoardTaskCounter.objects.filter(board=self.board, progress_status="DONE").update(count=7)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_task_counters", "--check", stdout=StringIO())
+        self.assertNotEqual(saved_counts(self.board.id), count_tasks(self.board.id))
+
+        call_command("rebuild_task_counters", stdout=StringIO())
+        self.assertCountersCorrect()
+        call_command("rebuild_task_counters", "--check", stdout=StringIO())
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Full text task search (boards/search.py), the index is kept up to date by the database
+class TaskSearchTests(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, self.shared_token = create_user("Alice1", "alice1@gmail.com")
+        self.other_user, self.other_token = create_user("Eve1", "eve1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.other_board = Board.objects.create(title="Other board", owner=self.other_user)
+        SharedUser.objects.create(board=self.board, shared_user=self.shared_user)
+        self.title_match = Task.objects.create(board=self.board, title="Fix the login page", owner=self.owner)
+        self.description_match = Task.objects.create(board=self.board, title="Cleanup",
+                                                     description="The login form needs fixing")
+        Task.objects.create(board=self.board, title="Unrelated", description="Nothing to see")
+        Task.objects.create(board=self.other_board, title="Fix the other login")
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def search(self, query, token=None, **params):
+        params["q"] = query
+        if token:
+            return self.client.get("/api/task/search/", params, HTTP_AUTHORIZATION=f"Token {token}")
+        return self.client.get("/api/task/search/", params)
+
+    def result_ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_ranked(self):
+        # "fixed" finds "Fix" and "fixing", a match in the title is ranked first
+        ids = self.result_ids(self.search("login fixed"))
+        self.assertEqual(ids, [self.title_match.id, self.description_match.id])
+        result = self.search("login").json()['results'][0]
+        self.assertEqual(result['board']['id'], self.board.id)
+
+    def test_access(self):
+        # The task of the other board isn't found, the shared user finds the same tasks as the owner
+        self.assertEqual(len(self.result_ids(self.search("login"))), 2)
+        self.assertEqual(len(self.result_ids(self.search("login", token=self.shared_token))), 2)
+        self.assertEqual(len(self.result_ids(self.search("login", token=self.other_token))), 1)
+
+        self.assertEqual(len(self.result_ids(self.search("login", board=str(self.board.url)))), 2)
+        response = self.search("login", token=self.other_token, board=str(self.board.url))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_kept_up_to_date(self):
+        self.client.put(f"/api/task/{self.title_match.id}/", {"board": self.board.id, "title": "Fix the signup page"},
+                        content_type="application/json")
+        self.client.delete(f"/api/task/{self.description_match.id}/")
+        self.client.post(f"/api/board/{self.board.url}/tasks/bulk/", {"operations": [
+            {"op": "create", "title": "Login with email"},
+        ]}, content_type="application/json")
+
+        self.assertEqual(self.result_ids(self.search("signup")), [self.title_match.id])
+        ids = self.result_ids(self.search("login"))
+        self.assertEqual(ids, list(Task.objects.filter(title="Login with email").values_list("id", flat=True)))
+
+    def test_pages(self):
+        for i in range(5):
+            Task.objects.create(board=self.board, title=f"Login task {i}")
+        ids = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            page = self.search("login", **params).json()
+            ids += [result['id'] for result in page['results']]
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(ids, self.result_ids(self.search("login")))
+        self.assertEqual(len(ids), 7)
+
+    def test_bad_query(self):
+        self.assertEqual(self.result_ids(self.search('login" * (')), self.result_ids(self.search("login")))
+        self.assertEqual(self.result_ids(self.search('"*"')), [])
+        self.assertEqual(self.search("").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Streaming board export and batched import (boards/transfer.py)
+class BoardTransfer(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        self.other_board = Board.objects.create(title="Other board", owner=self.owner)
+        for i in range(5):
+            Task.objects.create(board=self.board, title=f"Task {i}", description=f"Line one\nline, {i}",
+                                priority=i + 1, owner=self.owner if i % 2 else None)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def export(self, board, **params):
+        response = self.client.get(f"/api/board/{board.url}/export/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def import_tasks(self, board, body, content_type="application/x-ndjson"):
+        return self.client.post(f"/api/board/{board.url}/import/", body, content_type=content_type)
+
+    def test_export_ndjson(self):
+        lines = [json.loads(line) for line in self.export(self.board).splitlines()]
+        self.assertEqual(lines[0]['type'], "board")
+        self.assertEqual(lines[0]['id'], self.board.id)
+        self.assertEqual([line['title'] for line in lines[1:]], [f"Task {i}" for i in range(5)])
+        self.assertEqual(lines[2]['owner_email'], "bob@gmail.com")
+        self.assertIsNone(lines[1]['owner_email'])
+
+    def test_export_csv(self):
+        rows = list(csv.DictReader(StringIO(self.export(self.board, export_format="csv"))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[3]['description'], "Line one\nline, 3")
+        self.assertEqual(rows[3]['priority'], "4")
+
+    def test_export_errors(self):
+        response = self.client.get(f"/api/board/{self.board.url}/export/", HTTP_AUTHORIZATION=f"Token {self.other_token}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(f"/api/board/{self.board.url}/export/", {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # What is exported can be imported into another board, in either format
+    def test_round_trip(self):
+        for export_format, content_type in [("ndjson", "application/x-ndjson"), ("csv", "text/csv")]:
+            board = Board.objects.create(title=f"Imported {export_format}", owner=self.owner)
+            response = self.import_tasks(board, self.export(self.board, export_format=export_format), content_type)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.json()['imported'], 5)
+            self.assertIn("rows_per_second", response.json())
+
+            fields = ["title", "description", "progress_status", "priority", "owner_id", "change_seq"]
+            imported = list(Task.objects.filter(board=board).order_by("title").values(*fields))
+            self.assertEqual([task['change_seq'] for task in imported], [1] * 5)
+            fields.remove("change_seq")
+            original = list(Task.objects.filter(board=self.board).order_by("title").values(*fields))
+            self.assertEqual([{field: task[field] for field in fields} for task in imported], original)
+            self.assertEqual(saved_counts(board.id), count_tasks(board.id))
+
+    def test_import_error(self):
+        body = "\n".join([
+            json.dumps({"title": "New task"}),
+            json.dumps({"title": "Task 1"}),  # Taken
+        ])
+        response = self.import_tasks(self.board, body)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['line'], "2")
+        self.assertIn("title", response.json()['errors'])
+        self.assertFalse(Task.objects.filter(title="New task").exists())  # Nothing was imported
+
+        response = self.import_tasks(self.board, json.dumps({"title": "New task", "priority": 9}))
+        self.assertEqual(response.json()['errors'], {"priority": ["A whole number from 1 to 5."]})
+        response = self.import_tasks(self.board, json.dumps({"title": "New task", "owner_email": "nobody@gmail.com"}))
+        self.assertIn("owner_email", response.json()['errors'])
+        response = self.import_tasks(self.board, "not json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # The amount of queries depends on the amount of batches, not the amount of tasks
+    def test_import_queries(self):
+        body = "\n".join(json.dumps({"title": f"New {i}", "owner_email": "bob@gmail.com"}) for i in range(300))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.import_tasks(self.other_board, body)
+        self.assertEqual(response.json()['imported'], 300)
+        self.assertLess(len(without_authentication(queries)), 15)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as file:
+            file.write(self.export(self.board, export_format="csv"))
+        try:
+            output = StringIO()
+            call_command("import_tasks", str(self.other_board.url), file.name, "--batch-size", "2", stdout=output)
+        finally:
+            os.remove(file.name)
+        self.assertIn("Imported 5 tasks", output.getvalue())
+        self.assertIn("rows/sec", output.getvalue())
+        self.assertEqual(Task.objects.filter(board=self.other_board).count(), 5)
+
+        with self.assertRaises(CommandError):
+            call_command("import_tasks", "not-a-board", "tasks.csv", stdout=StringIO())
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The export through the ASGI app (scrummaster/asgi.py), which reads the streamed content in a thread
+# (scrummaster/asgi_handler.py). The requests go through django's signals, so the data has to be committed.
+class BoardExportASGI(TransactionTestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        Task.objects.bulk_create([Task(board=self.board, title=f"Task {i}") for i in range(50)])
+
+    def test_export(self):
+        from scrummaster.asgi import application
+
+        async def run():
+            communicator = ApplicationCommunicator(application, {
+                "type": "http",
+                "method": "GET",
+                "path": f"/api/board/{self.board.url}/export/",
+                "query_string": b"",
+                "headers": [(b"host", b"testserver"), (b"authorization", f"Token {self.token}".encode())],
+            })
+            await communicator.send_input({"type": "http.request", "body": b""})
+            start = await communicator.receive_output(timeout=5)
+            body = b""
+            while True:
+                message = await communicator.receive_output(timeout=5)
+                body += message.get("body", b"")
+                if not message.get("more_body"):
+                    return start, body
+
+        with mock.patch("boards.transfer.EXPORT_BUFFER_SIZE", 100):  # Several parts
+            start, body = async_to_sync(run)()
+        self.assertEqual(start["status"], 200)
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(lines[0]['type'], "board")
+        self.assertEqual([line['title'] for line in lines[1:]], [f"Task {i}" for i in range(50)])
+
+
+class TaskFieldsets(TestCase):
+    def setUp(self):
+        get_snapshot_cache().clear()
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        for i in range(6):
+            Task.objects.create(board=self.board, title=f"Task {i}", description="Long description " * 50,
+                                priority=i % 3 + 1, owner=self.other_user if i % 2 else None)
+        self.url = f"/api/board/{self.board.url}/"
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    # Returns the response and the SQL of the queries on the task table
+    def get_with_task_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, [query['sql'] for query in queries if 'FROM "boards_task"' in query['sql']]
+
+    # The descriptions are not read from the database when they are left out
+    def test_board_info(self):
+        response, task_queries = self.get_with_task_queries(self.url, {"fields": "title,progress_status"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.json()['tasks'][0]), ["id", "title", "progress_status"])
+        self.assertEqual(len(task_queries), 1)
+        self.assertNotIn('"description"', task_queries[0])
+        self.assertNotIn('"auth_user"', task_queries[0])  # The owner isn't joined either
+
+        full = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], full['ETag'])
+        self.assertIn("description", full.json()['tasks'][0])
+        response = self.client.get(self.url, {"fields": "title,progress_status"}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Same as the full info with the fields left out
+        response = self.client.get(self.url, {"exclude": "description"})
+        expected = [{key: value for key, value in task.items() if key != "description"} for task in full.json()['tasks']]
+        self.assertEqual(response.json()['tasks'], expected)
+
+    def test_compact_board_info(self):
+        response = self.client.get(self.url, {"payload": "compact", "fields": "title"})
+        self.assertEqual(list(response.json()['tasks'][0]), ["id", "title"])
+        self.assertEqual(list(response.json()['users']), [str(self.owner.id)])
+        response = self.client.get(self.url, {"payload": "compact", "exclude": "description"})
+        self.assertEqual(response.json()['tasks'][1]['owner'], self.other_user.id)
+        self.assertIn(str(self.other_user.id), response.json()['users'])
+
+    def test_task_list(self):
+        url = f"{self.url}tasks/"
+        params = {"exclude": "description,date_created", "limit": 4}
+        response, task_queries = self.get_with_task_queries(url, params)
+        self.assertNotIn('"description"', task_queries[0])
+        self.assertEqual(list(response.json()['tasks'][1]), ["id", "title", "progress_status", "priority", "owner"])
+        self.assertEqual(response.json()['tasks'][1]['owner']['email'], "alice1@gmail.com")
+
+        # The cursor still works when the priority isn't one of the fields
+        titles = [task['title'] for task in response.json()['tasks']]
+        params = {"fields": "title", "limit": 4, "cursor": response.json()['next_cursor']}
+        response = self.client.get(url, params)
+        self.assertEqual(list(response.json()['tasks'][0]), ["id", "title"])
+        titles += [task['title'] for task in response.json()['tasks']]
+        self.assertEqual(sorted(titles), [f"Task {i}" for i in range(6)])
+
+    def test_bad_fields(self):
+        response = self.client.get(self.url, {"fields": "title,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("secret", response.json()['fields'][0])
+        response = self.client.get(f"{self.url}tasks/", {"fields": "title", "exclude": "description"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_task_detail(self):
+        task = Task.objects.get(title="Task 1")
+        response = self.client.get(f"/api/task/{task.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['task']['description'], task.description)
+        self.assertEqual(response.json()['task']['board'], self.board.id)
+        self.assertEqual(response.json()['task']['owner']['id'], self.other_user.id)
+
+        response = self.client.get(f"/api/task/{task.id}/", HTTP_AUTHORIZATION=f"Token {self.other_token}")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # Creating or updating a task without an owner gives the same task detail as the GET
+    def test_no_owner(self):
+        response = self.client.post("/api/task/create/", {"board": self.board.id, "title": "New task", "owner": None},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()['task']['owner'])
+        self.assertEqual(response.json()['task']['board'], self.board.id)
+        task_id = response.json()['task']['id']
+        self.assertEqual(response.json(), self.client.get(f"/api/task/{task_id}/").json())
+
+        task = Task.objects.get(title="Task 1")
+        response = self.client.put(f"/api/task/{task.id}/", {"board": self.board.id, "title": "Task 1", "owner": None},
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.json()['task']['owner'])
+        self.assertEqual(response.json(), self.client.get(f"/api/task/{task.id}/").json())
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+class ResponseRenderers(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        for i in range(3):
+            Task.objects.create(board=self.board, title=f"Task {i}", owner=self.owner, priority=i + 1)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    # Same JSON as django's JsonResponse: datetimes in milliseconds with a Z, UUIDs as strings
+    def test_json(self):
+        response = self.client.get(f"/api/board/{self.board.url}/")
+        self.assertEqual(response['Content-Type'], "application/json")
+        task = Task.objects.get(title="Task 0")
+        expected = json.loads(json.dumps(BoardInfoUrlSerializer(self.board.url).data, cls=DjangoJSONEncoder))
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(response.json()['tasks'][0]['date_created'], DjangoJSONEncoder().default(task.date_created))
+        self.assertEqual(response.json()['url'], str(self.board.url))
+
+    # The default JSON is byte for byte what the JsonResponse the views used to return gives (", " and ": "
+    # separators, non-ASCII characters escaped). The compact JSON is only given to clients that ask for it.
+    def test_json_bytes(self):
+        self.board.title = "Tâche board"
+        self.board.save()
+        response = self.client.get(f"/api/board/{self.board.url}/")
+        data = BoardInfoUrlSerializer(self.board.url).data
+        self.assertEqual(response.content, JsonResponse(data).content)
+        self.assertIn(b', "title": "T\\u00e2che board"', response.content)
+        # The board list too (the values were checked by the other tests, the JSON round trip keeps the key order)
+        response = self.client.get("/api/board/list/")
+        self.assertEqual(response.content, JsonResponse(json.loads(response.content)).content)
+
+        for params, headers in [({}, {"HTTP_ACCEPT": "application/vnd.scrummaster.compact+json"}),
+                                ({"format": "compact-json"}, {})]:
+            response = self.client.get(f"/api/board/{self.board.url}/", params, **headers)
+            self.assertEqual(response['Content-Type'], "application/vnd.scrummaster.compact+json")
+            self.assertEqual(response.content, json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"),
+                                                          ensure_ascii=False).encode())
+            with mock.patch.object(renderers, "orjson", None):
+                self.assertEqual(renderers.FastJSONRenderer().render(data), response.content)
+
+    # Without orjson the json module gives the same output
+    def test_json_fallback(self):
+        data = BoardInfoUrlSerializer(self.board.url).data
+        rendered = renderers.FastJSONRenderer().render(data)
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(json.loads(renderers.FastJSONRenderer().render(data)), json.loads(rendered))
+        # Indented output (ex: browsable API) is left to the json module
+        indented = renderers.FastJSONRenderer().render(data, "application/json; indent=4")
+        self.assertIn(b'\n    "id"', indented)
+
+    def test_msgpack(self):
+        response = self.client.get(f"/api/board/{self.board.url}/", HTTP_ACCEPT="application/msgpack")
+        if not renderers.MessagePackRenderer.available:
+            self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+            return
+        self.assertEqual(response['Content-Type'], "application/msgpack")
+        data = renderers.msgpack.unpackb(response.content)
+        self.assertEqual(data['tasks'][0]['date_created'], self.client.get(f"/api/board/{self.board.url}/").json()
+                         ['tasks'][0]['date_created'])
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+class BenchmarkCommands(TestCase):
+    def test_seed_data(self):
+        call_command("seed_benchmark_data", "--users", "10", "--boards", "20", "--max-tasks", "150",
+                     stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith="bench-").count(), 10)
+        sizes = sorted(Board.objects.annotate(size=Count("tasks")).values_list("size", flat=True))
+        self.assertEqual(len(sizes), 20)
+        self.assertEqual(sizes[-1], 150)
+        self.assertLess(sizes[len(sizes) // 2], 50)  # Most boards are small
+        statuses = set(Task.objects.values_list("progress_status", flat=True))
+        self.assertTrue(statuses <= set(PROGRESS_STATUSES))
+        for board in Board.objects.all():
+            self.assertEqual(saved_counts(board.id), count_tasks(board.id))
+
+        with self.assertRaises(CommandError):  # Already there
+            call_command("seed_benchmark_data", stdout=StringIO())
+        call_command("seed_benchmark_data", "--users", "3", "--boards", "2", "--clear", stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith="bench-").count(), 3)
+
+    # Every route is benchmarked without errors, and nothing the benchmark wrote is kept
+    def test_benchmark_api(self):
+        call_command("seed_benchmark_data", "--users", "3", "--boards", "3", "--max-tasks", "20", stdout=StringIO())
+        task_count = Task.objects.count()
+        output = StringIO()
+        call_command("benchmark_api", "--iterations", "2", "--warmup", "1", stdout=output, stderr=StringIO())
+        results = json.loads(output.getvalue())
+        self.assertEqual(results['meta']['not_benchmarked'], [])
+        self.assertEqual(results['meta']['board_tasks'], 20)
+        for name, result in results['endpoints'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(Task.objects.count(), task_count)
+
+        with self.assertRaises(CommandError):
+            call_command("benchmark_api", "--endpoint", "nope", stdout=StringIO())
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The async views run the ORM work in the thread pool (scrummaster/async_views.py). The pool threads have their own
+# database connections, so the data has to be committed (TransactionTestCase).
+class AsyncReadViews(TransactionTestCase):
+    def setUp(self):
+        get_snapshot_cache().clear()
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        Task.objects.create(board=self.board, title="Task", owner=self.owner)
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view_class, method, path, token, **kwargs):
+        request = getattr(self.factory, method)(path, authorization=f"Token {token}", content_type="application/json",
+                                                data=kwargs.pop("data", ""))
+        return async_to_sync(async_read_view(view_class))(request, **kwargs)
+
+    @override_settings(ASYNC_ORM_MAX_WORKERS=2)
+    def test_same_response(self):
+        path = f"/api/board/{self.board.url}/"
+        response = self.call(BoardInfo, "get", path, self.token, url=str(self.board.url))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), self.client.get(path, HTTP_AUTHORIZATION=f"Token {self.token}")
+                         .json())
+        self.assertEqual(response['ETag'], self.client.get(path, HTTP_AUTHORIZATION=f"Token {self.token}")['ETag'])
+        response = self.call(BoardList, "get", "/api/board/list/", self.token)
+        self.assertEqual(json.loads(response.content)['owned_boards'][0]['id'], self.board.id)
+
+        response = self.call(BoardInfo, "get", path, self.other_token, url=str(self.board.url))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # Writes still work (and aren't run in the pool)
+        response = self.call(BoardInfo, "put", path, self.token, url=str(self.board.url), data='{"title": "Renamed"}')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Board.objects.get(id=self.board.id).title, "Renamed")
+
+    # No more than ASYNC_ORM_MAX_WORKERS calls run at the same time
+    @override_settings(ASYNC_ORM_MAX_WORKERS=2)
+    def test_bounded_pool(self):
+        running = []
+        most_running = []
+
+        def slow_call():
+            running.append(1)
+            most_running.append(len(running))
+            time.sleep(0.05)
+            running.pop()
+            return threading.current_thread().name
+
+        async def run():
+            return await asyncio.gather(*[run_orm(slow_call) for _ in range(6)])
+
+        thread_names = asyncio.run(run())
+        self.assertEqual(max(most_running), 2)
+        self.assertTrue(all(name.startswith("orm") for name in thread_names))
+
+    def tearDown(self):
+        get_snapshot_cache().clear()
+
+
+# The hot queries use the composite indexes and the (board, shared_user) unique constraint instead of scanning.
+# The plans are checked on SQLite, Postgres scans the tiny test tables no matter what the indexes are.
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN is SQLite only")
+class DatabaseIndexes(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, self.shared_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        SharedUser.objects.create(board=self.board, shared_user=self.shared_user)
+        for i in range(5):
+            Task.objects.create(board=self.board, title=f"Task {i}", priority=i + 1)
+
+    # The query plans of the queries run by a GET request, for the queries on the table
+    def query_plans(self, url, table, token):
+        self.client.get(url, HTTP_AUTHORIZATION=f"Token {token}")  # So the token is cached
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if f'FROM "{table}"' in query['sql']:
+                    cursor.execute("EXPLAIN QUERY PLAN " + query['sql'])
+                    plans.append(" ".join(str(row[-1]) for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return plans
+
+    def test_task_list(self):
+        url = f"/api/board/{self.board.url}/tasks/"
+        plans = self.query_plans(url, "boards_task", self.token)
+        self.assertIn("USING INDEX boards_task_board_prio_idx", plans[0])
+        self.assertNotIn("TEMP B-TREE", plans[0])  # Sorted by the index
+
+        plans = self.query_plans(url + "?progress_status=WORKING", "boards_task", self.token)
+        self.assertIn("USING INDEX boards_task_board_status_idx", plans[0])
+        self.assertNotIn("TEMP B-TREE", plans[0])
+
+    def test_shared_user_access(self):
+        plans = self.query_plans(f"/api/board/{self.board.url}/tasks/", "boards_board", self.shared_token)
+        # U0 is the shared user subquery
+        self.assertIn("SEARCH U0 USING COVERING INDEX", plans[0])
+        self.assertNotIn("SCAN U0", plans[0])
+
+    def test_board_list(self):
+        plans = self.query_plans("/api/board/list/", "boards_shareduser", self.shared_token)
+        self.assertIn("USING INDEX boards_shared_user_board_idx", plans[0])
+
+    # Sharing twice is stopped by the unique constraint, without checking first
+    def test_duplicate_share(self):
+        data = {"board_id": self.board.id, "shared_user_email": self.shared_user.email}
+        self.client.get("/api/board/list/", HTTP_AUTHORIZATION=f"Token {self.token}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/shareduser/create/", data, content_type="application/json",
+                                        HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {"detail": "This user is already added to the board"})
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "boards_shareduser"')])
+        self.assertEqual(SharedUser.objects.filter(board=self.board).count(), 1)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Board events are published after the write is committed and pushed to the board event stream of the ASGI app
+class BoardEventStreamTests(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.shared_user, self.shared_token = create_user("Alice1", "alice1@gmail.com")
+        self.other_user, self.other_token = create_user("Eve1", "eve1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        SharedUser.objects.create(board=self.board, shared_user=self.shared_user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+        self.app = BoardEventStream(None)
+
+    def scope(self, token, url=None):
+        return {
+            "type": "http",
+            "method": "GET",
+            "path": f"/api/board/{url or self.board.url}/events/",
+            "query_string": f"token={token}".encode(),
+            "headers": [],
+        }
+
+    def create_task(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/task/create/", {"board": self.board.id, "title": title},
+                             content_type="application/json")
+
+    def remove_shared_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            data = {"board_id": self.board.id, "shared_user_email": self.shared_user.email}
+            self.client.delete("/api/shareduser/delete/", data, content_type="application/json")
+
+    def read_event(self, message):
+        lines = message["body"].decode().strip().split("\n")
+        return json.loads(lines[2][len("data: "):])
+
+    def test_stream(self):
+        async def run():
+            communicator = ApplicationCommunicator(self.app, self.scope(self.shared_token))
+            await communicator.send_input({"type": "http.request", "body": b""})
+            start = await communicator.receive_output(timeout=5)
+            self.assertEqual(start["status"], 200)
+            opened = self.read_event(await communicator.receive_output(timeout=5))
+            self.assertEqual(opened["type"], "stream.opened")
+
+            await sync_to_async(self.create_task)("Pushed task")
+            event = self.read_event(await communicator.receive_output(timeout=5))
+            self.assertEqual(event["type"], "task.created")
+            self.assertEqual(event["task"]["title"], "Pushed task")
+            self.assertEqual(event["version"], opened["version"] + 1)
+
+            # Removing the user from the board ends their stream
+            await sync_to_async(self.remove_shared_user)()
+            event = self.read_event(await communicator.receive_output(timeout=5))
+            self.assertEqual(event["type"], "shared_user.deleted")
+            end = await communicator.receive_output(timeout=5)
+            self.assertFalse(end["more_body"])
+            await communicator.wait(timeout=5)
+
+        async_to_sync(run)()
+
+    def test_no_access(self):
+        async def run(token, expected_status):
+            communicator = ApplicationCommunicator(self.app, self.scope(token))
+            await communicator.send_input({"type": "http.request", "body": b""})
+            start = await communicator.receive_output(timeout=5)
+            self.assertEqual(start["status"], expected_status)
+            await communicator.wait(timeout=5)
+
+        async_to_sync(run)(self.other_token, status.HTTP_404_NOT_FOUND)
+        async_to_sync(run)("WRONGTOKEN", status.HTTP_401_UNAUTHORIZED)
+
+    def test_rolled_back_write_is_not_published(self):
+        async def run():
+            subscription = get_event_broker().subscribe(self.board.id)
+
+            def failed_write():
+                with self.captureOnCommitCallbacks(execute=True):
+                    try:
+                        with record_changes(self.board.id) as changes:
+                            changes.task_deleted(Task(id=1))
+                            raise ValueError
+                    except ValueError:
+                        pass
+                    with record_changes(self.board.id) as changes:
+                        changes.board_deleted()
+
+            await sync_to_async(failed_write)()
+            event = await asyncio.wait_for(subscription.get(), timeout=5)
+            self.assertEqual(event["type"], "board.deleted")
+            subscription.close()
+
+        async_to_sync(run)()
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Every view stays within its query budget (scrummaster/query_budget.py), and the reads of a board make the same
+# amount of queries for any board size
+class QueryBudgets(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    # A new board with size tasks and a shared user for every 5 tasks
+    def create_board(self, size):
+        number = Board.objects.count()
+        board = Board.objects.create(title=f"Board {number}", owner=self.owner)
+        for i in range(size // 5):
+            shared_user, _ = create_user(f"Shared{number}-{i}", f"shared{number}-{i}@gmail.com")
+            SharedUser.objects.create(board=board, shared_user=shared_user)
+        with record_changes(board.id) as changes:
+            tasks = [
+                Task(board=board, title=f"Task {i}", priority=i % 5 + 1, owner=self.owner if i % 2 else None,
+                     change_seq=changes.version)
+                for i in range(size)
+            ]
+            Task.objects.bulk_create(tasks)
+            changes.tasks_imported(tasks)
+        return board
+
+    def get(self, path):
+        response = self.client.get(path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def test_board_reads(self):
+        for view, path in [(BoardInfo, ""), (TaskList, "tasks/"), (BoardSummary, "summary/"),
+                           (BoardChangeList, "changes/?since=0"), (BoardExport, "export/")]:
+            self.assertQueryBudget(view, "GET", self.create_board,
+                                   lambda board: self.get(f"/api/board/{board.url}/{path}"))
+
+    def test_task_info(self):
+        def create_task(size):
+            return self.create_board(size).tasks.first()
+
+        self.assertQueryBudget(TaskInfo, "GET", create_task, lambda task: self.get(f"/api/task/{task.id}/"))
+        # The worst case: the new status is a task counter the board doesn't have yet (boards/counters.py)
+        self.assertQueryBudget(TaskInfo, "PUT", create_task, lambda task: self.client.put(
+            f"/api/task/{task.id}/", {"board": task.board_id, "title": "Renamed", "owner": self.owner.id,
+                                      "progress_status": "ARCHIVED"},
+            content_type="application/json"
+        ))
+        self.assertQueryBudget(TaskInfo, "DELETE", create_task,
+                               lambda task: self.client.delete(f"/api/task/{task.id}/"))
+
+    # A create, an update and a delete, into a task counter the board doesn't have yet
+    def test_task_bulk(self):
+        def create_board(size):
+            board = self.create_board(size + 1)
+            task_ids = list(board.tasks.order_by("id").values_list("id", flat=True))
+            return board, task_ids[0], task_ids[-1]
+
+        self.assertQueryBudget(TaskBulk, "POST", create_board, lambda state: self.client.post(
+            f"/api/board/{state[0].url}/tasks/bulk/", {"operations": [
+                {"op": "create", "title": "New task", "progress_status": "ARCHIVED"},
+                {"op": "update", "id": state[1], "progress_status": "ARCHIVED", "priority": 4},
+                {"op": "delete", "id": state[2]},
+            ]}, content_type="application/json"
+        ))
+
+    # The size is the number of boards of the user
+    def test_board_list(self):
+        def create_boards(size):
+            while Board.objects.filter(owner=self.owner).count() < size:
+                self.create_board(1)
+
+        self.assertQueryBudget(BoardList, "GET", create_boards, lambda _: self.get("/api/board/list/?include=summary"))
+
+    # A new view can't be added without a budget (or query_budget = None, to say it has none on purpose)
+    def test_every_view_has_a_budget(self):
+        for urls in [boards_urls, accounts_urls]:
+            for pattern in urls.urlpatterns:
+                view_class = getattr(pattern.callback, "view_class", None) if hasattr(pattern, "callback") else None
+                if view_class is None or view_class.__module__.startswith("knox"):
+                    continue
+                self.assertTrue(hasattr(view_class, "query_budget"), f"{view_class.__name__} has no query budget")
+                if view_class.query_budget is None:
+                    continue
+                for method in view_class.http_method_names:
+                    if method != "options" and hasattr(view_class, method):
+                        self.assertIsNotNone(get_query_budget(view_class, method.upper()),
+                                             f"{view_class.__name__} has no query budget for {method.upper()}")
+
+    @override_settings(DEBUG=True, QUERY_BUDGET_ACTION="raise")
+    def test_middleware_raises(self):
+        board = self.create_board(3)
+        self.assertEqual(self.get(f"/api/board/{board.url}/tasks/").status_code, status.HTTP_200_OK)
+        with mock.patch.object(TaskList, "query_budget", 1):
+            with self.assertRaises(QueryBudgetExceeded), self.assertLogs("django.request", "ERROR"):
+                self.get(f"/api/board/{board.url}/tasks/")
+
+    @override_settings(DEBUG=True, QUERY_BUDGET_ACTION="log")
+    def test_middleware_logs(self):
+        board = self.create_board(3)
+        with mock.patch.object(TaskList, "query_budget", 1):
+            with self.assertLogs("scrummaster.query_budget", "WARNING") as logs:
+                response = self.get(f"/api/board/{board.url}/tasks/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f"GET /api/board/{board.url}/tasks/ made", logs.output[0])
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The Server-Timing header and the sampled profiles (scrummaster/profiling.py)
+class RequestProfiling(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        for i in range(5):
+            Task.objects.create(board=self.board, title=f"Task {i}", owner=self.owner)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f"Token {self.token}"
+
+    def server_timing(self, response):
+        metrics = {}
+        for metric in response["Server-Timing"].split(", "):
+            name, *params = metric.split(";")
+            metrics[name] = dict(param.split("=", 1) for param in params)
+        return metrics
+
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/board/{self.board.url}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        metrics = self.server_timing(response)
+        self.assertEqual(metrics["sql"]["desc"], f'"{len(queries)} queries"')
+        self.assertEqual(sorted(metrics), ["render", "serialize", "sql", "total"])
+        self.assertGreaterEqual(float(metrics["total"]["dur"]), float(metrics["serialize"]["dur"]))
+
+    def test_timed(self):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        try:
+            with timed("serialize"):
+                with timed("serialize"):  # Nested, counted once
+                    time.sleep(0.01)
+        finally:
+            _current_timings.reset(token)
+        self.assertEqual(list(timings.durations), ["serialize"])
+        self.assertLess(timings.durations["serialize"], 0.1)
+        with timed("serialize"):  # Outside of a request
+            pass
+
+    @override_settings(SERVER_TIMING=False, PROFILE_SAMPLE_RATE=1)
+    def test_sampled_profiles(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILE_DIR=directory):
+            response = self.client.get(f"/api/board/{self.board.url}/tasks/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("Server-Timing", response)
+            profiles = os.listdir(os.path.join(directory, "boards.api.TaskList"))
+            self.assertEqual(len(profiles), 1)
+            self.assertTrue(profiles[0].endswith("-GET.prof"))
+            stats = pstats.Stats(os.path.join(directory, "boards.api.TaskList", profiles[0]))
+            self.assertTrue(any(function[2] == "to_representation" for function in stats.stats))
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# Request metrics and /metrics (scrummaster/metrics.py)
+class RequestMetrics(TestCase):
+    def setUp(self):
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+
+    # {metric line without its value: value}
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return dict(
+            line.rsplit(" ", 1) for line in response.content.decode().splitlines() if not line.startswith("#")
+        )
+
+    def test_request_metrics(self):
+        view = 'view="boards.api.BoardInfo",method="GET"'
+        before = self.scrape()
+        self.assertEqual(
+            self.client.get(f"/api/board/{self.board.url}/", HTTP_AUTHORIZATION=f"Token {self.token}").status_code,
+            status.HTTP_200_OK
+        )
+        self.assertEqual(self.client.get(f"/api/board/{self.board.url}/").status_code, status.HTTP_401_UNAUTHORIZED)
+        after = self.scrape()
+
+        def increase(line):
+            return float(after[line]) - float(before.get(line, 0))
+
+        self.assertEqual(increase(f'scrummaster_http_requests_total{{{view},status="200"}}'), 1)
+        self.assertEqual(increase(f'scrummaster_http_requests_total{{{view},status="401"}}'), 1)
+        self.assertEqual(increase('scrummaster_auth_failures_total{view="boards.api.BoardInfo"}'), 1)
+        self.assertEqual(increase(f'scrummaster_http_request_duration_seconds_count{{{view}}}'), 2)
+        self.assertEqual(increase(f'scrummaster_http_request_duration_seconds_bucket{{{view},le="+Inf"}}'), 2)
+        self.assertGreater(increase(f'scrummaster_http_request_queries_sum{{{view}}}'), 0)
+
+    # The numbers of the other worker processes are read from their files
+    def test_worker_processes(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, "1-1.json"), "w") as file:
+                json.dump({
+                    "scrummaster_auth_failures_total": [[["other.api.View"], 1000]],
+                    "scrummaster_http_request_queries": [[["other.api.View", "GET"], [0, 0, 0, 5, 0, 0, 0, 0, 0],
+                                                          20, 5]],
+                }, file)
+            metrics = self.scrape()
+            self.assertEqual(metrics['scrummaster_auth_failures_total{view="other.api.View"}'], "1000")
+            buckets = 'scrummaster_http_request_queries_bucket{view="other.api.View",method="GET",le="%s"}'
+            self.assertEqual(metrics[buckets % "2"], "0")
+            self.assertEqual(metrics[buckets % "5"], "5")  # Cumulative
+            self.assertEqual(metrics[buckets % "+Inf"], "5")
+
+            metrics_registry.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)  # This process' file
+
+    def test_allowed_ips(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, status.HTTP_404_NOT_FOUND)
+
+    def tearDown(self):
+        User.objects.all().delete()
+
+
+# The connection pool (scrummaster/db/pool.py), with sqlite3 connections
+class ConnectionPooling(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "pool.sqlite3")
+
+    def create_pool(self, **kwargs):
+        def is_alive(pool_connection):
+            try:
+                pool_connection.execute("SELECT 1")
+                return True
+            except sqlite3.ProgrammingError:  # Closed
+                return False
+
+        return ConnectionPool(lambda: sqlite3.connect(self.path, check_same_thread=False), is_alive=is_alive,
+                              **kwargs)
+
+    def test_reuse(self):
+        pool = self.create_pool()
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIs(pool.checkout(), first)
+        self.assertIsNot(pool.checkout(), first)  # The first one is in use
+        stats = pool.get_stats()
+        self.assertEqual((stats['checkouts'], stats['created'], stats['size'], stats['in_use']), (3, 2, 2, 2))
+
+    def test_liveness_check(self):
+        pool = self.create_pool()
+        first = pool.checkout()
+        pool.checkin(first)
+        first.close()  # Ex: the database server closed it
+        second = pool.checkout()
+        self.assertIsNot(second, first)
+        second.execute("SELECT 1")
+        self.assertEqual((pool.get_stats()['discarded'], pool.get_stats()['size']), (1, 1))
+
+        # Connections used again right away aren't checked
+        pool = self.create_pool(check_after=60)
+        first = pool.checkout()
+        pool.checkin(first)
+        first.close()
+        self.assertIs(pool.checkout(), first)
+
+    def test_idle_eviction(self):
+        pool = self.create_pool(max_idle=60)
+        first = pool.checkout()
+        pool.checkin(first)
+        with mock.patch("scrummaster.db.pool.time.monotonic", return_value=time.monotonic() + 120):
+            second = pool.checkout()
+        self.assertIsNot(second, first)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            first.execute("SELECT 1")
+        self.assertEqual(pool.get_stats()['evicted'], 1)
+
+    def test_size_limit(self):
+        pool = self.create_pool(max_size=2, timeout=0.05)
+        first = pool.checkout()
+        pool.checkout()
+        with self.assertRaises(PoolTimeout):
+            pool.checkout()
+        self.assertEqual((pool.get_stats()['waits'], pool.get_stats()['timeouts']), (1, 1))
+
+        # A waiting checkout gets the connection given back by another thread
+        pool.timeout = 5
+        threading.Timer(0.05, pool.checkin, [first]).start()
+        self.assertIs(pool.checkout(), first)
+        self.assertEqual((pool.get_stats()['waits'], pool.get_stats()['timeouts'], pool.get_stats()['size']), (2, 1, 2))
+
+    # A connection that can't be reset isn't used again, and leaves room for a new one
+    def test_reset(self):
+        events = []
+        pool = self.create_pool(max_size=1, reset=lambda pool_connection: False, on_event=events.append)
+        first = pool.checkout()
+        pool.checkin(first)
+        self.assertIsNot(pool.checkout(), first)
+        self.assertEqual(events, ["created", "checkouts", "discarded", "created", "checkouts"])
+
+    def test_connect_error(self):
+        pool = ConnectionPool(mock.Mock(side_effect=sqlite3.OperationalError), max_size=1)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.checkout()
+        self.assertEqual(pool.get_stats()['size'], 0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+# Reads from a replica (scrummaster/routers.py). The replica is another SQLite database (in a temporary file, outside of
+# the test transactions), its rows are copied from "default" by the tests (like replication, which can be behind).
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouting(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(cls.directory.name, "replica.sqlite3"),
+        }
+        call_command("migrate", database="replica", verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.databases["replica"]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        token_cache.clear()
+        get_pin_cache().clear()  # The writes of the other tests pinned their users (the ids are used again)
+        self.owner, self.token = create_user("Bob475", "bob@gmail.com")
+        self.other_user, self.other_token = create_user("Alice1", "alice1@gmail.com")
+        self.board = Board.objects.create(title="Board", owner=self.owner)
+        SharedUser.objects.create(board=self.board, shared_user=self.other_user)
+        self.replicate()
+
+    # Copy every row of "default" to the replica
+    def replicate(self):
+        for model in [User, AuthToken, Board, SharedUser, Task]:
+            model.objects.using("replica").all().delete()
+            for row in model.objects.all():
+                row.save(using="replica", force_insert=True)
+
+    def get(self, path, token):
+        response = self.client.get(path, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_board_list_from_replica(self):
+        Board.objects.using("replica").filter(id=self.board.id).update(title="Replica title")
+        boards = self.get("/api/board/list/", self.token)['owned_boards']
+        self.assertEqual([board['title'] for board in boards], ["Replica title"])
+
+    # The views without use_replica read from "default"
+    def test_other_views(self):
+        Task.objects.create(board=self.board, title="Not replicated yet", owner=self.owner)
+        tasks = self.get(f"/api/board/{self.board.url}/tasks/", self.token)['tasks']
+        self.assertEqual([task['title'] for task in tasks], ["Not replicated yet"])
+
+    def test_read_your_writes(self):
+        response = self.client.put(f"/api/board/{self.board.url}/", {"title": "Renamed"},
+                                   content_type="application/json", HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # The writer reads "default", the other user still reads the replica (not replicated yet)
+        self.assertEqual(self.get(f"/api/board/{self.board.url}/", self.token)['title'], "Renamed")
+        self.assertEqual(self.get(f"/api/board/{self.board.url}/", self.other_token)['title'], "Board")
+
+        # The writer is back on the replica once the pin is over
+        get_pin_cache().delete(pin_key(self.owner.id))
+        self.assertEqual(self.get(f"/api/board/{self.board.url}/", self.token)['title'], "Board")
+        self.replicate()
+        self.assertEqual(self.get(f"/api/board/{self.board.url}/", self.other_token)['title'], "Renamed")
+
+    # Failed writes don't pin
+    def test_failed_write(self):
+        response = self.client.put(f"/api/board/{self.board.url}/", {"title": ""},
+                                   content_type="application/json", HTTP_AUTHORIZATION=f"Token {self.token}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIsNone(get_pin_cache().get(pin_key(self.owner.id)))
+
+    def tearDown(self):
+        User.objects.all().delete()
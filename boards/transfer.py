@@ -0,0 +1,199 @@
+import csv
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import exceptions
+from .models import Task
+from .serializers import board_list_info
+
+"""
+Board export and import.
+Export (GET api/board/<url>/export/) streams the tasks of a board as NDJSON or CSV. The tasks are read from the
+database in chunks and written out as they are read, so the memory used doesn't depend on the size of the board. Under
+ASGI the chunks are read in a thread (scrummaster/asgi_handler.py), the ORM can't be used on the event loop.
+    NDJSON --> one JSON object per line, the first line is the board ({"type": "board", ...}), then one line per task
+               ({"type": "task", "id": 1, "title": ..., "owner_email": ...})
+    CSV --> a header line, then one line per task (EXPORT_FIELDS)
+
+Import (POST api/board/<url>/import/, or "python manage.py import_tasks") reads the same formats (the board line and
+the ids are ignored) and adds the tasks to a board. The rows are read one at a time and inserted in batches of
+IMPORT_BATCH_SIZE, with a few queries per batch (owners by email, titles already taken). Everything is one write to the
+board (boards/changes.py), so if any row has an error nothing is imported and the error says which line it is.
+"""
+
+EXPORT_FIELDS = ["id", "title", "description", "progress_status", "priority", "owner_email", "date_created"]
+EXPORT_CHUNK_SIZE = 2000  # tasks read from the database at a time
+EXPORT_BUFFER_SIZE = 64 * 1024  # bytes written to the response at a time
+IMPORT_BATCH_SIZE = 1000  # tasks inserted at a time
+
+
+# The tasks of the board as tuples of EXPORT_FIELDS, read from the database in chunks
+def export_rows(board):
+    return Task.objects.filter(board_id=board.id).order_by("id") \
+        .values_list("id", "title", "description", "progress_status", "priority", "owner__email", "date_created") \
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# Join small pieces of text into bigger chunks, so the response isn't written one line at a time
+def buffered(pieces):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def export_ndjson(board):
+    board_line = board_list_info(board)
+    board_line["type"] = "board"
+    yield json.dumps(board_line, cls=DjangoJSONEncoder) + "\n"
+    for row in export_rows(board):
+        task_line = {"type": "task"}
+        task_line.update(zip(EXPORT_FIELDS, row))
+        yield json.dumps(task_line, cls=DjangoJSONEncoder) + "\n"
+
+
+# csv.writer writes to a file, this "file" just gives back what was written
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(board):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(board):
+        yield writer.writerow(row)
+
+
+EXPORTERS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
+
+
+# Lines of text from lines of bytes (ex: the body of a request)
+def decode_lines(lines):
+    for line in lines:
+        try:
+            yield line.decode("utf-8")
+        except UnicodeDecodeError:
+            raise exceptions.ValidationError({"detail": ["The file has to be UTF-8."]})
+
+
+def import_error(line_number, errors):
+    return exceptions.ValidationError({"line": line_number, "errors": errors})
+
+
+# Rows of an NDJSON import, as (line number, dict). Lines that aren't tasks (ex: the board line of an export) are skipped
+def read_ndjson(lines):
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise import_error(line_number, {"detail": ["Invalid JSON."]})
+        if not isinstance(row, dict):
+            raise import_error(line_number, {"detail": ["Expected a JSON object."]})
+        if row.get("type", "task") == "task":
+            yield line_number, row
+
+
+# Rows of a CSV import, as (line number, dict). The first line has the column names.
+def read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+READERS = {
+    "ndjson": read_ndjson,
+    "csv": read_csv,
+}
+
+
+# Check one row and turn it into an unsaved task. Returns the task and the owner email ("" for no owner).
+def task_from_row(line_number, row, board, version):
+    errors = {}
+    title = row.get("title") or ""
+    if not isinstance(title, str) or not title or len(title) > 100:
+        errors["title"] = ["Required, at most 100 characters."]
+    description = row.get("description") or ""
+    if not isinstance(description, str):
+        errors["description"] = ["Must be text."]
+    progress_status = row.get("progress_status") or "WORKING"
+    if not isinstance(progress_status, str) or len(progress_status) > 50:
+        errors["progress_status"] = ["At most 50 characters."]
+    priority = row.get("priority")
+    try:
+        priority = 1 if priority in (None, "") else int(priority)
+        if not 1 <= priority <= 5:
+            raise ValueError
+    except (TypeError, ValueError):
+        errors["priority"] = ["A whole number from 1 to 5."]
+    owner_email = row.get("owner_email") or ""
+    if not isinstance(owner_email, str):
+        errors["owner_email"] = ["Must be an email."]
+    if errors:
+        raise import_error(line_number, errors)
+    task = Task(board_id=board.id, title=title, description=description, progress_status=progress_status,
+                priority=priority, change_seq=version)
+    return task, owner_email
+
+
+# Set the owners of a batch of tasks and check their titles, then insert them. batch is a list of
+# (line number, task, owner email). owner_ids is the email --> user id of the emails already looked up.
+def insert_batch(batch, board, owner_ids, taken_titles):
+    emails = {email for _, _, email in batch if email and email not in owner_ids}
+    if emails:
+        owner_ids.update(User.objects.filter(email__in=emails).values_list("email", "id"))
+    titles = [task.title for _, task, _ in batch]
+    taken_titles.update(Task.objects.filter(board_id=board.id, title__in=titles).values_list("title", flat=True))
+
+    tasks = []
+    for line_number, task, email in batch:
+        if email:
+            if email not in owner_ids:
+                raise import_error(line_number, {"owner_email": ["No user with that email."]})
+            task.owner_id = owner_ids[email]
+        if task.title in taken_titles:
+            raise import_error(line_number, {"title": ["A task with this title already exists in the board."]})
+        taken_titles.add(task.title)
+        tasks.append(task)
+    Task.objects.bulk_create(tasks)
+    return tasks
+
+
+# Import the rows (from READERS) into the board, inside the write to the board (changes is its ChangeRecorder).
+# Returns {"imported": amount of tasks, "seconds": ..., "rows_per_second": ...}
+def import_tasks(board, rows, changes, batch_size=IMPORT_BATCH_SIZE):
+    start = time.perf_counter()
+    owner_ids = {}
+    taken_titles = set()  # titles taken by the tasks imported so far
+    imported = 0
+    batch = []
+    for line_number, row in rows:
+        task, owner_email = task_from_row(line_number, row, board, changes.version)
+        batch.append((line_number, task, owner_email))
+        if len(batch) >= batch_size:
+            changes.tasks_imported(insert_batch(batch, board, owner_ids, taken_titles))
+            imported += len(batch)
+            batch = []
+    if batch:
+        changes.tasks_imported(insert_batch(batch, board, owner_ids, taken_titles))
+        imported += len(batch)
+
+    seconds = time.perf_counter() - start
+    return {
+        "imported": imported,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(imported / seconds) if seconds else imported,
+    }
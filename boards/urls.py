@@ -1,12 +1,22 @@
 from django.urls import path
-from .api import BoardCreate, BoardInfo, BoardList, SharedUserCreate, SharedUserDelete, TaskCreate, TaskInfo
+from scrummaster.async_views import read_view
+from .api import BoardCreate, BoardInfo, BoardList, SharedUserCreate, SharedUserDelete, TaskCreate, TaskInfo, \
+    TaskList, TaskBulk, BoardChangeList, BoardSummary, TaskSearch, \
+    BoardExport, BoardImport
 
 urlpatterns = [
     path('api/board/create/', BoardCreate.as_view()),
-    path('api/board/list/', BoardList.as_view()),  # get list of shared boards and owned boards
-    path('api/board/<str:url>/', BoardInfo.as_view()),  # For retrieve, update and delete (Aka GET, PUT, DELETE)
+    path('api/board/list/', read_view(BoardList)),  # get list of shared boards and owned boards (async with ASGI)
+    path('api/board/<str:url>/', read_view(BoardInfo)),  # For retrieve, update and delete (Aka GET, PUT, DELETE)
+    path('api/board/<str:url>/tasks/', TaskList.as_view()),  # Paginated and filterable list of a board's tasks
+    path('api/board/<str:url>/tasks/bulk/', TaskBulk.as_view()),  # Create, update and delete many tasks at once
+    path('api/board/<str:url>/changes/', BoardChangeList.as_view()),  # What changed since a version (?since=)
+    path('api/board/<str:url>/summary/', BoardSummary.as_view()),  # Task counts by progress status and priority
+    path('api/board/<str:url>/export/', BoardExport.as_view()),  # Stream the tasks as NDJSON or CSV
+    path('api/board/<str:url>/import/', BoardImport.as_view()),  # Add tasks from an NDJSON or CSV file
     path('api/shareduser/create/', SharedUserCreate.as_view()),
     path('api/shareduser/delete/', SharedUserDelete.as_view()),
     path('api/task/create/', TaskCreate.as_view()),
-    # path('api/task/<int:pk>/', TaskInfo.as_view()),
+    path('api/task/search/', TaskSearch.as_view()),  # Full text search of the tasks (?q=)
+    path('api/task/<int:pk>/', TaskInfo.as_view()),  # For retrieve, update and delete (Aka GET, PUT, DELETE)
 ]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from scrummaster.asgi_handler import get_asgi_application  # Streaming responses read in a thread
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scrummaster.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')  # Async board and user read views (scrummaster/async_views.py)
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after django is set up
+from boards.event_stream import BoardEventStream  # noqa: E402
+
+# Board event streams (Server-Sent Events, see boards/event_stream.py) are served here, everything else goes to django
+application = BoardEventStream(django_application)
@@ -0,0 +1,53 @@
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+
+"""
+The django ASGI handler, with streaming responses read in a thread.
+django 3.2 reads the content of a StreamingHttpResponse on the event loop, so a response that queries the database
+while it is read (ex: the board export, boards/transfer.py) fails with SynchronousOnlyOperation after the status line
+was sent, and the client gets a cut off response. Here every part of the content is read with sync_to_async (in the
+same thread as the sync views, which has the request's database connection), and sent from the event loop.
+The parts should be big enough that a thread switch per part doesn't matter (the export sends 64KB at a time).
+"""
+
+_END = object()
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # The same headers as django
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append((b'Set-Cookie', c.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        while True:
+            part = await next_part(parts, _END)
+            if part is _END:
+                break
+            for chunk, _ in self.chunk_bytes(part):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+# Same as django.core.asgi.get_asgi_application(), with the handler above
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ASGIHandler()
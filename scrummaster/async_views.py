@@ -0,0 +1,97 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connection
+from django.http import HttpResponse
+
+"""
+Async read views for the ASGI app (scrummaster/asgi.py).
+Under ASGI django runs every sync view in its own thread (and with its own database connection), so a slow database
+ties up one thread per request. async_read_view() turns a DRF view into an async view: GET requests run the view
+(database queries and rendering) in a thread pool of ASYNC_ORM_MAX_WORKERS threads, shared by all requests, and the
+event loop only waits for the result. Many slow clients can then share one event loop and a bounded amount of threads
+and database connections. Other methods (writes) run like a normal sync view.
+
+Under WSGI (and in the test client) the request already has its own thread, so the view is just run in that thread.
+The async views are only used if ASYNC_READ_VIEWS is on (scrummaster/asgi.py turns it on), see read_view().
+ASYNC_ORM_MAX_WORKERS = 0 uses django's sync_to_async instead of the thread pool.
+"""
+
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+# The thread pool, made the first time it is used (and again if ASYNC_ORM_MAX_WORKERS changed). None if it is 0.
+def get_orm_executor():
+    global _executor, _executor_size
+    max_workers = getattr(settings, "ASYNC_ORM_MAX_WORKERS", 8)
+    if max_workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor_size != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orm")
+            _executor_size = max_workers
+        return _executor
+
+
+# Same as what django does at the start and end of every request, so the connections of the pool threads don't go stale
+# (with CONN_MAX_AGE = 0 they are closed after every call, like after a sync request).
+def _run_with_connection(func, args, kwargs):
+    if not connection.in_atomic_block:
+        close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if not connection.in_atomic_block:
+            close_old_connections()
+
+
+# Run a sync function (that uses the ORM) in the thread pool and wait for it without blocking the event loop.
+# The context variables of the caller are copied to the thread.
+async def run_orm(func, *args, **kwargs):
+    executor = get_orm_executor()
+    if executor is None:
+        return await sync_to_async(func)(*args, **kwargs)
+    call = functools.partial(contextvars.copy_context().run, _run_with_connection, func, args, kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+# Call the DRF view and render its response in the same thread. It is returned as a plain HttpResponse, so django
+# doesn't need another thread to render it.
+def _render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if not (hasattr(response, "render") and callable(response.render)):
+        return response
+    response.render()
+    plain_response = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain_response[header] = value
+    return plain_response
+
+
+def async_read_view(view_class, **initkwargs):
+    view = view_class.as_view(**initkwargs)
+
+    async def async_view(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest) and request.method in ("GET", "HEAD", "OPTIONS"):
+            return await run_orm(_render_view, view, request, *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    async_view.view_class = view_class
+    async_view.csrf_exempt = True  # Like DRF's views, which use token authentication
+    return async_view
+
+
+# The view for the url patterns: async if ASYNC_READ_VIEWS is on, otherwise the normal sync view
+def read_view(view_class, **initkwargs):
+    if getattr(settings, "ASYNC_READ_VIEWS", False):
+        return async_read_view(view_class, **initkwargs)
+    return view_class.as_view(**initkwargs)
@@ -0,0 +1,74 @@
+from django.db.backends.postgresql.base import Database, DatabaseWrapper as PostgresDatabaseWrapper
+from scrummaster.db.pool import ConnectionPool, PoolTimeout, get_pool
+from scrummaster.metrics import DB_POOL_EVENTS, registry
+from .creation import DatabaseCreation
+
+"""
+The PostgreSQL backend with pooled connections (scrummaster/db/pool.py), ENGINE 'scrummaster.db.backends.postgresql'.
+django opens a connection at the start of a request and closes it at the end (CONN_MAX_AGE = 0), with this backend
+the connection comes from the pool of the worker process and goes back to it. The pool is set with the "POOL" key of
+the database settings (not OPTIONS, those are given to psycopg2):
+    "POOL": {"MAX_SIZE": 10, "TIMEOUT": 10, "MAX_IDLE": 300, "CHECK_AFTER": 0}
+MAX_SIZE --> most connections of one process (each worker has its own pool, the database sees workers * MAX_SIZE)
+TIMEOUT --> seconds a request waits for a free connection before an OperationalError
+MAX_IDLE --> seconds an unused connection is kept open
+CHECK_AFTER --> a connection that has been idle this many seconds is checked (SELECT 1) before it is used, 0 checks
+                every time
+The pool events are counted in the metrics (scrummaster_db_pool_events_total, see scrummaster/metrics.py).
+SQLite keeps django's own backend, connecting to a file costs next to nothing.
+"""
+
+POOL_DEFAULTS = {"MAX_SIZE": 10, "TIMEOUT": 10, "MAX_IDLE": 300, "CHECK_AFTER": 0}
+
+
+def is_alive(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        if connection.get_transaction_status() != Database.extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()  # Not in autocommit mode, the SELECT started a transaction
+        return True
+    except Database.Error:
+        return False
+
+
+# What the next request gets must look like a new connection: no transaction left open
+def reset(connection):
+    if connection.closed:
+        return False
+    if connection.get_transaction_status() != Database.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return connection.get_transaction_status() == Database.extensions.TRANSACTION_STATUS_IDLE
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    # One pool per alias and connection parameters (the tests connect to another database with the same alias)
+    def get_pool(self, conn_params):
+        key = (self.alias, repr(sorted(conn_params.items())))
+        options = {**POOL_DEFAULTS, **self.settings_dict.get("POOL", {})}
+        alias = self.alias
+        return get_pool(key, lambda: ConnectionPool(
+            connect=lambda: PostgresDatabaseWrapper.get_new_connection(self, conn_params),
+            is_alive=is_alive, reset=reset, max_size=options["MAX_SIZE"], timeout=options["TIMEOUT"],
+            max_idle=options["MAX_IDLE"], check_after=options["CHECK_AFTER"],
+            on_event=lambda event: registry.inc(DB_POOL_EVENTS, alias, event),
+        ))
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        try:
+            connection = self.pool.checkout()
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+        # Set by the postgresql backend when it connects, the connection may have been opened by another thread
+        self.isolation_level = self.settings_dict["OPTIONS"].get("isolation_level", connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
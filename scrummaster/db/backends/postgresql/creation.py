@@ -0,0 +1,13 @@
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresDatabaseCreation
+from scrummaster.db.pool import close_pools
+
+
+# The test database can't be dropped or copied while the pool keeps connections to it open
+class DatabaseCreation(PostgresDatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_pools()
+        super()._clone_test_db(suffix, verbosity, keepdb)
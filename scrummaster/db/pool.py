@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+
+"""
+A bounded pool of database connections, shared by the threads of one process.
+The database backend (scrummaster/db/backends/postgresql) takes a connection from the pool instead of opening one, and
+gives it back instead of closing it, so a request doesn't pay for connecting (TCP, TLS, authentication) every time.
+
+    checkout() --> an idle connection (checked with is_alive() if it has been idle for check_after seconds or more),
+                   or a new one if there are fewer than max_size, otherwise wait up to timeout seconds for one to be
+                   given back (PoolTimeout after that)
+    checkin()  --> reset() the connection (ex: roll back an open transaction) and keep it for the next checkout, or
+                   close it if it can't be reset
+
+Connections idle for more than max_idle seconds are closed. stats counts what happened (see STATS), on_event(name)
+is called for each of them (ex: to add them to the metrics).
+The pools of a process are kept in get_pool(), a process forked from it (ex: gunicorn --preload) gets new pools.
+"""
+
+# checkouts --> connections handed out, created --> new connections opened, waits --> checkouts that had to wait for a
+# connection, timeouts --> waits that gave up, discarded --> connections closed because they were dead or couldn't be
+# reset, evicted --> connections closed because they were idle for too long
+STATS = ("checkouts", "created", "waits", "timeouts", "discarded", "evicted")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _close_quietly(close, connection):
+    try:
+        close(connection)
+    except Exception:  # Already broken, there is nothing else to do with it
+        pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, is_alive=None, reset=None, close=None, max_size=10, timeout=10, max_idle=300,
+                 check_after=0, on_event=None):
+        self.connect = connect
+        self.is_alive = is_alive or (lambda connection: True)
+        self.reset = reset or (lambda connection: True)
+        self.close = close or (lambda connection: connection.close())
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.on_event = on_event
+        self.idle = []  # (connection, time it was given back), the most recent last
+        self.size = 0  # Open connections, idle or checked out
+        self.condition = threading.Condition()
+        self.stats = dict.fromkeys(STATS, 0)
+
+    # Has to be called with the condition held
+    def _count(self, name):
+        self.stats[name] += 1
+        if self.on_event is not None:
+            self.on_event(name)
+
+    # Take out the connections that have been idle for too long (has to be called with the condition held, the
+    # connections are closed by the caller once it is released)
+    def _take_expired(self):
+        expired = []
+        now = time.monotonic()
+        while self.idle and now - self.idle[0][1] > self.max_idle:
+            expired.append(self.idle.pop(0)[0])
+            self.size -= 1
+            self._count("evicted")
+        if expired:
+            self.condition.notify(len(expired))
+        return expired
+
+    def checkout(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            connection = returned = None
+            create = False
+            with self.condition:
+                expired = self._take_expired()
+                if self.idle:
+                    connection, returned = self.idle.pop()
+                elif self.size < self.max_size:
+                    self.size += 1
+                    create = True
+                else:
+                    if not waited:
+                        waited = True
+                        self._count("waits")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._count("timeouts")
+                        raise PoolTimeout(f"No database connection free after {self.timeout}s ({self.max_size} in use)")
+                    self.condition.wait(remaining)
+            for expired_connection in expired:
+                _close_quietly(self.close, expired_connection)
+
+            if create:
+                try:
+                    connection = self.connect()
+                except BaseException:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self._count("created")
+                    self._count("checkouts")
+                return connection
+
+            if connection is not None:
+                # The check is a round trip to the database, it is done without holding the condition
+                if time.monotonic() - returned < self.check_after or self.is_alive(connection):
+                    with self.condition:
+                        self._count("checkouts")
+                    return connection
+                self._discard(connection)
+
+    def checkin(self, connection):
+        try:
+            reusable = self.reset(connection)
+        except Exception:
+            reusable = False
+        if not reusable:
+            return self._discard(connection)
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            expired = self._take_expired()
+            self.condition.notify()
+        for expired_connection in expired:
+            _close_quietly(self.close, expired_connection)
+
+    def _discard(self, connection):
+        _close_quietly(self.close, connection)
+        with self.condition:
+            self.size -= 1
+            self._count("discarded")
+            self.condition.notify()
+
+    # Close the idle connections (the checked out ones are closed when they are given back)
+    def close_idle(self):
+        with self.condition:
+            idle = [connection for connection, returned in self.idle]
+            self.idle = []
+            self.size -= len(idle)
+            self.condition.notify(len(idle))
+        for connection in idle:
+            _close_quietly(self.close, connection)
+
+    def get_stats(self):
+        with self.condition:
+            return dict(self.stats, size=self.size, idle=len(self.idle), in_use=self.size - len(self.idle))
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+# The pool for key in this process, made by create() the first time
+def get_pool(key, create):
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools = {}  # The connections of the parent process can't be shared with it
+            _pools_pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = create()
+        return _pools[key]
+
+
+# Close the idle connections of every pool (ex: before dropping the test database)
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values()) if _pools_pid == os.getpid() else []
+    for pool in pools:
+        pool.close_idle()
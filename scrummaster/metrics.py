@@ -0,0 +1,238 @@
+import asyncio
+import atexit
+import json
+import os
+import threading
+import time
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from .profiling import request_timings, view_name
+
+"""
+Request metrics, shown in the Prometheus text format by /metrics.
+MetricsMiddleware counts every request by view class, method and status, and records its latency and number of
+database queries in histograms. Responses with status 401 are counted as authentication failures. The database
+connection pool counts its events (scrummaster/db/backends/postgresql).
+
+gunicorn runs several worker processes, each with its own numbers. With METRICS_DIR set, every process writes its
+numbers to a JSON file in that directory (at most every METRICS_FLUSH_INTERVAL seconds, and when it exits), and
+/metrics adds up the files of every process, so one scrape shows the whole machine. The files of processes that are
+gone are kept so the counters don't go down, empty the directory when deploying. Without METRICS_DIR /metrics only
+shows the process that answers.
+
+/metrics is only answered for METRICS_ALLOWED_IPS (REMOTE_ADDR), everyone else gets a 404.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, description, label_names):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values = {}  # label values --> value
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def dump(self):
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+    def merge(self, values, dumped):
+        for labels, value in dumped:
+            labels = tuple(labels)
+            values[labels] = values.get(labels, 0) + value
+
+    def lines(self, values):
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.label_names, labels)} {format_number(value)}"
+
+
+# Counts per bucket (not cumulative, the last one is for values above every bucket), sum and count, for every labels
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}  # label values --> [bucket counts, sum, count]
+
+    def observe(self, value, *label_values):
+        values = self.values.setdefault(label_values, [[0] * (len(self.buckets) + 1), 0, 0])
+        values[0][next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))] += 1
+        values[1] += value
+        values[2] += 1
+
+    def dump(self):
+        return [[list(labels), counts, total, count] for labels, (counts, total, count) in self.values.items()]
+
+    def merge(self, values, dumped):
+        for labels, counts, total, count in dumped:
+            labels = tuple(labels)
+            merged = values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+            merged[2] += count
+
+    def lines(self, values):
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(self.label_names + ("le",), labels + (format_number(bound),))
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.label_names, labels)} {format_number(total)}"
+            yield f"{self.name}_count{format_labels(self.label_names, labels)} {count}"
+
+
+def format_number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+# The metrics of this process, and the files of the other processes
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file_name = None
+        self.last_flush = 0
+
+    # A process forked from the one that made the registry (gunicorn --preload) starts from zero, with its own file
+    def check_process(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    for metric in self.metrics.values():
+                        metric.values = {}
+                    self.pid = os.getpid()
+                    self.file_name = f"{self.pid}-{int(time.time() * 1000)}.json"
+
+    def counter(self, name, description, label_names):
+        self.metrics[name] = Counter(name, description, tuple(label_names))
+        return self.metrics[name]
+
+    def histogram(self, name, description, label_names, buckets):
+        self.metrics[name] = Histogram(name, description, tuple(label_names), tuple(buckets))
+        return self.metrics[name]
+
+    # The metrics are changed under the lock (requests can be handled in several threads)
+    def record(self, func, *args):
+        self.check_process()
+        with self.lock:
+            func(*args)
+        if time.monotonic() - self.last_flush >= getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+            self.flush()
+
+    # For events that can happen outside of a request (doesn't write the file)
+    def inc(self, counter, *label_values):
+        self.check_process()
+        with self.lock:
+            counter.inc(*label_values)
+
+    # Write this process' numbers to its file in METRICS_DIR (written to a temporary file and renamed, so a reader
+    # never sees half of it)
+    def flush(self):
+        directory = getattr(settings, "METRICS_DIR", None)
+        self.last_flush = time.monotonic()
+        if not directory or self.pid != os.getpid():
+            return
+        with self.lock:
+            data = {name: metric.dump() for name, metric in self.metrics.items()}
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        with open(f"{path}.{threading.get_ident()}.tmp", "w") as file:
+            json.dump(data, file)
+        os.replace(f"{path}.{threading.get_ident()}.tmp", path)
+
+    # Every process' numbers added up, in the Prometheus text format
+    def exposition(self):
+        self.check_process()
+        with self.lock:
+            dumps = [{name: metric.dump() for name, metric in self.metrics.items()}]
+        directory = getattr(settings, "METRICS_DIR", None)
+        if directory and os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith(".json") and file_name != self.file_name:
+                    try:
+                        with open(os.path.join(directory, file_name)) as file:
+                            dumps.append(json.load(file))
+                    except (OSError, ValueError):  # Removed or being replaced meanwhile
+                        continue
+
+        lines = []
+        for name, metric in self.metrics.items():
+            values = {}
+            for dump in dumps:
+                metric.merge(values, dump.get(name, []))
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.lines(values))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+REQUESTS = registry.counter("scrummaster_http_requests_total", "Requests by view", ["view", "method", "status"])
+LATENCY = registry.histogram("scrummaster_http_request_duration_seconds", "Time taken by the requests",
+                             ["view", "method"], LATENCY_BUCKETS)
+QUERIES = registry.histogram("scrummaster_http_request_queries", "Database queries per request", ["view", "method"],
+                             QUERY_BUCKETS)
+AUTH_FAILURES = registry.counter("scrummaster_auth_failures_total", "Requests refused with a 401", ["view"])
+DB_POOL_EVENTS = registry.counter("scrummaster_db_pool_events_total", "Database connection pool events (see "
+                                  "scrummaster/db/pool.py)", ["alias", "event"])
+
+
+def record_request(request, response, timings, duration):
+    view = view_name(request)
+    REQUESTS.inc(view, request.method, str(response.status_code))
+    LATENCY.observe(duration, view, request.method)
+    QUERIES.observe(timings.query_count, view, request.method)
+    if response.status_code == 401:
+        AUTH_FAILURES.inc(view)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # So django sees an async middleware
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.async_call(request)
+        start = time.perf_counter()
+        with request_timings() as timings:
+            response = self.get_response(request)
+        registry.record(record_request, request, response, timings, time.perf_counter() - start)
+        return response
+
+    async def async_call(self, request):
+        start = time.perf_counter()
+        with request_timings() as timings:
+            response = await self.get_response(request)
+        registry.record(record_request, request, response, timings, time.perf_counter() - start)
+        return response
+
+
+def metrics_view(request):
+    if request.META.get("REMOTE_ADDR") not in getattr(settings, "METRICS_ALLOWED_IPS", []):
+        raise Http404
+    return HttpResponse(registry.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
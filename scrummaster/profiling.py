@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import contextvars
+import cProfile
+import os
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+"""
+Where the time of a request goes.
+RequestProfilingMiddleware measures every request: SQL queries (count and time), building the response data
+(serializers, see timed()) and rendering it (scrummaster/renderers.py). With SERVER_TIMING on, the response gets a
+Server-Timing header, which the browser's developer tools show:
+    Server-Timing: sql;dur=12.5;desc="7 queries", serialize;dur=30.1, render;dur=4.2, total;dur=51.0
+serialize includes the queries made while building the data (querysets are loaded when they are used).
+
+PROFILE_SAMPLE_RATE of the requests (ex: 0.01, 0 turns it off) are also run under cProfile and the profile is written
+to PROFILE_DIR/<view name>/, to read with python -m pstats or snakeviz. Only sync requests are profiled (cProfile only
+sees one thread, and the async views run in the ORM thread pool).
+
+Measuring is a few perf_counter() calls and a context variable lookup per query, cheap enough to leave on. The
+timings are kept in a context variable, so they follow the request into the ORM threads (scrummaster/async_views.py).
+"""
+
+_current_timings = contextvars.ContextVar("request_timings", default=None)
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = {}  # name --> seconds
+        self.query_count = 0
+        self._active = set()  # The timed() blocks running now, nested blocks of the same name aren't counted twice
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+
+    def server_timing(self, total):
+        metrics = []
+        if self.query_count:
+            metrics.append(f'sql;dur={self.durations.get("sql", 0) * 1000:.1f};desc="{self.query_count} queries"')
+        for name, seconds in self.durations.items():
+            if name != "sql":
+                metrics.append(f"{name};dur={seconds * 1000:.1f}")
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Add the time of the block (or of the decorated function) to the current request's timings under name. Does nothing
+# outside of a request.
+class timed(contextlib.ContextDecorator):
+    def __init__(self, name):
+        self.name = name
+
+    # A new one for every call of a decorated function (they can run at the same time in different threads)
+    def _recreate_cm(self):
+        return timed(self.name)
+
+    def __enter__(self):
+        self._timings = _current_timings.get()
+        if self._timings is None or self.name in self._timings._active:
+            self._timings = None
+            return self
+        self._timings._active.add(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._timings is not None:
+            self._timings.add(self.name, time.perf_counter() - self._start)
+            self._timings._active.discard(self.name)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("sql", time.perf_counter() - start)
+        timings.query_count += 1
+
+
+def _add_wrapper(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _add_wrapper(connection)
+
+
+# Time the queries of every connection from now on: the ones already open in this thread and every new connection
+def _install():
+    global _installed
+    with _install_lock:
+        if not _installed:
+            connection_created.connect(_connection_created, dispatch_uid="profiling")
+            _installed = True
+    for connection in connections.all():
+        _add_wrapper(connection)
+
+
+# The timings of the current request, made (and the query timing installed) if there aren't any yet. Lets other
+# middleware (scrummaster/metrics.py) read the same numbers, in any order.
+@contextlib.contextmanager
+def request_timings():
+    timings = _current_timings.get()
+    if timings is not None:
+        yield timings
+        return
+    _install()
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+# The name of the view the url was resolved to (the view class for class based views)
+def view_name(request):
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return "unresolved"
+    func = resolver_match.func
+    view = getattr(func, "view_class", None) or getattr(func, "cls", None) or func
+    return f"{view.__module__}.{view.__name__}"
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.server_timing = getattr(settings, "SERVER_TIMING", False)
+        self.sample_rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0)
+        if not self.server_timing and not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # So django sees an async middleware
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.async_call(request)
+        profile = cProfile.Profile() if self.sample_rate and random.random() < self.sample_rate else None
+        start = time.perf_counter()
+        with request_timings() as timings:
+            if profile is None:
+                response = self.get_response(request)
+            else:
+                response = profile.runcall(self.get_response, request)
+        self.add_header(response, timings, time.perf_counter() - start)
+        if profile is not None:
+            self.save_profile(request, profile)
+        return response
+
+    async def async_call(self, request):
+        start = time.perf_counter()
+        with request_timings() as timings:
+            response = await self.get_response(request)
+        self.add_header(response, timings, time.perf_counter() - start)
+        return response
+
+    def add_header(self, response, timings, total):
+        if self.server_timing:
+            response["Server-Timing"] = timings.server_timing(total)
+
+    # PROFILE_DIR/boards.api.BoardInfo/<time in ms>-<process id>-<thread id>-GET.prof
+    def save_profile(self, request, profile):
+        directory = os.path.join(settings.PROFILE_DIR, view_name(request))
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(
+            directory, f"{int(time.time() * 1000)}-{os.getpid()}-{threading.get_ident()}-{request.method}.prof"
+        ))
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+"""
+Query budgets: the most queries a request to a view may make, no matter how big the board is.
+Views declare it with a query_budget attribute, either one number or a number per method:
+    query_budget = 4
+    query_budget = {"GET": 3, "PUT": 8}
+A view whose queries have to grow with the request (ex: an import, a few queries per batch of rows) sets
+query_budget = None, which isn't checked.
+The budget includes authentication with an empty token cache (accounts/auth.py) and the transaction statements
+(BEGIN, or SAVEPOINT and RELEASE SAVEPOINT in the tests), and is set from the most expensive path of the view (ex: a
+task update that needs a new task counter), so it is the worst case.
+
+QueryCounter counts the queries made inside it, in this thread and in the threads the ORM work is handed to with the
+context variables (the async views, scrummaster/async_views.py). It works without DEBUG.
+QueryBudgetMiddleware (only with DEBUG) logs every request that goes over its view's budget, or raises
+QueryBudgetExceeded if QUERY_BUDGET_ACTION is "raise". The tests check the budgets with QueryBudgetTestMixin.
+"""
+
+logger = logging.getLogger(__name__)
+
+# The counters active in this context, the innermost last
+_active_counters = contextvars.ContextVar("query_counters", default=())
+_install_lock = threading.Lock()
+_installed = False
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _count_query(execute, sql, params, many, context):
+    for counter in _active_counters.get():
+        counter.queries.append(sql)
+    return execute(sql, params, many, context)
+
+
+def _add_wrapper(connection):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _add_wrapper(connection)
+
+
+# Count the queries of every connection from now on: the ones already open in this thread and every new connection
+def _install():
+    global _installed
+    with _install_lock:
+        if not _installed:
+            connection_created.connect(_connection_created, dispatch_uid="query_budget")
+            _installed = True
+    for connection in connections.all():
+        _add_wrapper(connection)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.queries = []  # SQL of every query
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def __enter__(self):
+        _install()
+        self._token = _active_counters.set(_active_counters.get() + (self,))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_counters.reset(self._token)
+
+
+# The query budget of the view function of a url pattern (or a view class) for a method, None if it has none
+def get_query_budget(view, method):
+    view_class = getattr(view, "view_class", None) or getattr(view, "cls", None) or view
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+# Works with both sync and async views (the counter is kept in a context variable)
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DEBUG or getattr(settings, "QUERY_BUDGET_ACTION", None) not in ("log", "raise"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # So django sees an async middleware
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.async_call(request)
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    async def async_call(self, request):
+        with QueryCounter() as counter:
+            response = await self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    # The view is the one the url was resolved to (no budget if the url wasn't resolved, ex: a 404)
+    def check(self, request, counter):
+        resolver_match = getattr(request, "resolver_match", None)
+        budget = get_query_budget(resolver_match.func, request.method) if resolver_match else None
+        if budget is None or counter.count <= budget:
+            return
+        message = f"{request.method} {request.path} made {counter.count} queries, its budget is {budget}"
+        if settings.QUERY_BUDGET_ACTION == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+# For tests: check that a request stays within its view's budget for boards of different sizes, and that the amount
+# of queries doesn't grow with the size. setup(size) makes the data for one size (ex: a board with size tasks), its
+# queries aren't counted, and send_request(setup result) sends the request. The token cache is emptied before every
+# request, like the budgets assume.
+class QueryBudgetTestMixin:
+    def assertQueryBudget(self, view, method, setup, send_request, sizes=(1, 10, 50)):
+        from accounts.auth import token_cache
+
+        budget = get_query_budget(view, method)
+        self.assertIsNotNone(budget, f"{view.__name__} has no query budget for {method}")
+        counts = {}
+        for size in sizes:
+            state = setup(size)
+            token_cache.clear()
+            with QueryCounter() as counter:
+                response = send_request(state)
+            self.assertLess(response.status_code, 400, f"{view.__name__} {method} failed: {response.status_code}")
+            counts[size] = counter.count
+            self.assertLessEqual(
+                counter.count, budget,
+                f"{view.__name__} {method} made {counter.count} queries with size {size}, its budget is {budget}:\n"
+                + "\n".join(counter.queries)
+            )
+        self.assertEqual(len(set(counts.values())), 1, f"{view.__name__} {method} queries grow with size: {counts}")
+        return counts
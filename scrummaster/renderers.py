@@ -0,0 +1,88 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .profiling import timed
+
+try:
+    import orjson
+except ImportError:  # Optional, JSON falls back to the json module
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional, without it MessagePack isn't offered
+    msgpack = None
+
+"""
+Response renderers of the API (REST_FRAMEWORK in settings.py).
+CompatibleJSONRenderer --> the default JSON (application/json), byte for byte what django's JsonResponse (which the
+                           views used before) gives: {"id": 1, "title": "T\\u00e2che"}, datetimes like
+                           "2020-09-05T16:11:00.123Z", UUIDs as strings.
+FastJSONRenderer --> compact JSON ({"id":1,"title":"Tâche"}, non-ASCII characters as UTF-8), encoded with orjson if it
+                     is installed, otherwise with the json module (the output is the same either way). Smaller and
+                     faster to encode, the values are the same as the default JSON. Only used if the client asks for
+                     it: Accept: application/vnd.scrummaster.compact+json, or ?format=compact-json.
+MessagePackRenderer --> MessagePack (Accept: application/msgpack), with the same values as the JSON. Only offered if
+                        msgpack is installed, otherwise a request that only accepts MessagePack gets a 406.
+
+"python manage.py benchmark_renderers" compares them on a large board.
+"""
+
+_django_json_encoder = DjangoJSONEncoder()
+
+
+# Values that aren't JSON types (datetimes, UUIDs, lazy translations, decimals, ...), encoded like django's JsonResponse
+def encode_value(value):
+    return _django_json_encoder.default(value)
+
+
+class CompatibleJSONRenderer(JSONRenderer):
+    encoder_class = DjangoJSONEncoder
+    ensure_ascii = True
+    compact = False  # ", " and ": " separators
+    strict = False  # JsonResponse allows NaN
+
+    @timed("render")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.scrummaster.compact+json'
+    format = 'compact-json'
+    encoder_class = DjangoJSONEncoder  # For the json module fallback
+    ensure_ascii = False
+    compact = True
+
+    # orjson encodes datetimes its own way (microseconds), they are passed to encode_value() instead. Keys that aren't
+    # strings (ex: ids) are turned into strings, like the json module does.
+    ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    @timed("render")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=encode_value, option=self.ORJSON_OPTIONS)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    available = msgpack is not None
+
+    @timed("render")
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_value, use_bin_type=True)
+
+
+# Content negotiation that leaves out the renderers whose library isn't installed (available = False)
+class AvailableRendererNegotiation(DefaultContentNegotiation):
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, "available", True)]
+        return super().select_renderer(request, renderers, format_suffix)
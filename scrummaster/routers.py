@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import random
+from django.conf import settings
+from django.core.cache import caches
+
+"""
+Read replicas (DATABASE_REPLICAS, aliases of DATABASES that copy "default").
+ReplicaRouter sends the reads of a request to a replica when its view has use_replica = True (ex: boards/api.py
+BoardList and BoardInfo) and the method is GET or HEAD. Everything else (writes, other views, requests that aren't
+authenticated) uses "default".
+
+A replica is a little behind "default". So a user never reads older data than what they just wrote, a successful
+write (POST, PUT, PATCH, DELETE) pins the user to "default" for REPLICA_PIN_SECONDS (in the REPLICA_PIN_CACHE_ALIAS
+cache, which should be shared by the processes). Their reads go to the replicas again after that.
+
+ReplicaRoutingMiddleware keeps the routing of the current request in a context variable. The user is known once the
+token is verified (accounts/auth.py calls user_authenticated()), the authentication queries themselves use "default"
+(a token made a moment ago may not be on the replica yet).
+"""
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_current_routing = contextvars.ContextVar("database_routing", default=None)
+
+
+class RequestRouting:
+    def __init__(self):
+        self.user_id = None
+        self.replica = None  # The alias the reads go to, None for "default"
+
+
+def pin_key(user_id):
+    return f"replica-pin:{user_id}"
+
+
+def get_pin_cache():
+    return caches[getattr(settings, "REPLICA_PIN_CACHE_ALIAS", "default")]
+
+
+# The user's reads go to "default" for the next REPLICA_PIN_SECONDS
+def pin_user(user_id):
+    get_pin_cache().set(pin_key(user_id), True, getattr(settings, "REPLICA_PIN_SECONDS", 10))
+
+
+def is_pinned(user_id):
+    return get_pin_cache().get(pin_key(user_id)) is not None
+
+
+# Called when the request's token is verified: the reads after that go to a replica if the view allows it
+def user_authenticated(request, user):
+    routing = _current_routing.get()
+    if routing is None:
+        return
+    routing.user_id = user.id
+    replicas = getattr(settings, "DATABASE_REPLICAS", [])
+    view = getattr(request, "parser_context", {}).get("view")
+    if replicas and request.method in ("GET", "HEAD") and getattr(view, "use_replica", False) \
+            and not is_pinned(user.id):
+        routing.replica = random.choice(replicas)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current_routing.get()
+        return routing.replica if routing is not None else None
+
+    def db_for_write(self, model, **hints):
+        return None
+
+    # The replicas have the same rows as "default"
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *getattr(settings, "DATABASE_REPLICAS", [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+# Works with both sync and async views (the routing is kept in a context variable)
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # So django sees an async middleware
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.async_call(request)
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        self.pin_writer(request, response, routing)
+        return response
+
+    async def async_call(self, request):
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        self.pin_writer(request, response, routing)
+        return response
+
+    def pin_writer(self, request, response, routing):
+        if request.method not in SAFE_METHODS and routing.user_id is not None and response.status_code < 400:
+            pin_user(routing.user_id)
@@ -28,9 +28,30 @@ DEBUG = True
 ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": ("knox.auth.TokenAuthentication",),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("accounts.auth.CachingTokenAuthentication",),
+    # JSON (the same bytes as JsonResponse), compact JSON with orjson when it is installed (Accept:
+    # application/vnd.scrummaster.compact+json) and MessagePack (Accept: application/msgpack) when msgpack is installed
+    "DEFAULT_RENDERER_CLASSES": (
+        "scrummaster.renderers.CompatibleJSONRenderer",
+        "scrummaster.renderers.FastJSONRenderer",
+        "scrummaster.renderers.MessagePackRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_CONTENT_NEGOTIATION_CLASS": "scrummaster.renderers.AvailableRendererNegotiation",
 }
 
+# Verified tokens are cached in memory (accounts/auth.py), set the timeout to 0 to turn the cache off.
+# Logouts are seen by the other processes through the AUTH_TOKEN_CACHE_ALIAS cache, so the token cache is only used
+# if that cache is shared by the processes (not local memory, see CACHES, "manage.py check" warns about it).
+AUTH_TOKEN_CACHE_TIMEOUT = 60  # seconds
+AUTH_TOKEN_CACHE_MAX_SIZE = 10000  # tokens per process
+AUTH_TOKEN_CACHE_ALIAS = 'tokens'
+# Tokens of one user (the oldest ones are deleted at login, None for no limit), and how often a login deletes a batch
+# of expired tokens (0 for never, "python manage.py purge_expired_tokens" deletes all of them)
+AUTH_TOKEN_LIMIT_PER_USER = 10
+AUTH_TOKEN_PURGE_INTERVAL = 60 * 60  # seconds
+AUTH_TOKEN_PURGE_BATCH_SIZE = 1000
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -48,6 +69,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scrummaster.metrics.MetricsMiddleware',
+    'scrummaster.profiling.RequestProfilingMiddleware',
+    'scrummaster.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,8 +79,25 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'scrummaster.query_budget.QueryBudgetMiddleware',
 ]
 
+# With DEBUG, requests that make more queries than their view's query_budget are logged ("log") or raise an error
+# ("raise"), see scrummaster/query_budget.py. None turns it off.
+QUERY_BUDGET_ACTION = 'log'
+
+# Request profiling (scrummaster/profiling.py): a Server-Timing header with the SQL, serializer and render time of every
+# response, and a cProfile dump in PROFILE_DIR/<view name>/ for PROFILE_SAMPLE_RATE of the requests (0 for none)
+SERVER_TIMING = True
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+# Request metrics at /metrics (scrummaster/metrics.py). Set METRICS_DIR to a directory shared by the worker processes
+# (ex: /tmp/scrummaster-metrics) to see all of them in one scrape.
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5  # seconds
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
 ROOT_URLCONF = 'scrummaster.urls'
 
 TEMPLATES = [
@@ -90,17 +131,68 @@ WSGI_APPLICATION = 'scrummaster.wsgi.application'
 # }
 
 # POSTGRESQL Database, connected to PostgreSQL server running on local machine
+# The connections are pooled by every worker process (scrummaster/db/backends/postgresql/base.py has the POOL settings)
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'scrummaster.db.backends.postgresql',
         'NAME': 'ScrumMaster',
         'USER': 'postgres',
         'PASSWORD': '1234',
         'HOST': 'localhost',
         'PORT': '5432',
+        'POOL': {
+            'MAX_SIZE': 10,
+            'TIMEOUT': 10,  # seconds
+            'MAX_IDLE': 300,  # seconds
+        },
     }
 }
 
+# Read replicas (scrummaster/routers.py): aliases of DATABASES above that replicate "default". The board list and board
+# info are read from them, except for users who wrote something in the last REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['scrummaster.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 10
+REPLICA_PIN_CACHE_ALIAS = 'default'
+
+# Postgres only: split the task table into this many partitions by board (boards/migrations/0014_partition_tasks.py).
+# Read when that migration runs, 0 keeps one normal table.
+TASK_PARTITIONS = 0
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# 'default' is used for the board snapshots (boards/cache.py). Local memory is per process, use the file based cache
+# ('django.core.cache.backends.filebased.FileBasedCache' with a LOCATION directory) to share snapshots between workers.
+# 'tokens' has the token revocations (accounts/auth.py), it has to be shared by every worker process (file based, in a
+# directory they can all write to, or ex: Redis), otherwise the token cache is turned off.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('AUTH_TOKEN_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'tokens')),
+    },
+}
+
+BOARD_CACHE_ALIAS = 'default'
+BOARD_SNAPSHOT_TIMEOUT = 60 * 60  # seconds
+
+
+# Async read views (scrummaster/async_views.py). scrummaster/asgi.py turns them on, with WSGI the views stay sync.
+# The ORM work of the async views runs in a pool of ASYNC_ORM_MAX_WORKERS threads (0 uses django's sync_to_async).
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '0') == '1'
+ASYNC_ORM_MAX_WORKERS = 8
+
+
+# Board events (boards/events.py), pushed to clients by the event stream of the ASGI app (scrummaster/asgi.py).
+# The in process broker only reaches event streams in the same process as the write.
+
+BOARD_EVENT_BROKER = 'boards.events.InProcessEventBroker'
+BOARD_EVENT_KEEPALIVE = 15  # seconds between keepalive comments on an idle event stream
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -15,9 +15,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view),  # Request metrics of every worker process (only for METRICS_ALLOWED_IPS)
     path('', include('frontend.urls')),
     path('', include('accounts.urls')),
     path('', include('boards.urls'))